@@ -1,9 +1,8 @@
 from flask import Flask, redirect, url_for
 import os
-from flask_session import Session
 from config import Config
-from app.models import Setting, Currency
-from app.extensions import db, mail, migrate
+from app.models import Currency
+from app.extensions import db, mail, migrate, init_sqlite_pragmas
 from flask_babel import Babel, gettext, ngettext, lazy_gettext, _
 from flask import request, session, g
 
@@ -50,12 +49,28 @@ def create_app(config_class=Config):
     
     # Initialize extensions
     # Initialize session first to ensure it's available for Babel
-    sess = Session()
-    sess.init_app(app)
+    from app.services.session_store import init_sessions
+    init_sessions(app)
 
     db.init_app(app)
+    init_sqlite_pragmas(app)
     mail.init_app(app)
     migrate.init_app(app, db)
+
+    from app.services.client_stats_service import init_client_stats
+    init_client_stats()
+
+    from app.services.sql_instrumentation import init_sql_instrumentation
+    init_sql_instrumentation(app)
+
+    from app.services.metrics import init_metrics
+    init_metrics(app)
+
+    from app.services.compression import init_compression
+    init_compression(app)
+
+    from app.services.profiler import init_profiler
+    init_profiler(app)
     
     # Language selection function
     def get_locale():
@@ -79,22 +94,18 @@ def create_app(config_class=Config):
     # The database initialization logic has been moved to a separate CLI command.
     # This prevents the app from trying to re-create tables on every startup.
 
-    def load_settings_from_db(app):
-        try:
-            for setting in Setting.query.all():
-                # Handle type conversion
-                if setting.value.isdigit():
-                    app.config[setting.key] = int(setting.value)
-                elif setting.value.lower() in ['true', 'false']:
-                    app.config[setting.key] = setting.value.lower() == 'true'
-                else:
-                    app.config[setting.key] = setting.value
-        except Exception as e:
-            # This can happen if the database is not yet initialized
-            print(f"Could not load settings from DB: {e}")
-    # Load settings from DB at startup
-    with app.app_context():
-        load_settings_from_db(app)
+    # Load settings from DB at startup, and again in each worker whenever
+    # another one changes them
+    from app.services.settings_service import init_settings_sync
+    init_settings_sync(app)
+
+    # Fingerprinted CSS from build_assets.py, cached for a year
+    from app.services.assets import init_assets
+    init_assets(app)
+
+    # ETag/Last-Modified validation and per-route Cache-Control
+    from app.services.http_cache import init_http_cache
+    init_http_cache(app)
 
     # Add currency formatting filter
     @app.template_filter('format_currency')
@@ -110,12 +121,20 @@ def create_app(config_class=Config):
         )
     
     # Register blueprints
-    from app.routes import dashboard, clients, invoices, settings, recurring_invoices
+    from app.routes import dashboard, clients, invoices, settings, recurring_invoices, api, debug, metrics
 
     app.register_blueprint(dashboard.bp)
     app.register_blueprint(clients.bp)
     app.register_blueprint(invoices.bp)
     app.register_blueprint(settings.bp)
     app.register_blueprint(recurring_invoices.bp)
+    app.register_blueprint(api.bp)
+    app.register_blueprint(debug.bp)
+    app.register_blueprint(metrics.bp)
+
+    # Scheduled backups; the serving entry points start the thread, which
+    # idles while no interval is set
+    from app.services.backup_scheduler import BackupScheduler
+    BackupScheduler(app)
     
     return app
\ No newline at end of file
@@ -1,7 +1,30 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_mail import Mail
 from flask_migrate import Migrate
+from sqlalchemy import event
 
 db = SQLAlchemy()
 mail = Mail()
 migrate = Migrate()
+
+
+def init_sqlite_pragmas(app):
+    """Apply the SQLITE_PRAGMAS profile to every new SQLite connection.
+
+    Foreign keys are always enforced, whatever the profile says, because
+    deleting clients and invoices relies on ON DELETE CASCADE.
+    """
+    pragmas = {**(app.config.get('SQLITE_PRAGMAS') or {}), 'foreign_keys': 'ON'}
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
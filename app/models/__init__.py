@@ -1,5 +1,7 @@
 from datetime import datetime
+from decimal import Decimal
 from app.extensions import db
+from app.money import DEFAULT_EXPONENT, MAX_EXPONENT, default_exponent, from_minor, line_amount_minor, tax_minor
 
 class Client(db.Model):
     __tablename__ = 'clients'
@@ -10,12 +12,21 @@ class Client(db.Model):
     phone = db.Column(db.String(50))
     address = db.Column(db.Text)
     company = db.Column(db.String(200))
+    # Summary of the client's invoices, kept current by
+    # app.services.client_stats_service; money totals are in currency_totals
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    last_invoice_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationship
-    invoices = db.relationship('Invoice', backref='client', lazy=True, cascade='all, delete-orphan')
-    recurring_invoices = db.relationship('RecurringInvoice', backref='client', lazy=True, cascade='all, delete-orphan')
+    # Relationships; children are removed by ON DELETE CASCADE in the
+    # database rather than loaded and deleted one by one
+    invoices = db.relationship('Invoice', backref='client', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    recurring_invoices = db.relationship('RecurringInvoice', backref='client', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    archived_invoices = db.relationship('ArchivedInvoice', backref='client', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    # Written only by client_stats_service, one row per invoiced currency
+    currency_totals = db.relationship('ClientCurrencyTotal', lazy='selectin', viewonly=True,
+                                      order_by='ClientCurrencyTotal.currency')
     
     def __repr__(self):
         return f'<Client {self.name}>'
@@ -28,90 +39,246 @@ class Client(db.Model):
             'phone': self.phone,
             'address': self.address,
             'company': self.company,
+            'invoice_count': self.invoice_count,
+            'outstanding_total': {total.currency: str(total.outstanding_total) for total in self.currency_totals},
+            'paid_total': {total.currency: str(total.paid_total) for total in self.currency_totals},
+            'last_invoice_date': self.last_invoice_date.isoformat() if self.last_invoice_date else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 
-class Invoice(db.Model):
+class ClientCurrencyTotal(db.Model):
+    """A client's outstanding and paid invoice totals in one currency.
+
+    Amounts are in units of MAX_EXPONENT (thousandths), so invoices of the
+    currency written with different exponents add up exactly. Totals in
+    different currencies are never added together.
+    """
+    __tablename__ = 'client_currency_totals'
+
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    outstanding_total_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    paid_total_minor = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @property
+    def outstanding_total(self):
+        return from_minor(self.outstanding_total_minor, MAX_EXPONENT)
+
+    @property
+    def paid_total(self):
+        return from_minor(self.paid_total_minor, MAX_EXPONENT)
+
+
+class InvoiceAmountsMixin:
+    """Money properties and serialization shared by Invoice and ArchivedInvoice"""
+
+    is_archived = False
+
+    @property
+    def subtotal(self):
+        return from_minor(self.subtotal_minor, self.currency_exponent)
+
+    @property
+    def tax_amount(self):
+        return from_minor(self.tax_amount_minor, self.currency_exponent)
+
+    @property
+    def total(self):
+        return from_minor(self.total_minor, self.currency_exponent)
+    
+    @classmethod
+    def sum_total(cls, *criteria):
+        """Sum the totals of matching invoices exactly.
+
+        Minor units are added up in SQL per currency exponent and only then
+        converted, so large aggregates don't pick up float error.
+        """
+        rows = db.session.query(cls.currency_exponent, db.func.sum(cls.total_minor)).filter(
+            *criteria
+        ).group_by(cls.currency_exponent).all()
+        return sum((from_minor(total, exponent) for exponent, total in rows), Decimal(0))
+    
+    def to_dict(self, related=True):
+        """Serialize the invoice. With related, the client name and items are
+        included too, which loads them unless they were eager loaded."""
+        data = {
+            'id': self.id,
+            'invoice_number': self.invoice_number,
+            'client_id': self.client_id,
+            'issue_date': self.issue_date.isoformat() if self.issue_date else None,
+            'due_date': self.due_date.isoformat() if self.due_date else None,
+            'status': self.status,
+            'currency': self.currency,
+            'currency_exponent': self.currency_exponent,
+            'subtotal': str(self.subtotal),
+            'subtotal_minor': self.subtotal_minor,
+            'tax_rate': self.tax_rate,
+            'tax_amount': str(self.tax_amount),
+            'tax_amount_minor': self.tax_amount_minor,
+            'total': str(self.total),
+            'total_minor': self.total_minor,
+            'notes': self.notes,
+            'archived': self.is_archived
+        }
+        if related:
+            data['client_name'] = self.client.name if self.client else None
+            data['items'] = [item.to_dict() for item in self.items]
+        return data
+
+
+class InvoiceItemAmountsMixin:
+    """Money properties and serialization shared by InvoiceItem and ArchivedInvoiceItem"""
+
+    @property
+    def currency_exponent(self):
+        return self.invoice.currency_exponent if self.invoice is not None else DEFAULT_EXPONENT
+
+    @property
+    def rate(self):
+        return from_minor(self.rate_minor, self.currency_exponent)
+
+    @property
+    def amount(self):
+        return from_minor(self.amount_minor, self.currency_exponent)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'position': self.position,
+            'description': self.description,
+            'quantity': self.quantity,
+            'rate': str(self.rate),
+            'rate_minor': self.rate_minor,
+            'amount': str(self.amount),
+            'amount_minor': self.amount_minor
+        }
+
+
+class Invoice(InvoiceAmountsMixin, db.Model):
     __tablename__ = 'invoices'
+    __table_args__ = (
+        # Serves a client's invoice list and the client stats aggregates
+        db.Index('ix_invoices_client_id_issue_date', 'client_id', 'issue_date'),
+        # Never reuse the id of a deleted or archived invoice
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
-    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), nullable=False)
     issue_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     due_date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), default='draft')  # draft, sent, unpaid, paid, overdue, cancelled
     currency = db.Column(db.String(3), default='IDR')  # Currency code (IDR, USD, EUR)
-    subtotal = db.Column(db.Float, default=0.0)
+    currency_exponent = db.Column(db.Integer, nullable=False, default=DEFAULT_EXPONENT)  # Decimal places of the currency
+    # Money columns hold integer minor units (see app.money)
+    subtotal_minor = db.Column(db.BigInteger, nullable=False, default=0)
     tax_rate = db.Column(db.Float, default=0.0)
-    tax_amount = db.Column(db.Float, default=0.0)
-    total = db.Column(db.Float, default=0.0)
+    tax_amount_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    total_minor = db.Column(db.BigInteger, nullable=False, default=0)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship
-    items = db.relationship('InvoiceItem', backref='invoice', lazy=True, cascade='all, delete-orphan')
+    items = db.relationship('InvoiceItem', backref='invoice', lazy=True, order_by='InvoiceItem.position', cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<Invoice {self.invoice_number}>'
-    
+
     def calculate_totals(self):
         """Calculate invoice totals based on items"""
-        self.subtotal = sum(item.amount for item in self.items)
-        self.tax_amount = self.subtotal * self.tax_rate
-        self.total = self.subtotal + self.tax_amount
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'invoice_number': self.invoice_number,
-            'client_id': self.client_id,
-            'client_name': self.client.name if self.client else None,
-            'issue_date': self.issue_date.isoformat() if self.issue_date else None,
-            'due_date': self.due_date.isoformat() if self.due_date else None,
-            'status': self.status,
-            'currency': self.currency,
-            'subtotal': self.subtotal,
-            'tax_rate': self.tax_rate,
-            'tax_amount': self.tax_amount,
-            'total': self.total,
-            'notes': self.notes,
-            'items': [item.to_dict() for item in self.items]
-        }
+        self.subtotal_minor = sum(item.amount_minor for item in self.items)
+        self.tax_amount_minor = tax_minor(self.subtotal_minor, self.tax_rate)
+        self.total_minor = self.subtotal_minor + self.tax_amount_minor
 
 
-class InvoiceItem(db.Model):
+class InvoiceItem(InvoiceItemAmountsMixin, db.Model):
     __tablename__ = 'invoice_items'
+    __table_args__ = (
+        # Returns an invoice's items already in line order, and serves
+        # cascade deletes and exports
+        db.Index('ix_invoice_items_invoice_id_position', 'invoice_id', 'position'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)  # Order of the line on the invoice
     description = db.Column(db.String(500), nullable=False)
     quantity = db.Column(db.Float, default=1.0)
-    rate = db.Column(db.Float, nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    # Minor units in the parent invoice's currency
+    rate_minor = db.Column(db.BigInteger, nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
     
     def __repr__(self):
         return f'<InvoiceItem {self.description}>'
-    
+
     def calculate_amount(self):
         """Calculate item amount"""
-        self.amount = self.quantity * self.rate
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'description': self.description,
-            'quantity': self.quantity,
-            'rate': self.rate,
-            'amount': self.amount
-        }
+        self.amount_minor = line_amount_minor(self.quantity, self.rate_minor)
+
+
+class ArchivedInvoice(InvoiceAmountsMixin, db.Model):
+    """A settled invoice moved out of the invoices table.
+
+    Archived invoices keep the id they had in invoices, so existing links
+    still resolve, and are read-only.
+    """
+    __tablename__ = 'archived_invoices'
+    __table_args__ = (
+        db.Index('ix_archived_invoices_client_id_issue_date', 'client_id', 'issue_date'),
+    )
+
+    is_archived = True
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    invoice_number = db.Column(db.String(50), nullable=False, index=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), nullable=False)
+    issue_date = db.Column(db.Date, nullable=False)
+    due_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20))  # paid or cancelled
+    currency = db.Column(db.String(3))
+    currency_exponent = db.Column(db.Integer, nullable=False, default=DEFAULT_EXPONENT)
+    subtotal_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    tax_rate = db.Column(db.Float, default=0.0)
+    tax_amount_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    total_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationship
+    items = db.relationship('ArchivedInvoiceItem', backref='invoice', lazy=True, order_by='ArchivedInvoiceItem.position', cascade='all, delete-orphan', passive_deletes=True)
+
+    def __repr__(self):
+        return f'<ArchivedInvoice {self.invoice_number}>'
+
+
+class ArchivedInvoiceItem(InvoiceItemAmountsMixin, db.Model):
+    __tablename__ = 'archived_invoice_items'
+    __table_args__ = (
+        db.Index('ix_archived_invoice_items_invoice_id_position', 'invoice_id', 'position'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('archived_invoices.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    description = db.Column(db.String(500), nullable=False)
+    quantity = db.Column(db.Float, default=1.0)
+    rate_minor = db.Column(db.BigInteger, nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f'<ArchivedInvoiceItem {self.description}>'
+
 
 class RecurringInvoice(db.Model):
     __tablename__ = 'recurring_invoices'
 
     id = db.Column(db.Integer, primary_key=True)
-    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), nullable=False, index=True)
     frequency = db.Column(db.String(20), nullable=False, default='monthly')  # daily, weekly, monthly, yearly
     interval = db.Column(db.Integer, nullable=False, default=1)
     start_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -127,16 +294,36 @@ class RecurringInvoice(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationship
-    items = db.relationship('RecurringInvoiceItem', backref='recurring_invoice', lazy=True, cascade='all, delete-orphan')
+    items = db.relationship('RecurringInvoiceItem', backref='recurring_invoice', lazy=True, order_by='RecurringInvoiceItem.position', cascade='all, delete-orphan', passive_deletes=True)
 
     def __repr__(self):
         return f'<RecurringInvoice {self.id}>'
 
+    def to_dict(self, related=True):
+        """Serialize the schedule. With related, its items are included too."""
+        data = {
+            'id': self.id,
+            'client_id': self.client_id,
+            'frequency': self.frequency,
+            'interval': self.interval,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'next_due_date': self.next_due_date.isoformat() if self.next_due_date else None,
+            'is_active': self.is_active,
+            'currency': self.currency,
+            'tax_rate': self.tax_rate,
+            'notes': self.notes
+        }
+        if related:
+            data['items'] = [item.to_dict() for item in self.items]
+        return data
+
 class RecurringInvoiceItem(db.Model):
     __tablename__ = 'recurring_invoice_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    recurring_invoice_id = db.Column(db.Integer, db.ForeignKey('recurring_invoices.id'), nullable=False)
+    recurring_invoice_id = db.Column(db.Integer, db.ForeignKey('recurring_invoices.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)  # Order of the line on the invoice
     description = db.Column(db.String(500), nullable=False)
     quantity = db.Column(db.Float, default=1.0)
     rate = db.Column(db.Float, nullable=False)
@@ -144,6 +331,15 @@ class RecurringInvoiceItem(db.Model):
     def __repr__(self):
         return f'<RecurringInvoiceItem {self.description}>'
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'position': self.position,
+            'description': self.description,
+            'quantity': self.quantity,
+            'rate': self.rate
+        }
+
 class Setting(db.Model):
     __tablename__ = 'settings'
 
@@ -153,6 +349,18 @@ class Setting(db.Model):
     def __repr__(self):
         return f'<Setting {self.key}>'
 
+class UserSession(db.Model):
+    """Server-side session data when SESSION_TYPE is 'database'"""
+    __tablename__ = 'user_sessions'
+
+    id = db.Column(db.String(255), primary_key=True)  # Prefixed session id from the cookie
+    data = db.Column(db.LargeBinary, nullable=False)
+    # Indexed so purging expired sessions is a range scan
+    expiry = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<UserSession {self.id}>'
+
 class Currency(db.Model):
     __tablename__ = 'currencies'
 
@@ -160,14 +368,22 @@ class Currency(db.Model):
     code = db.Column(db.String(3), unique=True, nullable=False)
     name = db.Column(db.String(50), nullable=False)
     symbol = db.Column(db.String(5), nullable=False)
+    exponent = db.Column(db.Integer, nullable=False, default=DEFAULT_EXPONENT)  # Decimal places of the minor unit
 
     def __repr__(self):
         return f'<Currency {self.code}>'
 
+    @classmethod
+    def exponent_for(cls, code):
+        """Exponent of a currency code, falling back to its usual one."""
+        currency = cls.query.filter_by(code=code).first()
+        return currency.exponent if currency else default_exponent(code)
+
     def to_dict(self):
         return {
             'id': self.id,
             'code': self.code,
             'name': self.name,
-            'symbol': self.symbol
+            'symbol': self.symbol,
+            'exponent': self.exponent
         }
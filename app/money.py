@@ -0,0 +1,71 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Money is stored as integer minor units (cents, or whole rupiah) and the
+# number of decimal places of each currency is its exponent.
+DEFAULT_EXPONENT = 2
+
+# Exponents for currencies that don't use two decimal places. IDR has two
+# in ISO 4217, but rupiah amounts are invoiced in whole units.
+KNOWN_EXPONENTS = {
+    'IDR': 0,
+    'JPY': 0,
+    'KRW': 0,
+    'VND': 0,
+    'BHD': 3,
+    'JOD': 3,
+    'KWD': 3,
+    'OMR': 3,
+    'TND': 3,
+}
+
+# Largest exponent a currency may have. Amounts in different currencies are
+# added up at this scale so none of them lose precision.
+MAX_EXPONENT = 3
+
+# Tax rates are applied as integer parts per million so that Python and SQL
+# compute exactly the same tax amount
+TAX_RATE_SCALE = 1000000
+
+
+def default_exponent(currency_code):
+    """Return the usual exponent of a currency code."""
+    return KNOWN_EXPONENTS.get((currency_code or '').upper(), DEFAULT_EXPONENT)
+
+
+def to_minor(amount, exponent):
+    """Convert a major-unit amount (str, int, float or Decimal) to minor units.
+
+    Rounds half up, so 10.005 USD becomes 1001 cents.
+    """
+    if amount is None or amount == '':
+        return 0
+    value = Decimal(str(amount)).scaleb(exponent)
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor, exponent):
+    """Convert minor units back to an exact Decimal amount."""
+    return Decimal(minor or 0).scaleb(-exponent)
+
+
+def tax_rate_ppm(tax_rate):
+    """Express a fractional tax rate (0.11 for 11%) in parts per million."""
+    return int(Decimal(str(tax_rate or 0)).scaleb(6).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def tax_minor(subtotal_minor, tax_rate):
+    """Tax on a subtotal in minor units, rounded half away from zero.
+
+    Rounds the magnitude and puts the sign back, as the SQL version in
+    totals_service does with integer division that truncates toward zero,
+    so credit notes (negative subtotals) get the same tax on both sides.
+    """
+    product = subtotal_minor * tax_rate_ppm(tax_rate)
+    tax = (abs(product) + TAX_RATE_SCALE // 2) // TAX_RATE_SCALE
+    return tax if product >= 0 else -tax
+
+
+def line_amount_minor(quantity, rate_minor):
+    """Amount of a line item in minor units, rounded half up."""
+    value = Decimal(str(quantity or 0)) * rate_minor
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
@@ -0,0 +1,192 @@
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, abort
+from itertools import chain
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from app.models import Client, Invoice, ArchivedInvoice, RecurringInvoice
+from app.services.csv_import import INVOICE_STATUSES
+from app import db
+import base64
+import binascii
+import json
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Relationships each resource can embed with include=
+INCLUDES = {
+    Client: (),
+    Invoice: ('items', 'client'),
+    ArchivedInvoice: ('items', 'client'),
+    RecurringInvoice: ('items', 'client'),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status_code
+
+
+@bp.errorhandler(404)
+def handle_not_found(error):
+    return jsonify({'error': 'Not found'}), 404
+
+
+def parse_list(name):
+    return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+
+
+def parse_int(name):
+    """An integer query parameter, or None when it is absent or empty"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(f'{name} must be a number')
+
+
+def parse_include(model):
+    include = parse_list('include')
+    unknown = [name for name in include if name not in INCLUDES[model]]
+    if unknown:
+        raise ApiError(f"Cannot include: {', '.join(unknown)}")
+    return include
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({'after': last_id}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))['after'])
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise ApiError('Invalid cursor')
+
+
+def serialize(obj, include, fields):
+    """An object's to_dict() with the requested relationships, projected to fields"""
+    data = obj.to_dict() if isinstance(obj, Client) else obj.to_dict(related=False)
+    if fields:
+        unknown = [name for name in fields if name not in data]
+        if unknown:
+            raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+        data = {key: value for key, value in data.items() if key == 'id' or key in fields}
+    if 'items' in include:
+        data['items'] = [item.to_dict() for item in obj.items]
+    if 'client' in include:
+        data['client'] = obj.client.to_dict() if obj.client else None
+    return data
+
+
+def get_one(model, id, fallback=None):
+    include = parse_include(model)
+    options = [selectinload(getattr(model, name)) for name in include]
+    obj = db.session.execute(select(model).where(model.id == id).options(*options)).scalar_one_or_none()
+    if obj is None and fallback is not None:
+        return get_one(fallback, id)
+    if obj is None:
+        abort(404)
+    return jsonify(serialize(obj, include, parse_list('fields')))
+
+
+def list_page(model, *criteria):
+    """Stream one page of a resource as JSON.
+
+    Pages are ordered by id and continue after the id in the cursor, so
+    they stay stable while rows are added. Relationships named in include=
+    are loaded with one SELECT ... IN per batch of rows rather than one
+    query per row, and each row is written out as soon as it is serialized.
+    """
+    include = parse_include(model)
+    fields = parse_list('fields')
+    try:
+        limit = int(request.args.get('limit', current_app.config['API_PAGE_SIZE']))
+    except ValueError:
+        raise ApiError('limit must be a number')
+    if not 1 <= limit <= current_app.config['API_MAX_PAGE_SIZE']:
+        raise ApiError(f"limit must be between 1 and {current_app.config['API_MAX_PAGE_SIZE']}")
+
+    statement = select(model).where(*criteria).order_by(model.id)
+    if request.args.get('cursor'):
+        statement = statement.where(model.id > decode_cursor(request.args['cursor']))
+    # One extra row tells whether there is a next page
+    statement = statement.limit(limit + 1).options(*(selectinload(getattr(model, name)) for name in include))
+    rows = iter(db.session.execute(statement.execution_options(yield_per=100)).scalars())
+
+    # Serialize the first row before the response starts, so bad fields
+    # still get a 400
+    first = next(rows, None)
+    first_data = serialize(first, include, fields) if first is not None else None
+
+    def generate():
+        yield '{"data": ['
+        count, last_id, has_more = 0, None, False
+        for obj in chain([first] if first is not None else [], rows):
+            if count == limit:
+                has_more = True
+                break
+            data = first_data if obj is first else serialize(obj, include, fields)
+            yield (', ' if count else '') + json.dumps(data)
+            count, last_id = count + 1, obj.id
+        next_cursor = encode_cursor(last_id) if has_more else None
+        yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+@bp.route('/clients')
+def clients():
+    return list_page(Client)
+
+
+@bp.route('/clients/<int:id>')
+def client(id):
+    return get_one(Client, id)
+
+
+@bp.route('/invoices')
+def invoices():
+    """Invoices, filtered by status, client_id and currency; archived=1 lists the archive"""
+    model = ArchivedInvoice if request.args.get('archived') == '1' else Invoice
+    criteria = []
+    status = request.args.get('status')
+    if status:
+        if status not in INVOICE_STATUSES:
+            raise ApiError(f'Unknown status: {status}')
+        criteria.append(model.status == status)
+    client_id = parse_int('client_id')
+    if client_id is not None:
+        criteria.append(model.client_id == client_id)
+    if request.args.get('currency'):
+        criteria.append(model.currency == request.args['currency'].upper())
+    return list_page(model, *criteria)
+
+
+@bp.route('/invoices/<int:id>')
+def invoice(id):
+    return get_one(Invoice, id, fallback=ArchivedInvoice)
+
+
+@bp.route('/recurring-invoices')
+def recurring_invoices():
+    criteria = []
+    client_id = parse_int('client_id')
+    if client_id is not None:
+        criteria.append(RecurringInvoice.client_id == client_id)
+    if request.args.get('active') in ('0', '1'):
+        criteria.append(RecurringInvoice.is_active == (request.args['active'] == '1'))
+    return list_page(RecurringInvoice, *criteria)
+
+
+@bp.route('/recurring-invoices/<int:id>')
+def recurring_invoice(id):
+    return get_one(RecurringInvoice, id)
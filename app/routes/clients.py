@@ -1,5 +1,7 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from app.models import Client
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from sqlalchemy import func, select
+from app.models import Client, Invoice, ArchivedInvoice
+from app.services.http_cache import conditional_response
 from app import db
 
 bp = Blueprint('clients', __name__, url_prefix='/clients')
@@ -45,7 +47,22 @@ def new():
 @bp.route('/<int:id>')
 def view(id):
     client = Client.query.get_or_404(id)
-    return render_template('clients/view.html', client=client)
+    archived_count = ArchivedInvoice.query.filter_by(client_id=client.id).count()
+    # The page lists the client's invoices, so any invoice change is a new version
+    invoice_count, invoices_updated_at = db.session.execute(
+        select(func.count(Invoice.id), func.max(Invoice.updated_at)).where(Invoice.client_id == client.id)
+    ).one()
+    not_modified = conditional_response(
+        client.id, client.updated_at, invoice_count, invoices_updated_at, archived_count,
+        modified=(client.updated_at, invoices_updated_at)
+    )
+    if not_modified:
+        return not_modified
+    page = request.args.get('page', 1, type=int)
+    invoices = Invoice.query.filter_by(client_id=client.id).order_by(
+        Invoice.issue_date.desc(), Invoice.id.desc()
+    ).paginate(page=page, per_page=current_app.config['CLIENT_INVOICES_PER_PAGE'], error_out=False)
+    return render_template('clients/view.html', client=client, invoices=invoices, archived_count=archived_count)
 
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 def edit(id):
@@ -1,21 +1,36 @@
 from flask import Blueprint, render_template
-from app.models import Invoice, Client
+from app.models import Invoice, ArchivedInvoice, Client
 from app import db
+from app.services.status_service import mark_overdue_invoices
 from datetime import datetime, timedelta
 from sqlalchemy import func, extract, and_
 
 bp = Blueprint('dashboard', __name__)
 
+def paid_revenue(start=None, end=None):
+    """Total of paid invoices issued in [start, end), archived ones included"""
+    revenue = 0
+    for model in (Invoice, ArchivedInvoice):
+        criteria = [model.status == 'paid']
+        if start:
+            criteria.append(model.issue_date >= start)
+        if end:
+            criteria.append(model.issue_date < end)
+        revenue += model.sum_total(*criteria)
+    return revenue
+
 @bp.route('/')
 def index():
+    # Mark invoices past their due date as overdue before counting them
+    if mark_overdue_invoices(today=datetime.now().date()):
+        db.session.commit()
+    
     # Get statistics
     total_clients = Client.query.count()
-    total_invoices = Invoice.query.count()
+    total_invoices = Invoice.query.count() + ArchivedInvoice.query.count()
     
     # Calculate total revenue (paid invoices)
-    total_revenue = db.session.query(func.sum(Invoice.total)).filter(
-        Invoice.status == 'paid'
-    ).scalar() or 0
+    total_revenue = paid_revenue()
     
     # Calculate monthly revenue growth
     today = datetime.now().date()
@@ -27,17 +42,10 @@ def index():
         start_of_prev_month = start_of_month.replace(month=start_of_month.month - 1)
     
     # Revenue this month
-    revenue_this_month = db.session.query(func.sum(Invoice.total)).filter(
-        Invoice.status == 'paid',
-        Invoice.issue_date >= start_of_month
-    ).scalar() or 0
+    revenue_this_month = paid_revenue(start=start_of_month)
     
     # Revenue last month
-    revenue_last_month = db.session.query(func.sum(Invoice.total)).filter(
-        Invoice.status == 'paid',
-        Invoice.issue_date >= start_of_prev_month,
-        Invoice.issue_date < start_of_month
-    ).scalar() or 0
+    revenue_last_month = paid_revenue(start=start_of_prev_month, end=start_of_month)
     
     # Calculate growth percentage
     if revenue_last_month > 0:
@@ -48,31 +56,23 @@ def index():
         revenue_growth = 0
         
     # Calculate pending amount (sent/unpaid but not paid)
-    pending_amount = db.session.query(func.sum(Invoice.total)).filter(
+    pending_amount = Invoice.sum_total(
         Invoice.status.in_(['sent', 'unpaid', 'overdue'])
-    ).scalar() or 0
+    )
     
     # Get recent invoices
-    recent_invoices = Invoice.query.order_by(Invoice.created_at.desc()).limit(5).all()
-    
-    # Check for overdue invoices
-    overdue_invoices = Invoice.query.filter(
-        Invoice.due_date < today,
-        Invoice.status.in_(['draft', 'sent', 'unpaid'])
-    ).all()
-    
-    # Update overdue status
-    for invoice in overdue_invoices:
-        if invoice.status != 'overdue':
-            invoice.status = 'overdue'
-    db.session.commit()
+    recent_invoices = Invoice.query.options(db.selectinload(Invoice.client)).order_by(
+        Invoice.created_at.desc()).limit(5).all()
     
     # Get counts by status
-    draft_count = Invoice.query.filter_by(status='draft').count()
-    sent_count = Invoice.query.filter_by(status='sent').count()
-    unpaid_count = Invoice.query.filter_by(status='unpaid').count()
-    paid_count = Invoice.query.filter_by(status='paid').count()
-    overdue_count = Invoice.query.filter_by(status='overdue').count()
+    status_counts = dict(
+        db.session.query(Invoice.status, func.count(Invoice.id)).group_by(Invoice.status).all()
+    )
+    draft_count = status_counts.get('draft', 0)
+    sent_count = status_counts.get('sent', 0)
+    unpaid_count = status_counts.get('unpaid', 0)
+    paid_count = status_counts.get('paid', 0) + ArchivedInvoice.query.filter_by(status='paid').count()
+    overdue_count = status_counts.get('overdue', 0)
     
     return render_template('dashboard/index.html',
                          total_clients=total_clients,
@@ -0,0 +1,11 @@
+from flask import Blueprint, jsonify, current_app, abort
+
+bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+@bp.route('/sql')
+def sql_stats():
+    """Per-endpoint query totals and the latest requests' SQL summaries"""
+    stats = current_app.extensions.get('sql_stats')
+    if stats is None:
+        abort(404)
+    return jsonify(stats.snapshot())
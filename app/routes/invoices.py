@@ -1,9 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, current_app
-from app.models import Invoice, InvoiceItem, Client
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, current_app, abort, Response, stream_with_context, jsonify
+from app.models import Invoice, InvoiceItem, ArchivedInvoice, Client, Currency
+from app.money import line_amount_minor, to_minor
+from app.services.csv_import import INVOICE_STATUSES
+from app.services.export_service import EXPORT_FILE_FORMATS, EXPORT_KINDS, stream_export
+from app.services.line_items import item_rows_from_form, sync_items
+from app.services.status_service import MANUAL_STATUSES, bulk_update_status, refs_from_csv
 from app.services.pdf_service import generate_invoice_pdf
 from app.services.email_service import send_invoice_to_client
+from app.services.http_cache import conditional_response
 from app import db
+from collections import Counter
 from datetime import datetime, timedelta
+import io
 
 bp = Blueprint('invoices', __name__, url_prefix='/invoices')
 
@@ -12,73 +20,157 @@ def generate_invoice_number():
     today = datetime.now()
     prefix = f"INV-{today.strftime('%Y%m')}"
     
-    # Get last invoice number for this month
-    last_invoice = Invoice.query.filter(
-        Invoice.invoice_number.like(f"{prefix}%")
-    ).order_by(Invoice.invoice_number.desc()).first()
+    # Get last invoice number for this month, archived invoices included
+    last_numbers = []
+    for model in (Invoice, ArchivedInvoice):
+        last_invoice = model.query.filter(
+            model.invoice_number.like(f"{prefix}%")
+        ).order_by(model.invoice_number.desc()).first()
+        if last_invoice:
+            last_numbers.append(last_invoice.invoice_number)
     
-    if last_invoice:
-        last_num = int(last_invoice.invoice_number.split('-')[-1])
+    if last_numbers:
+        last_num = int(max(last_numbers).split('-')[-1])
         new_num = last_num + 1
     else:
         new_num = 1
     
     return f"{prefix}-{new_num:04d}"
 
+def invoice_item_rows(form, exponent):
+    """Submitted invoice items as (item_id, column values) pairs"""
+    rows = []
+    for item_id, desc, qty, rate in item_rows_from_form(form):
+        quantity = float(qty)
+        rate_minor = to_minor(rate, exponent)
+        rows.append((item_id, {
+            'description': desc,
+            'quantity': quantity,
+            'rate_minor': rate_minor,
+            'amount_minor': line_amount_minor(quantity, rate_minor)
+        }))
+    return rows
+
+def get_invoice_or_404(id):
+    """Look up an invoice by id, falling back to the archive"""
+    invoice = db.session.get(Invoice, id) or db.session.get(ArchivedInvoice, id)
+    if invoice is None:
+        abort(404)
+    return invoice
+
+def invoice_not_modified(invoice):
+    """304 response if the client already has this version of the invoice"""
+    client = invoice.client
+    return conditional_response(
+        invoice.__tablename__, invoice.id, invoice.updated_at, client.id, client.updated_at,
+        modified=(invoice.updated_at, client.updated_at)
+    )
+
 @bp.route('/')
 def index():
     status_filter = request.args.get('status', 'all')
     search = request.args.get('search', '')
     
-    query = Invoice.query
+    # Archived invoices live in their own table and can be numerous, so
+    # they are listed a page at a time
+    model = ArchivedInvoice if status_filter == 'archived' else Invoice
+    query = model.query.options(db.selectinload(model.client))
     
-    if status_filter != 'all':
+    if status_filter not in ('all', 'archived'):
         query = query.filter_by(status=status_filter)
     
     if search:
         query = query.join(Client).filter(
             db.or_(
-                Invoice.invoice_number.ilike(f'%{search}%'),
+                model.invoice_number.ilike(f'%{search}%'),
                 Client.name.ilike(f'%{search}%')
             )
         )
     
-    invoices = query.order_by(Invoice.created_at.desc()).all()
+    pagination = None
+    if model is ArchivedInvoice:
+        pagination = query.order_by(ArchivedInvoice.issue_date.desc(), ArchivedInvoice.id.desc()).paginate(
+            page=request.args.get('page', 1, type=int),
+            per_page=current_app.config['ARCHIVED_INVOICES_PER_PAGE'],
+            error_out=False
+        )
+        invoices = pagination.items
+    else:
+        invoices = query.order_by(Invoice.created_at.desc()).all()
     
     return render_template('invoices/index.html', 
                          invoices=invoices, 
+                         pagination=pagination,
                          status_filter=status_filter,
                          search=search)
 
+def export_filters(args):
+    """Read export filters from query arguments; raises ValueError on bad input"""
+    filters = {}
+    for key in ('start', 'end'):
+        if args.get(key):
+            filters[key] = datetime.strptime(args[key], '%Y-%m-%d').date()
+    if args.get('status'):
+        if args['status'] not in INVOICE_STATUSES:
+            raise ValueError(f"Unknown status: {args['status']}")
+        filters['status'] = args['status']
+    if args.get('client_id'):
+        filters['client_id'] = int(args['client_id'])
+    if args.get('currency'):
+        filters['currency'] = args['currency']
+    return filters
+
+@bp.route('/export')
+def export():
+    """Stream invoices or line items matching the filters as CSV or JSONL"""
+    file_format = request.args.get('format')
+    if file_format is None:
+        return render_template('invoices/export.html',
+                             clients=Client.query.order_by(Client.name).all(),
+                             currencies=Currency.query.order_by(Currency.code).all(),
+                             statuses=INVOICE_STATUSES,
+                             kinds=EXPORT_KINDS,
+                             formats=EXPORT_FILE_FORMATS)
+
+    kind = request.args.get('kind', 'invoices')
+    try:
+        if kind not in EXPORT_KINDS or file_format not in EXPORT_FILE_FORMATS:
+            raise ValueError('Unknown export type.')
+        filters = export_filters(request.args)
+    except ValueError as e:
+        flash(f'Invalid export filters: {str(e)}', 'error')
+        return redirect(url_for('invoices.export'))
+
+    include_archived = request.args.get('archived', '1') == '1'
+    filename = f"{kind}_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.{file_format}"
+    # The request context stays open while the body is generated, so the
+    # query runs as the response is sent
+    return Response(
+        stream_with_context(stream_export(kind, file_format, include_archived, **filters)),
+        mimetype=EXPORT_FILE_FORMATS[file_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @bp.route('/new', methods=['GET', 'POST'])
 def new():
     if request.method == 'POST':
         try:
             # Create invoice
+            currency = request.form.get('currency', current_app.config['DEFAULT_CURRENCY'])
+            exponent = Currency.exponent_for(currency)
             invoice = Invoice(
                 invoice_number=request.form['invoice_number'],
                 client_id=request.form['client_id'],
                 issue_date=datetime.strptime(request.form['issue_date'], '%Y-%m-%d').date(),
                 due_date=datetime.strptime(request.form['due_date'], '%Y-%m-%d').date(),
-                currency=request.form.get('currency', current_app.config['DEFAULT_CURRENCY']),
+                currency=currency,
+                currency_exponent=exponent,
                 tax_rate=float(request.form.get('tax_rate') or 0) / 100,
                 notes=request.form.get('notes')
             )
             
             # Add items
-            descriptions = request.form.getlist('description[]')
-            quantities = request.form.getlist('quantity[]')
-            rates = request.form.getlist('rate[]')
-            
-            for desc, qty, rate in zip(descriptions, quantities, rates):
-                if desc and qty and rate:
-                    item = InvoiceItem(
-                        description=desc,
-                        quantity=float(qty),
-                        rate=float(rate)
-                    )
-                    item.calculate_amount()
-                    invoice.items.append(item)
+            sync_items(invoice.items, invoice_item_rows(request.form, exponent), InvoiceItem)
             
             # Calculate totals
             invoice.calculate_totals()
@@ -105,7 +197,10 @@ def new():
 
 @bp.route('/<int:id>')
 def view(id):
-    invoice = Invoice.query.get_or_404(id)
+    invoice = get_invoice_or_404(id)
+    not_modified = invoice_not_modified(invoice)
+    if not_modified:
+        return not_modified
     return render_template('invoices/view.html', invoice=invoice)
 
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
@@ -119,30 +214,18 @@ def edit(id):
             invoice.issue_date = datetime.strptime(request.form['issue_date'], '%Y-%m-%d').date()
             invoice.due_date = datetime.strptime(request.form['due_date'], '%Y-%m-%d').date()
             invoice.currency = request.form.get('currency', current_app.config['DEFAULT_CURRENCY'])
+            invoice.currency_exponent = Currency.exponent_for(invoice.currency)
             invoice.tax_rate = float(request.form.get('tax_rate') or 0) / 100
             invoice.notes = request.form.get('notes')
             
-            # Remove existing items
-            InvoiceItem.query.filter_by(invoice_id=invoice.id).delete()
-            
-            # Add new items
-            descriptions = request.form.getlist('description[]')
-            quantities = request.form.getlist('quantity[]')
-            rates = request.form.getlist('rate[]')
-            
-            for desc, qty, rate in zip(descriptions, quantities, rates):
-                if desc and qty and rate:
-                    item = InvoiceItem(
-                        invoice_id=invoice.id,
-                        description=desc,
-                        quantity=float(qty),
-                        rate=float(rate)
-                    )
-                    item.calculate_amount()
-                    db.session.add(item)
+            # Update changed items, add new ones and remove deleted ones
+            sync_items(invoice.items, invoice_item_rows(request.form, invoice.currency_exponent), InvoiceItem)
             
             # Calculate totals
             invoice.calculate_totals()
+            # Item changes alone don't update the invoice row, and cached
+            # views and PDFs are validated by its updated_at
+            invoice.updated_at = datetime.utcnow()
             
             db.session.commit()
             flash('Invoice updated successfully!', 'success')
@@ -171,30 +254,71 @@ def delete(id):
 
 @bp.route('/<int:id>/status/<status>', methods=['POST'])
 def update_status(id, status):
-    invoice = Invoice.query.get_or_404(id)
-    
-    valid_statuses = ['draft', 'sent', 'unpaid', 'paid', 'cancelled']
-    if status in valid_statuses:
-        # Store the previous status
-        previous_status = invoice.status
-        
-        # Update the invoice status
-        invoice.status = status
-        
-        # Clear notes when marking as paid
-        if status == 'paid':
-            invoice.notes = ""
-        
-        db.session.commit()
-        flash(f'Invoice marked as {status}!', 'success')
+    outcomes, error = bulk_update_status([id], status)
+    if outcomes is None:
+        flash('Invalid status!' if status not in MANUAL_STATUSES else f'Error updating status: {error}', 'error')
+    elif outcomes[0]['outcome'] in ('not_found', 'archived'):
+        abort(404)
     else:
-        flash('Invalid status!', 'error')
+        flash(f"Invoice marked as {outcomes[0]['status']}!", 'success')
     
-    return redirect(url_for('invoices.view', id=invoice.id))
+    return redirect(url_for('invoices.view', id=id))
+
+@bp.route('/bulk-status', methods=['POST'])
+def bulk_status():
+    """Set the status of many invoices at once.
+
+    Invoices are given as a JSON body ``{"status": ..., "invoices": [...]}``,
+    as checked invoice_ids[] and a refs text field of invoice numbers or ids
+    from a form, or as an uploaded payments CSV. JSON requests get the
+    outcome for every invoice back.
+    """
+    wants_json = request.is_json or request.accept_mimetypes.best == 'application/json'
+    data = request.get_json(silent=True)
+    if data is not None and not isinstance(data, dict):
+        return jsonify({'error': 'The request body must be a JSON object'}), 400
+    data = data or {}
+    status = data.get('status') or request.form.get('status')
+    invoices = data.get('invoices')
+    refs = list(invoices or []) if isinstance(invoices, list) or invoices is None else None
+    if refs is None:
+        outcomes, error = None, 'invoices must be a list of invoice numbers or ids'
+    else:
+        refs.extend(int(i) for i in request.form.getlist('invoice_ids[]') if i.isdigit())
+        refs.extend(request.form.get('refs', '').replace(',', '\n').splitlines())
+
+    payments = request.files.get('payments')
+    if refs is not None and payments and payments.filename:
+        try:
+            refs.extend(refs_from_csv(io.TextIOWrapper(payments.stream, encoding='utf-8-sig', newline='')))
+        except (ValueError, UnicodeDecodeError) as e:
+            outcomes, error = None, str(e)
+            refs = None
+
+    if refs is not None:
+        outcomes, error = bulk_update_status(refs, status)
+
+    if wants_json:
+        if outcomes is None:
+            return jsonify({'error': error}), 400
+        return jsonify({'status': status, 'invoices': outcomes})
+
+    if outcomes is None:
+        flash(f'Bulk status update failed: {error}', 'error')
+    else:
+        counts = Counter(outcome['outcome'] for outcome in outcomes)
+        flash(f"{counts['updated']} invoices marked as {status}, {counts['unchanged']} already were"
+              f"{', ' + str(counts['archived']) + ' archived' if counts['archived'] else ''}"
+              f"{', ' + str(counts['not_found']) + ' not found' if counts['not_found'] else ''}.",
+              'success' if not counts['not_found'] and not counts['archived'] else 'warning')
+    return redirect(request.referrer or url_for('invoices.index'))
 
 @bp.route('/<int:id>/download')
 def download(id):
-    invoice = Invoice.query.get_or_404(id)
+    invoice = get_invoice_or_404(id)
+    not_modified = invoice_not_modified(invoice)
+    if not_modified:
+        return not_modified
 
     try:
         pdf_file = generate_invoice_pdf(invoice, current_app.config)
@@ -210,7 +334,7 @@ def download(id):
 
 @bp.route('/<int:id>/email', methods=['POST'])
 def email(id):
-    invoice = Invoice.query.get_or_404(id)
+    invoice = get_invoice_or_404(id)
 
     try:
         success, message = send_invoice_to_client(invoice)
@@ -0,0 +1,11 @@
+from flask import Blueprint, Response, current_app, abort
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, covering every worker when a multiprocess directory is set"""
+    registry = current_app.extensions.get('metrics')
+    if registry is None:
+        abort(404)
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,10 +1,18 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from app.models import RecurringInvoice, RecurringInvoiceItem, Client
+from app.services.line_items import item_rows_from_form, sync_items
 from app import db
 from datetime import datetime, timedelta
 
 bp = Blueprint('recurring_invoices', __name__, url_prefix='/recurring')
 
+def recurring_item_rows(form):
+    """Submitted recurring invoice items as (item_id, column values) pairs"""
+    return [
+        (item_id, {'description': desc, 'quantity': float(qty), 'rate': float(rate)})
+        for item_id, desc, qty, rate in item_rows_from_form(form)
+    ]
+
 @bp.route('/')
 def index():
     recurring_invoices = RecurringInvoice.query.order_by(RecurringInvoice.next_due_date.asc()).all()
@@ -30,18 +38,7 @@ def new():
             recurring_invoice.next_due_date = recurring_invoice.start_date
 
             # Add items
-            descriptions = request.form.getlist('description[]')
-            quantities = request.form.getlist('quantity[]')
-            rates = request.form.getlist('rate[]')
-            
-            for desc, qty, rate in zip(descriptions, quantities, rates):
-                if desc and qty and rate:
-                    item = RecurringInvoiceItem(
-                        description=desc,
-                        quantity=float(qty),
-                        rate=float(rate)
-                    )
-                    recurring_invoice.items.append(item)
+            sync_items(recurring_invoice.items, recurring_item_rows(request.form), RecurringInvoiceItem)
             
             db.session.add(recurring_invoice)
             db.session.commit()
@@ -82,23 +79,8 @@ def edit(id):
             if recurring_invoice.start_date > datetime.utcnow().date():
                 recurring_invoice.next_due_date = recurring_invoice.start_date
 
-            # Remove existing items
-            RecurringInvoiceItem.query.filter_by(recurring_invoice_id=recurring_invoice.id).delete()
-
-            # Add new items
-            descriptions = request.form.getlist('description[]')
-            quantities = request.form.getlist('quantity[]')
-            rates = request.form.getlist('rate[]')
-            
-            for desc, qty, rate in zip(descriptions, quantities, rates):
-                if desc and qty and rate:
-                    item = RecurringInvoiceItem(
-                        recurring_invoice_id=recurring_invoice.id,
-                        description=desc,
-                        quantity=float(qty),
-                        rate=float(rate)
-                    )
-                    db.session.add(item)
+            # Update changed items, add new ones and remove deleted ones
+            sync_items(recurring_invoice.items, recurring_item_rows(request.form), RecurringInvoiceItem)
             
             db.session.commit()
             flash('Recurring invoice updated successfully!', 'success')
@@ -1,11 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, Response, send_from_directory
 from datetime import datetime
+import io
 import os
 from werkzeug.utils import secure_filename
-from app.models import Setting, Currency
+from app.models import Currency
+from app.money import MAX_EXPONENT, default_exponent
 from app import db
-from app.services.backup_service import BackupService
-from flask import send_file
+from app.services.backup_service import BackupService, EXPORT_FORMATS
+from app.services.csv_import import COLUMNS, IMPORT_KINDS, REQUIRED_COLUMNS, import_csv
+from app.services.pdf_service import clear_pdf_caches
+from app.services.settings_service import save_settings
+from app.services.profiler import list_profiles, profiles_dir, top_functions
 
 bp = Blueprint('settings', __name__, url_prefix='/settings')
 
@@ -15,14 +20,6 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def update_setting(key, value):
-    """Update a setting in the database."""
-    setting = Setting.query.get(key)
-    if setting:
-        setting.value = value
-    else:
-        setting = Setting(key=key, value=value)
-        db.session.add(setting)
 
 @bp.route('/')
 def index():
@@ -37,15 +34,19 @@ def currencies():
             code = request.form.get('code')
             name = request.form.get('name')
             symbol = request.form.get('symbol')
+            exponent = request.form.get('exponent', '').strip()
 
             if not all([code, name, symbol]):
                 flash('All currency fields are required.', 'error')
             elif len(code) != 3:
                 flash('Currency code must be 3 characters long.', 'error')
+            elif exponent and (not exponent.isdigit() or int(exponent) > MAX_EXPONENT):
+                flash('Decimal places must be between 0 and 3.', 'error')
             elif Currency.query.filter_by(code=code).first():
                 flash(f'Currency with code {code} already exists.', 'error')
             else:
-                new_currency = Currency(code=code.upper(), name=name, symbol=symbol)
+                new_currency = Currency(code=code.upper(), name=name, symbol=symbol,
+                                        exponent=int(exponent) if exponent else default_exponent(code))
                 db.session.add(new_currency)
                 db.session.commit()
                 flash(f'Currency {name} ({code}) added successfully!', 'success')
@@ -66,8 +67,8 @@ def currencies():
         elif 'default_currency' in request.form:
             default_currency = request.form.get('default_currency')
             if Currency.query.filter_by(code=default_currency).first():
-                update_setting('DEFAULT_CURRENCY', default_currency)
-                current_app.config['DEFAULT_CURRENCY'] = default_currency
+                save_settings({'DEFAULT_CURRENCY': default_currency})
+                db.session.commit()
                 flash(f'Default currency updated to {default_currency}', 'success')
             else:
                 flash('Invalid currency selected', 'error')
@@ -85,20 +86,14 @@ def email():
         settings_to_update = {
             'MAIL_SERVER': request.form.get('mail_server', 'localhost'),
             'MAIL_PORT': int(request.form.get('mail_port', '1025')),
-            'MAIL_USE_TLS': str(request.form.get('mail_use_tls') == 'on'),
-            'MAIL_USE_SSL': str(request.form.get('mail_use_ssl') == 'on' and not (request.form.get('mail_use_tls') == 'on')),
+            'MAIL_USE_TLS': request.form.get('mail_use_tls') == 'on',
+            'MAIL_USE_SSL': request.form.get('mail_use_ssl') == 'on' and not (request.form.get('mail_use_tls') == 'on'),
             'MAIL_USERNAME': request.form.get('mail_username', ''),
             'MAIL_PASSWORD': request.form.get('mail_password', ''),
             'MAIL_DEFAULT_SENDER': request.form.get('mail_default_sender', 'noreply@chrisnov-invoice.local')
         }
 
-        for key, value in settings_to_update.items():
-            update_setting(key, str(value))
-            if key in ['MAIL_USE_TLS', 'MAIL_USE_SSL']:
-                current_app.config[key] = value.lower() == 'true'
-            else:
-                current_app.config[key] = value
-
+        save_settings(settings_to_update)
         db.session.commit() # Commit changes to the database
 
         # Reinitialize mail with new settings
@@ -118,8 +113,9 @@ def business():
             logo_path = os.path.join('app/static/images', 'logo.png')
             if os.path.exists(logo_path):
                 os.remove(logo_path)
-                current_app.config['LOGO_FILENAME'] = None
-                update_setting('LOGO_FILENAME', '')
+                save_settings({'LOGO_FILENAME': None})
+                db.session.commit()
+                clear_pdf_caches()
                 flash('Logo removed successfully!', 'success')
             else:
                 flash('No logo to remove.', 'info')
@@ -131,10 +127,10 @@ def business():
             if file and allowed_file(file.filename):
                 filename = secure_filename(file.filename)
                 # to keep the original filename, I will save it to the config
-                current_app.config['LOGO_FILENAME'] = filename
-                update_setting('LOGO_FILENAME', filename)
+                save_settings({'LOGO_FILENAME': filename})
                 # and save the file as logo.png
                 file.save(os.path.join('app/static/images', 'logo.png'))
+                clear_pdf_caches()
 
         # Update business information
         business_name = request.form.get('business_name', '').strip()
@@ -169,18 +165,12 @@ def business():
             'BUSINESS_PHONE': business_phone,
             'BUSINESS_WEBSITE': business_website,
             'BUSINESS_ADDRESS': business_address,
-            'TAX_RATE': str(tax_rate),
+            'TAX_RATE': tax_rate,
             'DEFAULT_CURRENCY': default_currency
         }
 
         # Update database and config
-        for key, value in settings_to_update.items():
-            update_setting(key, value)
-            if key == 'TAX_RATE':
-                current_app.config[key] = float(value)
-            else:
-                current_app.config[key] = value
-        
+        save_settings(settings_to_update)
         db.session.commit()
 
         flash('Business information updated successfully!', 'success')
@@ -247,17 +237,11 @@ def pdf_templates():
             'PDF_ACCENT_COLOR': accent_color,
             'PDF_LOGO_POSITION': logo_position,
             'PDF_FOOTER_TEXT': footer_text or 'Thank you for your business!',
-            'PDF_SHOW_LOGO': str(show_logo)
+            'PDF_SHOW_LOGO': show_logo
         }
 
         # Update database and config
-        for key, value in settings_to_update.items():
-            update_setting(key, value)
-            if key == 'PDF_SHOW_LOGO':
-                current_app.config[key] = (value.lower() == 'true')
-            else:
-                current_app.config[key] = value
-        
+        save_settings(settings_to_update)
         db.session.commit()
 
         flash('PDF template settings updated successfully!', 'success')
@@ -268,21 +252,68 @@ def pdf_templates():
 @bp.route('/backup', methods=['GET'])
 def backup_index():
     """Display backup and restore options"""
-    return render_template('settings/backup.html')
+    has_rollback = os.path.exists(BackupService.get_rollback_path())
+    return render_template('settings/backup.html',
+                         has_rollback=has_rollback,
+                         export_formats=BackupService.available_export_formats(),
+                         scheduled_backups=BackupService.list_scheduled_backups())
+
+@bp.route('/backup/schedule', methods=['POST'])
+def backup_schedule():
+    """Update the automatic backup schedule"""
+    try:
+        interval = int(request.form.get('backup_interval') or 0)
+        retention = int(request.form.get('backup_retention') or 14)
+        if interval < 0 or retention < 1:
+            raise ValueError
+    except ValueError:
+        flash('Backup interval must be zero or more minutes and at least one backup must be kept.', 'error')
+        return redirect(url_for('settings.backup_index'))
+
+    backup_dir = request.form.get('backup_dir', '').strip()
+
+    settings_to_update = {
+        'BACKUP_SCHEDULE_INTERVAL': interval,
+        'BACKUP_SCHEDULE_RETENTION': retention,
+        'BACKUP_SCHEDULE_DIR': backup_dir
+    }
+
+    # Update database and config
+    save_settings(settings_to_update)
+    db.session.commit()
+
+    flash('Backup schedule updated successfully!', 'success')
+    return redirect(url_for('settings.backup_index'))
 
 @bp.route('/backup/export', methods=['GET'])
 def export_db():
-    """Download current database file"""
-    db_path = BackupService.get_db_path()
-    if os.path.exists(db_path):
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H%M%S')
-        return send_file(
-            db_path,
-            as_attachment=True,
-            download_name=f"chrisnov_invoice_backup_{timestamp}.db"
-        )
-    flash('Database file not found.', 'error')
-    return redirect(url_for('settings.backup_index'))
+    """Download a consistent, optionally compressed snapshot of the current database"""
+    compression = request.args.get('compression', 'none')
+    if compression not in BackupService.available_export_formats():
+        flash('Unsupported export format.', 'error')
+        return redirect(url_for('settings.backup_index'))
+
+    chunks, error = BackupService.stream_snapshot()
+    if chunks is None:
+        flash(f'Export failed: {error}', 'error')
+        return redirect(url_for('settings.backup_index'))
+
+    mimetypes = {
+        'none': 'application/x-sqlite3' if BackupService.is_sqlite() else 'application/x-ndjson',
+        'gzip': 'application/gzip',
+        'zstd': 'application/zstd'
+    }
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H%M%S')
+    filename = f"chrisnov_invoice_backup_{timestamp}{BackupService.snapshot_extension()}{EXPORT_FORMATS[compression]}"
+    response = Response(
+        BackupService.compress_chunks(chunks, compression),
+        mimetype=mimetypes[compression],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+    # Also runs for HEAD requests and downloads cut short, which never
+    # finish iterating the body
+    response.call_on_close(chunks.close)
+    return response
 
 @bp.route('/backup/import', methods=['POST'])
 def import_db():
@@ -296,9 +327,8 @@ def import_db():
         flash('No file selected.', 'error')
         return redirect(url_for('settings.backup_index'))
     
-    if file and file.filename.endswith('.db'):
-        # Save temp file
-        temp_path = os.path.join(current_app.instance_path, 'temp_restore.db')
+    if file and file.filename.endswith(('.db', '.jsonl', '.gz', '.zst')):
+        temp_path = BackupService.staging_path('upload_')
         file.save(temp_path)
         
         success, error = BackupService.restore_from_file(temp_path)
@@ -307,11 +337,85 @@ def import_db():
             os.remove(temp_path)
             
         if success:
-            flash('Database restored successfully! Please restart the application if you encounter issues.', 'success')
+            flash('Database restored successfully! The previous database was kept as a rollback point.', 'success')
         else:
             flash(f'Restore failed: {error}', 'error')
     else:
-        flash('Invalid file format. Please upload a .db file.', 'error')
+        flash('Invalid file format. Please upload a .db or .jsonl backup, optionally compressed (.gz, .zst).', 'error')
         
     return redirect(url_for('settings.backup_index'))
 
+@bp.route('/backup/rollback', methods=['POST'])
+def rollback_db():
+    """Swap back the database that was replaced by the last restore"""
+    success, error = BackupService.rollback_restore()
+    if success:
+        flash('Previous database restored successfully!', 'success')
+    else:
+        flash(f'Rollback failed: {error}', 'error')
+    return redirect(url_for('settings.backup_index'))
+
+def import_rejects_dir():
+    return os.path.join(current_app.instance_path, 'imports')
+
+@bp.route('/import', methods=['GET', 'POST'])
+def import_data():
+    """Bulk import clients, invoices or line items from CSV"""
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        file = request.files.get('csv_file')
+        if kind not in IMPORT_KINDS:
+            flash('Choose what the file contains.', 'error')
+            return redirect(url_for('settings.import_data'))
+        if not file or not file.filename.lower().endswith('.csv'):
+            flash('Please upload a .csv file.', 'error')
+            return redirect(url_for('settings.import_data'))
+
+        # The upload is parsed as it is read, and rejected rows are kept
+        # next to the database for download
+        os.makedirs(import_rejects_dir(), exist_ok=True)
+        rejects_name = f"{kind}_rejects_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.csv"
+        rejects_path = os.path.join(import_rejects_dir(), rejects_name)
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        with open(rejects_path, 'w', newline='', encoding='utf-8') as reject_stream:
+            report, error = import_csv(kind, stream, reject_stream)
+
+        if report is None or not report['rejected']:
+            os.remove(rejects_path)
+            rejects_name = None
+        if report is not None:
+            flash(f"Imported {report['imported']} {kind}, rejected {report['rejected']}.",
+                  'success' if not report['rejected'] and not error else 'warning')
+        if error:
+            flash(f'Import stopped: {error}', 'error')
+        return redirect(url_for('settings.import_data', rejects=rejects_name))
+
+    return render_template('settings/import.html',
+                         kinds=IMPORT_KINDS,
+                         columns=COLUMNS,
+                         required_columns=REQUIRED_COLUMNS,
+                         rejects=request.args.get('rejects'))
+
+@bp.route('/import/rejects/<filename>')
+def import_rejects(filename):
+    """Download the rows rejected by an import"""
+    return send_from_directory(import_rejects_dir(), secure_filename(filename),
+                               as_attachment=True, mimetype='text/csv')
+
+@bp.route('/profiles')
+def profiles():
+    """Recent request profiles and the slowest functions of the selected one"""
+    stored = list_profiles(current_app)
+    selected = request.args.get('name') or (stored[0]['name'] if stored else None)
+    profile = next((p for p in stored if p['name'] == selected), None)
+    functions = top_functions(current_app, profile['name']) if profile else None
+    return render_template('settings/profiles.html',
+                         profiles=stored,
+                         profile=profile,
+                         functions=functions)
+
+@bp.route('/profiles/<name>.prof')
+def download_profile(name):
+    """Download a stored profile for snakeviz, pstats and the like"""
+    return send_from_directory(profiles_dir(current_app), secure_filename(f'{name}.prof'),
+                               as_attachment=True, mimetype='application/octet-stream')
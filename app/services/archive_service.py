@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import DateTime, delete, func, insert, literal, select
+from app.extensions import db
+from app.models import ArchivedInvoice, ArchivedInvoiceItem, Invoice, InvoiceItem
+
+# Only settled invoices are archived; they no longer change
+ARCHIVABLE_STATUSES = ('paid', 'cancelled')
+
+
+def _shared_columns(source, archive):
+    """Columns of a table that its archive table also has, in archive order."""
+    return [column.name for column in archive.__table__.columns if column.name in source.__table__.columns]
+
+
+def _archivable(cutoff):
+    return (Invoice.status.in_(ARCHIVABLE_STATUSES), Invoice.issue_date < cutoff)
+
+
+def archive_cutoff(older_than_days=None):
+    """Issue date before which settled invoices are archived."""
+    if older_than_days is None:
+        older_than_days = current_app.config['ARCHIVE_AFTER_DAYS']
+    return datetime.utcnow().date() - timedelta(days=older_than_days)
+
+
+def count_archivable_invoices(older_than_days=None):
+    cutoff = archive_cutoff(older_than_days)
+    return db.session.execute(select(func.count(Invoice.id)).where(*_archivable(cutoff))).scalar()
+
+
+def archive_invoices(older_than_days=None, batch_size=None):
+    """Move settled invoices older than the cutoff, with their items, to the archive tables.
+
+    Invoices are moved ``batch_size`` at a time. Each batch is copied with
+    INSERT ... SELECT and removed from the hot tables in its own
+    transaction, so the write lock is only held briefly and an interrupted
+    run leaves every invoice in exactly one place. Client stats already
+    include archived invoices and don't change. Returns the number of
+    invoices archived.
+    """
+    cutoff = archive_cutoff(older_than_days)
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+
+    invoices, items = Invoice.__table__, InvoiceItem.__table__
+    invoice_columns = _shared_columns(Invoice, ArchivedInvoice)
+    item_columns = _shared_columns(InvoiceItem, ArchivedInvoiceItem)
+
+    archived = 0
+    while True:
+        ids = db.session.execute(
+            select(Invoice.id).where(*_archivable(cutoff)).order_by(Invoice.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        try:
+            archived_at = literal(datetime.utcnow(), DateTime)
+            db.session.execute(insert(ArchivedInvoice.__table__).from_select(
+                invoice_columns + ['archived_at'],
+                select(*(invoices.c[name] for name in invoice_columns), archived_at).where(invoices.c.id.in_(ids))
+            ))
+            db.session.execute(insert(ArchivedInvoiceItem.__table__).from_select(
+                item_columns,
+                select(*(items.c[name] for name in item_columns)).where(items.c.invoice_id.in_(ids))
+            ))
+            db.session.execute(delete(items).where(items.c.invoice_id.in_(ids)))
+            db.session.execute(delete(invoices).where(invoices.c.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        archived += len(ids)
+
+    return archived
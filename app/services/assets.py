@@ -0,0 +1,45 @@
+import json
+import os
+
+from flask import current_app, request, url_for
+
+# Fingerprinted build output (written by build_assets.py) under the static
+# folder, and the manifest mapping each asset to its current file there
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+
+def load_manifest(static_folder):
+    """The asset name -> fingerprinted file mapping, empty before a build"""
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(name):
+    """URL of the fingerprinted build of a static asset.
+
+    Returns None when build_assets.py has not built ``name``, so templates
+    can fall back to loading it another way.
+    """
+    filename = current_app.extensions['asset_manifest'].get(name)
+    return url_for('static', filename=filename) if filename else None
+
+
+def cache_fingerprinted_assets(response):
+    """Let browsers keep fingerprinted files until their name changes"""
+    if request.endpoint == 'static' and response.status_code == 200:
+        if request.view_args.get('filename') in current_app.extensions['asset_files']:
+            response.headers['Cache-Control'] = f"public, max-age={current_app.config['ASSET_MAX_AGE']}, immutable"
+    return response
+
+
+def init_assets(app):
+    app.config.setdefault('ASSET_MAX_AGE', 365 * 24 * 3600)
+    manifest = load_manifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+    app.extensions['asset_files'] = frozenset(manifest.values())
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.after_request(cache_fingerprinted_assets)
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+from app.services.backup_service import BackupService
+
+
+class BackupScheduler:
+    """Background thread that writes a scheduled backup every interval.
+
+    The schedule is read from the app config on every poll, so changes made
+    on the backup settings page apply without a restart. Each gunicorn
+    worker runs its own thread; a lock file in the backup directory and the
+    age of the newest backup make sure only one of them writes a backup per
+    interval.
+
+    create_app only registers the scheduler. The serving entry points
+    (wsgi.py, run.py and run_desktop.py) start it with start_if_enabled(),
+    so flask CLI commands such as ``db upgrade`` never take a backup while
+    they run.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._thread = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['backup_scheduler'] = self
+
+    def start_if_enabled(self):
+        """Start the thread unless BACKUP_SCHEDULER_ENABLED is off or the app is testing"""
+        if self.app.config.get('BACKUP_SCHEDULER_ENABLED', True) and not self.app.testing:
+            self.start()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.run_pending()
+                except Exception:
+                    self.app.logger.exception('Scheduled backup failed')
+            self._stop.wait(self.app.config.get('BACKUP_SCHEDULE_POLL_SECONDS', 60))
+
+    @staticmethod
+    def _backup_is_due(interval_seconds):
+        backups = BackupService.list_scheduled_backups()
+        return not backups or time.time() - os.path.getmtime(backups[0]) >= interval_seconds
+
+    def run_pending(self):
+        """Write a backup if the newest one is older than the interval.
+
+        Must be called inside an app context. Returns the new backup's path,
+        or None when no backup was due or another worker holds the lock.
+        """
+        interval = self.app.config.get('BACKUP_SCHEDULE_INTERVAL', 0)
+        if not interval:
+            return None
+        interval_seconds = int(interval) * 60
+        if not self._backup_is_due(interval_seconds):
+            return None
+
+        backup_dir = BackupService.get_scheduled_backup_dir()
+        os.makedirs(backup_dir, exist_ok=True)
+        lock_path = os.path.join(backup_dir, '.schedule.lock')
+        try:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # A lock left by a worker that died mid-backup must not block
+            # the schedule forever
+            if time.time() - os.path.getmtime(lock_path) > self.app.config.get('BACKUP_SCHEDULE_LOCK_TIMEOUT', 3600):
+                os.remove(lock_path)
+            return None
+
+        try:
+            os.close(lock_fd)
+            # Another worker may have finished a backup while we waited
+            if not self._backup_is_due(interval_seconds):
+                return None
+            backup_path, error = BackupService.create_scheduled_backup()
+            if error:
+                self.app.logger.error(f'Scheduled backup failed: {error}')
+                return None
+            self.app.logger.info(f'Scheduled backup written to {backup_path}')
+            return backup_path
+        finally:
+            os.remove(lock_path)
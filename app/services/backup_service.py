@@ -1,23 +1,155 @@
+import gzip
 import os
 import shutil
+import sqlite3
+import tempfile
+import zlib
 from datetime import datetime
+from alembic.config import Config as AlembicConfig
+from alembic.script import ScriptDirectory
 from flask import current_app
+from app.extensions import db
+from app.services.incremental_backup import IncrementalBackupStore
+from app.services.logical_backup import iter_logical_dump, load_logical_dump, read_dump_header
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Compressed export formats and the file extension each one adds
+EXPORT_FORMATS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+class _BackupRestarted(Exception):
+    """Raised from the progress callback to abandon a starved stepped backup."""
+
+
+class SnapshotReader:
+    """Iterates a staged snapshot file in chunks and removes it.
+
+    On POSIX the file is unlinked as soon as it is opened; the open handle
+    keeps the data readable, and nothing is left on disk however the
+    download ends. Elsewhere an open file can't be removed, so close()
+    removes it; responses call it even for HEAD requests and clients that
+    disconnect early.
+    """
+
+    def __init__(self, path, chunk_size):
+        self._file = open(path, 'rb')
+        self._path = path
+        self._chunk_size = chunk_size
+        if os.name == 'posix':
+            os.remove(path)
+            self._path = None
+
+    def __iter__(self):
+        return iter(lambda: self._file.read(self._chunk_size), b'')
+
+    def close(self):
+        self._file.close()
+        if self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
+
 
 class BackupService:
+    @staticmethod
+    def is_sqlite():
+        """Whether the app's database is a SQLite file."""
+        return db.engine.dialect.name == 'sqlite'
+
     @staticmethod
     def get_db_path():
-        """Get the absolute path to the SQLite database file."""
-        # Config says 'sqlite:///chrisnov_invoice.db'
-        # Usually this means it's in the instance folder if using Flask-SQLAlchemy correctly
-        return os.path.join(current_app.instance_path, 'chrisnov_invoice.db')
+        """Get the absolute path to the SQLite database file, or None for other backends."""
+        # Flask-SQLAlchemy resolves a relative 'sqlite:///chrisnov_invoice.db'
+        # against the instance folder, so the engine URL holds the real path
+        if not BackupService.is_sqlite():
+            return None
+        return db.engine.url.database
 
     @staticmethod
-    def create_backup_copy():
-        """Create a timestamped backup copy and return its path."""
+    def staging_path(prefix, suffix=''):
+        """Create an empty temporary file in the instance folder and return its path.
+
+        The folder is created first: Flask-SQLAlchemy only creates it for a
+        relative SQLite URI.
+        """
+        os.makedirs(current_app.instance_path, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=current_app.instance_path)
+        os.close(fd)
+        return path
+
+    @staticmethod
+    def snapshot_extension():
+        """File extension of the snapshots stream_snapshot produces."""
+        return '.db' if BackupService.is_sqlite() else '.jsonl'
+
+    @staticmethod
+    def snapshot_to(dest_path, pages=None, progress=None):
+        """Write a consistent copy of the live database to dest_path.
+
+        Uses the sqlite3 online backup API and copies ``pages`` pages per
+        step, so writers are only held off for the length of one step instead
+        of the whole copy. ``progress(status, remaining, total)`` is called
+        after every step.
+
+        SQLite restarts a stepped backup whenever another connection writes
+        to the source, so under constant write load it may never finish.
+        After ``BACKUP_MAX_RESTARTS`` restarts the copy is retried in a single
+        step, which briefly holds off writers but always completes.
+        """
         db_path = BackupService.get_db_path()
+        if db_path is None:
+            return False, "File snapshots are only available for SQLite databases."
         if not os.path.exists(db_path):
-            return None, "Database file not found."
+            return False, "Database file not found."
+
+        if pages is None:
+            pages = current_app.config.get('BACKUP_PAGES_PER_STEP', 256)
+        sleep = current_app.config.get('BACKUP_STEP_SLEEP', 0.005)
+        timeout = current_app.config.get('BACKUP_BUSY_TIMEOUT', 30)
+        max_restarts = current_app.config.get('BACKUP_MAX_RESTARTS', 5)
+
+        state = {'remaining': None, 'restarts': 0}
+
+        def on_step(status, remaining, total):
+            if state['remaining'] is not None and remaining > state['remaining']:
+                state['restarts'] += 1
+                if state['restarts'] > max_restarts:
+                    raise _BackupRestarted()
+            state['remaining'] = remaining
+            if progress:
+                progress(status, remaining, total)
+
+        try:
+            try:
+                BackupService._copy(db_path, dest_path, pages, on_step, sleep, timeout)
+            except _BackupRestarted:
+                BackupService._copy(db_path, dest_path, -1, progress, sleep, timeout)
+            return True, None
+        except Exception as e:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            return False, str(e)
+
+    @staticmethod
+    def _copy(db_path, dest_path, pages, progress, sleep, timeout):
+        source = sqlite3.connect(db_path, timeout=timeout)
+        try:
+            target = sqlite3.connect(dest_path)
+            try:
+                source.backup(target, pages=pages, progress=progress, sleep=sleep)
+            finally:
+                target.close()
+        finally:
+            source.close()
 
+    @staticmethod
+    def create_backup_copy(progress=None):
+        """Create a timestamped backup copy and return its path."""
         backup_dir = os.path.join(current_app.instance_path, 'backups')
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
@@ -26,35 +158,406 @@ class BackupService:
         backup_filename = f"backup_{timestamp}.db"
         backup_path = os.path.join(backup_dir, backup_filename)
 
+        success, error = BackupService.snapshot_to(backup_path, progress=progress)
+        if not success:
+            return None, error
+        return backup_path, None
+
+    @staticmethod
+    def stream_snapshot(chunk_size=None):
+        """Take a consistent snapshot and return an iterable over its bytes.
+
+        For SQLite the snapshot is staged in a temporary file in the instance
+        folder and opened at once (see SnapshotReader), so it does not
+        outlive the download even when the response body is never read.
+        Other backends stream a logical dump (see logical_backup) read in a
+        single transaction. Either way the caller closes the iterable.
+        """
+        if chunk_size is None:
+            chunk_size = current_app.config.get('BACKUP_STREAM_CHUNK_SIZE', 64 * 1024)
+
+        if not BackupService.is_sqlite():
+            return iter_logical_dump(db.engine, db.metadata, BackupService.get_migration_heads()), None
+
+        snapshot_path = BackupService.staging_path('export_', '.db')
+
+        success, error = BackupService.snapshot_to(snapshot_path)
+        if not success:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            return None, error
+
+        return SnapshotReader(snapshot_path, chunk_size), None
+
+    @staticmethod
+    def available_export_formats():
+        """Return the export compressions usable in this installation."""
+        return [name for name in EXPORT_FORMATS if name != 'zstd' or zstandard is not None]
+
+    @staticmethod
+    def compress_chunks(chunks, compression):
+        """Wrap an iterable of byte chunks so it is compressed chunk by chunk.
+
+        The compressor is set up here rather than in the generator, because
+        a streamed response iterates it after the app context is gone.
+        """
+        if compression == 'none':
+            return chunks
+
+        if compression == 'gzip':
+            level = current_app.config.get('BACKUP_COMPRESSION_LEVEL', 6)
+            # wbits=31 makes zlib write a gzip header and trailer
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif compression == 'zstd' and zstandard is not None:
+            compressor = zstandard.ZstdCompressor().compressobj()
+        else:
+            raise ValueError(f"Unsupported compression: {compression}")
+
+        def generate():
+            for chunk in chunks:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+
+        return generate()
+
+    @staticmethod
+    def decompress_to_file(src_path, dest_path):
+        """Write src_path to dest_path, decompressing gzip or zstd uploads.
+
+        The format is detected from the file's magic bytes rather than its
+        name. Plain SQLite files are copied unchanged.
+        """
+        with open(src_path, 'rb') as f:
+            magic = f.read(4)
+
+        chunk_size = current_app.config.get('BACKUP_STREAM_CHUNK_SIZE', 64 * 1024)
+        if magic.startswith(GZIP_MAGIC):
+            with gzip.open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+                shutil.copyfileobj(src, dest, chunk_size)
+        elif magic == ZSTD_MAGIC:
+            if zstandard is None:
+                raise ValueError("zstd backups need the zstandard package installed.")
+            with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+                zstandard.ZstdDecompressor().copy_stream(src, dest, read_size=chunk_size)
+        elif magic == SQLITE_MAGIC[:4] or magic.startswith(b'{'):
+            shutil.copyfile(src_path, dest_path)
+        else:
+            raise ValueError("Unrecognised backup format.")
+
+    @staticmethod
+    def get_scheduled_backup_dir():
+        """Get the directory scheduled backups are written to."""
+        return current_app.config.get('BACKUP_SCHEDULE_DIR') or os.path.join(current_app.instance_path, 'backups', 'scheduled')
+
+    @staticmethod
+    def list_scheduled_backups():
+        """List scheduled backup files, newest first."""
+        backup_dir = BackupService.get_scheduled_backup_dir()
+        if not os.path.isdir(backup_dir):
+            return []
+        backups = [
+            os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+            if name.startswith('auto_backup_') and name.endswith('.gz')
+        ]
+        backups.sort(key=os.path.getmtime, reverse=True)
+        return backups
+
+    @staticmethod
+    def create_scheduled_backup():
+        """Write a gzip-compressed snapshot and keep the newest few.
+
+        Keeps BACKUP_SCHEDULE_RETENTION scheduled backups and deletes older
+        ones. Returns the path of the new backup, or None and an error.
+        """
+        backup_dir = BackupService.get_scheduled_backup_dir()
+        os.makedirs(backup_dir, exist_ok=True)
+
+        chunks, error = BackupService.stream_snapshot()
+        if chunks is None:
+            return None, error
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_path = os.path.join(backup_dir, f"auto_backup_{timestamp}{BackupService.snapshot_extension()}.gz")
+        partial_path = backup_path + '.partial'
+        try:
+            with open(partial_path, 'wb') as f:
+                for data in BackupService.compress_chunks(chunks, 'gzip'):
+                    f.write(data)
+            os.replace(partial_path, backup_path)
+        except Exception as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return None, str(e)
+        finally:
+            chunks.close()
+
+        retention = current_app.config.get('BACKUP_SCHEDULE_RETENTION', 14)
+        for old_backup in BackupService.list_scheduled_backups()[retention:]:
+            os.remove(old_backup)
+
+        return backup_path, None
+
+    @staticmethod
+    def get_incremental_store():
+        """Get the chunk store used for incremental backups."""
+        return IncrementalBackupStore(
+            os.path.join(current_app.instance_path, 'backups', 'incremental'),
+            chunk_pages=current_app.config.get('BACKUP_CHUNK_PAGES', 16),
+            compression_level=current_app.config.get('BACKUP_COMPRESSION_LEVEL', 6)
+        )
+
+    @staticmethod
+    def create_incremental_backup():
+        """Store only the changed chunks of a fresh snapshot and prune old backups.
+
+        Returns a report dict (see IncrementalBackupStore.add) with the prune
+        results under ``pruned``, or None and an error message.
+        """
+        if not BackupService.is_sqlite():
+            return None, "Incremental backups are only available for SQLite databases."
+
+        store = BackupService.get_incremental_store()
+        snapshot_path = BackupService.staging_path('incremental_', '.db')
         try:
-            shutil.copy2(db_path, backup_path)
-            return backup_path, None
+            success, error = BackupService.snapshot_to(snapshot_path)
+            if not success:
+                return None, error
+            report = store.add(snapshot_path)
+            retention = current_app.config.get('BACKUP_RETENTION', {})
+            report['pruned'] = store.prune(**retention)
+            return report, None
         except Exception as e:
             return None, str(e)
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
+    @staticmethod
+    def list_incremental_backups():
+        """List incremental backup manifests, newest first."""
+        return BackupService.get_incremental_store().list_manifests()
+
+    @staticmethod
+    def restore_manifest(name):
+        """Rebuild an incremental backup and restore it as the live database."""
+        store = BackupService.get_incremental_store()
+        rebuilt_path = BackupService.staging_path('rebuild_', '.db')
+        try:
+            store.restore(name, rebuilt_path)
+            return BackupService.restore_from_file(rebuilt_path)
+        except Exception as e:
+            return False, str(e)
+        finally:
+            if os.path.exists(rebuilt_path):
+                os.remove(rebuilt_path)
+
+    @staticmethod
+    def get_rollback_path():
+        """Get the path where the database replaced by the last restore is kept."""
+        if not BackupService.is_sqlite():
+            return os.path.join(current_app.instance_path, 'database.rollback.jsonl')
+        return BackupService.get_db_path() + '.rollback'
+
+    @staticmethod
+    def get_migration_heads():
+        """Return the Alembic head revisions of the migrations directory."""
+        migrate_ext = current_app.extensions.get('migrate')
+        if migrate_ext is None or not os.path.isdir(migrate_ext.directory):
+            return set()
+        alembic_config = AlembicConfig()
+        alembic_config.set_main_option('script_location', migrate_ext.directory)
+        return set(ScriptDirectory.from_config(alembic_config).get_heads())
+
+    @staticmethod
+    def validate_backup(path):
+        """Check that a file is a healthy database this version can use.
+
+        Runs PRAGMA integrity_check, checks that every table and column the
+        models need is present and, when the file records a migration
+        revision, that it matches the Alembic head.
+        """
+        try:
+            # immutable: a backup file has no other users, and opening it
+            # this way leaves no -wal/-shm files behind
+            conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+        except sqlite3.Error as e:
+            return False, f"Cannot open backup: {e}"
+
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+            if result != 'ok':
+                return False, f"Backup failed the integrity check: {result}"
+
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in db.metadata.sorted_tables:
+                if table.name not in tables:
+                    return False, f"Backup is missing the {table.name} table."
+                columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table.name}")')}
+                missing = [c.name for c in table.columns if c.name not in columns]
+                if missing:
+                    return False, f"Backup table {table.name} is missing columns: {', '.join(missing)}."
+
+            if 'alembic_version' in tables:
+                heads = BackupService.get_migration_heads()
+                revisions = {row[0] for row in conn.execute('SELECT version_num FROM alembic_version')}
+                if heads and revisions != heads:
+                    return False, (f"Backup is at migration {', '.join(sorted(revisions)) or 'none'} "
+                                   f"but this version expects {', '.join(sorted(heads))}.")
+        except sqlite3.DatabaseError as e:
+            return False, f"Backup is not a valid database: {e}"
+        finally:
+            conn.close()
+
+        return True, None
 
     @staticmethod
     def restore_from_file(uploaded_file_path):
-        """Replace the current database with the uploaded file."""
+        """Replace the current database with the uploaded file.
+
+        Accepts SQLite files and logical dumps, either plain or gzip/zstd
+        compressed; the format is detected from the file's magic bytes.
+        """
+        with open(uploaded_file_path, 'rb') as f:
+            magic = f.read(4)
+
+        if magic.startswith(GZIP_MAGIC) or magic == ZSTD_MAGIC:
+            staged_path = BackupService.staging_path('restore_')
+            try:
+                BackupService.decompress_to_file(uploaded_file_path, staged_path)
+                with open(staged_path, 'rb') as f:
+                    magic = f.read(4)
+                if magic.startswith(b'{'):
+                    return BackupService._restore_logical(staged_path)
+                return BackupService._restore_sqlite(staged_path)
+            except Exception as e:
+                return False, str(e)
+            finally:
+                if os.path.exists(staged_path):
+                    os.remove(staged_path)
+
+        if magic.startswith(b'{'):
+            return BackupService._restore_logical(uploaded_file_path)
+        return BackupService._restore_sqlite(uploaded_file_path)
+
+    @staticmethod
+    def _restore_sqlite(uploaded_file_path):
+        """Copy a SQLite backup file into the live database.
+
+        The upload is validated first, and the current contents are saved to
+        get_rollback_path(). The backup is then written into the live file
+        with the sqlite3 backup API in a single step, under SQLite's own
+        write lock and through its WAL. Other workers and the scheduler keep
+        their connections and see the restored data in their next
+        transaction; the database file is never renamed or replaced while
+        they have it open.
+        """
+        if not BackupService.is_sqlite():
+            return False, "SQLite backups can only be restored into a SQLite database."
+
+        success, error = BackupService.validate_backup(uploaded_file_path)
+        if not success:
+            return False, error
+
         db_path = BackupService.get_db_path()
-        
-        try:
-            # Create a safety backup of current state
-            safety_backup = db_path + ".tmp"
-            if os.path.exists(db_path):
-                shutil.copy2(db_path, safety_backup)
-
-            # Copy uploaded file to db path
-            shutil.copy2(uploaded_file_path, db_path)
-            
-            # Remove safety backup if everything went well
-            if os.path.exists(safety_backup):
-                os.remove(safety_backup)
-                
-            return True, None
+        timeout = current_app.config.get('BACKUP_BUSY_TIMEOUT', 30)
+        db.session.remove()
+        db.engine.dispose()
+
+        # Kept aside until the restore succeeds, so a failed one leaves the
+        # previous rollback point in place
+        rollback_path = BackupService.get_rollback_path()
+        partial_path = rollback_path + '.partial'
+        if os.path.exists(db_path):
+            success, error = BackupService.snapshot_to(partial_path, pages=-1)
+            if not success:
+                return False, f"Could not save the current database for rollback: {error}"
+
+        try:
+            BackupService._copy_into_live(uploaded_file_path, db_path, timeout)
+        except sqlite3.Error as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return False, str(e)
+        finally:
+            db.engine.dispose()
+
+        if os.path.exists(partial_path):
+            os.replace(partial_path, rollback_path)
+        return True, None
+
+    @staticmethod
+    def _copy_into_live(src_path, db_path, timeout):
+        source = sqlite3.connect(f"file:{src_path}?mode=ro&immutable=1", uri=True)
+        try:
+            target = sqlite3.connect(db_path, timeout=timeout)
+            try:
+                # Fold the WAL into the main file first. A busy result means
+                # another connection kept it from finishing, so the restore
+                # is refused rather than raced.
+                busy, _, _ = target.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+                if busy:
+                    raise sqlite3.OperationalError("The database is busy; try the restore again in a moment.")
+                source.backup(target, pages=-1)
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+    @staticmethod
+    def _restore_logical(dump_path):
+        """Load a logical dump into the live database, whatever its backend.
+
+        The current contents are saved to get_rollback_path() first, then the
+        dump is loaded in one transaction, so a failed load changes nothing.
+        """
+        try:
+            with open(dump_path, 'rb') as f:
+                header = read_dump_header(f.readline())
+        except ValueError as e:
+            return False, str(e)
+
+        heads = BackupService.get_migration_heads()
+        revisions = set(header.get('revisions') or [])
+        if heads and revisions and revisions != heads:
+            return False, (f"Backup is at migration {', '.join(sorted(revisions))} "
+                           f"but this version expects {', '.join(sorted(heads))}.")
+
+        rollback_path = BackupService.get_rollback_path()
+        os.makedirs(os.path.dirname(rollback_path), exist_ok=True)
+        try:
+            db.session.remove()
+            if BackupService.is_sqlite():
+                success, error = BackupService.snapshot_to(rollback_path)
+                if not success:
+                    return False, error
+            else:
+                partial_path = rollback_path + '.partial'
+                with open(partial_path, 'wb') as f:
+                    for chunk in iter_logical_dump(db.engine, db.metadata, heads):
+                        f.write(chunk)
+                os.replace(partial_path, rollback_path)
+
+            with open(dump_path, 'rb') as f:
+                load_logical_dump(db.engine, db.metadata, f)
         except Exception as e:
-            # Attempt to restore safety backup if it exists
-            safety_backup = db_path + ".tmp"
-            if os.path.exists(safety_backup):
-                shutil.copy2(safety_backup, db_path)
-                os.remove(safety_backup)
             return False, str(e)
+
+        return True, None
+
+    @staticmethod
+    def rollback_restore():
+        """Restore the database replaced by the last restore."""
+        rollback_path = BackupService.get_rollback_path()
+        if not os.path.exists(rollback_path):
+            return False, "No previous database to roll back to."
+
+        staged_path = BackupService.staging_path('rollback_', '.db')
+        os.replace(rollback_path, staged_path)
+        success, error = BackupService.restore_from_file(staged_path)
+        if success:
+            os.remove(staged_path)
+        else:
+            os.replace(staged_path, rollback_path)
+        return success, error
@@ -0,0 +1,174 @@
+from itertools import chain
+
+from sqlalchemy import and_, bindparam, case, delete, event, func, inspect, insert, or_, select, union_all, update
+from app.extensions import db
+from app.models import ArchivedInvoice, Client, ClientCurrencyTotal, Invoice
+from app.money import MAX_EXPONENT
+
+# Statuses counted towards a client's outstanding and paid totals, matching
+# the dashboard's pending amount and revenue
+OUTSTANDING_STATUSES = ('sent', 'unpaid', 'overdue')
+PAID_STATUSES = ('paid',)
+
+STATS_COLUMNS = ('invoice_count', 'last_invoice_date')
+# Expired on loaded clients once their stats are rewritten
+STATS_ATTRIBUTES = STATS_COLUMNS + ('currency_totals',)
+
+
+def _stats_for(model):
+    """Correlated subqueries computing each stats column over one invoice table."""
+    def per_client(expression):
+        return select(expression).where(model.client_id == Client.id).scalar_subquery()
+
+    return {
+        'invoice_count': per_client(func.count(model.id)),
+        'last_invoice_date': per_client(func.max(model.issue_date)),
+    }
+
+
+def _stats_expressions():
+    """Stats of a client over both its current and its archived invoices."""
+    current = _stats_for(Invoice)
+    archived = _stats_for(ArchivedInvoice)
+    latest, archived_latest = current['last_invoice_date'], archived['last_invoice_date']
+    return {
+        'invoice_count': current['invoice_count'] + archived['invoice_count'],
+        # Portable greatest() that ignores a missing side
+        'last_invoice_date': case(
+            (archived_latest.is_(None), latest),
+            (latest.is_(None), archived_latest),
+            (latest >= archived_latest, latest),
+            else_=archived_latest
+        ),
+    }
+
+
+def _currency_totals_query(client_ids=None):
+    """Outstanding and paid totals per client and currency, over current and
+    archived invoices. Pairs with nothing outstanding or paid are left out."""
+    parts = []
+    for model in (Invoice, ArchivedInvoice):
+        # Scale every total up to MAX_EXPONENT, so invoices written with an
+        # older exponent of the same currency still add up exactly
+        scale = case(
+            {exponent: 10 ** (MAX_EXPONENT - exponent) for exponent in range(MAX_EXPONENT + 1)},
+            value=model.currency_exponent,
+            else_=1
+        )
+        total = model.total_minor * scale
+        part = select(
+            model.client_id.label('client_id'),
+            # The column default, for rows written before currencies were set
+            func.coalesce(model.currency, 'IDR').label('currency'),
+            case((model.status.in_(OUTSTANDING_STATUSES), total), else_=0).label('outstanding'),
+            case((model.status.in_(PAID_STATUSES), total), else_=0).label('paid'),
+        )
+        if client_ids is not None:
+            part = part.where(model.client_id.in_(client_ids))
+        parts.append(part)
+    rows = union_all(*parts).subquery()
+    outstanding, paid = func.sum(rows.c.outstanding), func.sum(rows.c.paid)
+    return select(rows.c.client_id, rows.c.currency, outstanding, paid).group_by(
+        rows.c.client_id, rows.c.currency
+    ).having(or_(outstanding != 0, paid != 0))
+
+
+def _refresh_currency_totals(connection, client_ids=None):
+    """Bring the client_currency_totals rows in line with the invoices.
+
+    Only rows that differ are written. Returns the ids of the clients whose
+    totals changed.
+    """
+    table = ClientCurrencyTotal.__table__
+    wanted = {(client_id, currency): (outstanding, paid)
+              for client_id, currency, outstanding, paid in connection.execute(_currency_totals_query(client_ids))}
+    stored_query = select(table.c.client_id, table.c.currency, table.c.outstanding_total_minor, table.c.paid_total_minor)
+    if client_ids is not None:
+        stored_query = stored_query.where(table.c.client_id.in_(client_ids))
+    stored = {(client_id, currency): (outstanding, paid)
+              for client_id, currency, outstanding, paid in connection.execute(stored_query)}
+
+    def rows(keys):
+        return [{'key_client_id': client_id, 'key_currency': currency, 'outstanding_total_minor': wanted[client_id, currency][0],
+                 'paid_total_minor': wanted[client_id, currency][1]} for client_id, currency in keys]
+
+    removed = stored.keys() - wanted.keys()
+    added = wanted.keys() - stored.keys()
+    changed = [key for key in wanted.keys() & stored.keys() if wanted[key] != stored[key]]
+    matches = and_(table.c.client_id == bindparam('key_client_id'), table.c.currency == bindparam('key_currency'))
+    if removed:
+        connection.execute(delete(table).where(matches),
+                           [{'key_client_id': client_id, 'key_currency': currency} for client_id, currency in removed])
+    if changed:
+        connection.execute(update(table).where(matches).values(
+            outstanding_total_minor=bindparam('outstanding_total_minor'), paid_total_minor=bindparam('paid_total_minor')
+        ), rows(changed))
+    if added:
+        connection.execute(insert(table), [
+            {'client_id': row.pop('key_client_id'), 'currency': row.pop('key_currency'), **row} for row in rows(added)
+        ])
+    return {client_id for client_id, currency in chain(removed, added, changed)}
+
+
+def refresh_stats(connection, client_ids=None):
+    """Bring client stats in line with their invoices, on ``connection``.
+
+    Only clients whose stored stats differ are written, and updated_at is
+    kept as it was since the client itself did not change. Returns the ids
+    of the clients fixed.
+    """
+    stats = _stats_expressions()
+    differs = or_(*(getattr(Client, column).is_distinct_from(expression) for column, expression in stats.items()))
+    if client_ids is not None:
+        differs = and_(Client.id.in_(client_ids), differs)
+    fixed = set(connection.execute(select(Client.id).where(differs)).scalars())
+    if fixed:
+        connection.execute(update(Client).values(updated_at=Client.updated_at, **stats).where(differs))
+    return fixed | _refresh_currency_totals(connection, client_ids)
+
+
+def refresh_client_stats(client_ids=None):
+    """Recompute stats for the given clients, or all of them.
+
+    Use after bulk statements that change invoices without going through
+    the session. Returns the number of clients fixed; the caller commits.
+    """
+    if client_ids is not None and not client_ids:
+        return 0
+    return len(refresh_stats(db.session.connection(), client_ids))
+
+
+def _affected_client_ids(session):
+    client_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Invoice):
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        if obj.client_id is not None:
+            client_ids.add(obj.client_id)
+        # An invoice moved to another client changes both clients' stats
+        client_ids.update(i for i in inspect(obj).attrs.client_id.history.deleted if i is not None)
+    return client_ids
+
+
+def _after_flush(session, flush_context):
+    client_ids = _affected_client_ids(session)
+    if client_ids:
+        refresh_stats(session.connection(), client_ids)
+        session.info.setdefault('client_stats_refreshed', set()).update(client_ids)
+
+
+def _after_flush_postexec(session, flush_context):
+    # Loaded clients still hold the values from before the UPDATE
+    for client_id in session.info.pop('client_stats_refreshed', ()):
+        client = session.identity_map.get(session.identity_key(Client, client_id))
+        if client is not None:
+            session.expire(client, STATS_ATTRIBUTES)
+
+
+def init_client_stats():
+    """Keep client stats current whenever invoices are flushed."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_flush_postexec', _after_flush_postexec)
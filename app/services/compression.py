@@ -0,0 +1,153 @@
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # brotli support is optional
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# Statuses whose response has no body to compress
+NO_BODY_STATUSES = (204, 206, 304)
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class CompressionMiddleware:
+    """Compress text responses with brotli (when installed) or gzip.
+
+    Only responses whose Content-Type is in COMPRESSION_MIMETYPES are
+    compressed, and only when the client accepts the encoding. Responses
+    with a Content-Length below COMPRESSION_MIN_SIZE are sent as they are.
+    A response of known length is compressed whole and gets a new
+    Content-Length. A streamed one is compressed as it is read: the first
+    chunk and then every COMPRESSION_FLUSH_SIZE bytes of input are flushed
+    to the client, so exports start at once without being buffered.
+
+    Strong ETags become weak on compressed responses, as the bytes differ
+    from the uncompressed ones; If-None-Match still matches them.
+    """
+
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.app = app
+
+    def _encoding(self, environ):
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))
+        qualities = {encoding: accepted.quality(encoding) for encoding in available_encodings()}
+        encoding = max(qualities, key=lambda encoding: qualities[encoding])
+        return encoding if qualities[encoding] > 0 else None
+
+    def _compressor(self, encoding):
+        config = self.app.config
+        if encoding == 'br':
+            return BrotliCompressor(config['COMPRESSION_BROTLI_QUALITY'])
+        return GzipCompressor(config['COMPRESSION_LEVEL'])
+
+    def __call__(self, environ, start_response):
+        config = self.app.config
+        if not config['COMPRESSION_ENABLED'] or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+
+        response = {}
+
+        def capture_start_response(status_line, headers, exc_info=None):
+            response.update(status=status_line, headers=headers, exc_info=exc_info)
+            return self._write_unsupported
+
+        app_iter = self.wsgi_app(environ, capture_start_response)
+        status_line, headers = response['status'], response['headers']
+        fields = {name.lower(): value for name, value in headers}
+        mimetype = fields.get('content-type', '').split(';')[0].strip().lower()
+        if (int(status_line.split()[0]) in NO_BODY_STATUSES
+                or mimetype not in config['COMPRESSION_MIMETYPES']
+                or 'content-encoding' in fields
+                or 'no-transform' in fields.get('cache-control', '')):
+            start_response(status_line, headers, response['exc_info'])
+            return app_iter
+
+        # The representation depends on Accept-Encoding from here on
+        vary = fields.get('vary')
+        headers = [(name, value) for name, value in headers if name.lower() != 'vary']
+        headers.append(('Vary', f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'))
+
+        encoding = self._encoding(environ)
+        length = fields.get('content-length')
+        if encoding is None or (length is not None and int(length) < config['COMPRESSION_MIN_SIZE']):
+            start_response(status_line, headers, response['exc_info'])
+            return app_iter
+
+        headers = [(name, value) for name, value in headers if name.lower() not in ('content-length', 'etag')]
+        headers.append(('Content-Encoding', encoding))
+        etag = fields.get('etag')
+        if etag:
+            headers.append(('ETag', etag if etag.startswith('W/') else f'W/{etag}'))
+
+        chunks = self._compress(app_iter, self._compressor(encoding), length is None)
+        if length is not None:
+            body = b''.join(chunks)
+            headers.append(('Content-Length', str(len(body))))
+            start_response(status_line, headers, response['exc_info'])
+            return [body]
+        start_response(status_line, headers, response['exc_info'])
+        return chunks
+
+    def _compress(self, app_iter, compressor, streamed):
+        flush_size = self.app.config['COMPRESSION_FLUSH_SIZE']
+        pending, first = 0, True
+        try:
+            for chunk in app_iter:
+                if not chunk:
+                    continue
+                data = compressor.compress(chunk)
+                pending += len(chunk)
+                if streamed and (first or pending >= flush_size):
+                    data += compressor.flush()
+                    pending, first = 0, False
+                if data:
+                    yield data
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    @staticmethod
+    def _write_unsupported(data):
+        raise RuntimeError('write() is not supported by CompressionMiddleware')
+
+
+def init_compression(app):
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, app)
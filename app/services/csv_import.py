@@ -0,0 +1,314 @@
+import csv
+from datetime import datetime, timedelta
+from decimal import InvalidOperation
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import func, insert, select
+from app.extensions import db
+from app.models import ArchivedInvoice, Client, Currency, Invoice, InvoiceItem
+from app.money import line_amount_minor, to_minor
+from app.services.client_stats_service import refresh_client_stats
+from app.services.totals_service import recompute_invoice_totals
+
+IMPORT_KINDS = ('clients', 'invoices', 'items')
+
+# Columns understood for each kind of file; the first ones listed in
+# REQUIRED_COLUMNS must be present in the header
+COLUMNS = {
+    'clients': ('name', 'email', 'phone', 'address', 'company'),
+    'invoices': ('invoice_number', 'client_email', 'client_name', 'issue_date', 'due_date',
+                 'status', 'currency', 'tax_rate', 'notes'),
+    'items': ('invoice_number', 'description', 'quantity', 'rate'),
+}
+REQUIRED_COLUMNS = {
+    'clients': ('name',),
+    'invoices': ('invoice_number', 'issue_date'),
+    'items': ('invoice_number', 'description', 'rate'),
+}
+
+INVOICE_STATUSES = ('draft', 'sent', 'unpaid', 'paid', 'overdue', 'cancelled')
+
+# Columns written to the reject file ahead of the rejected row itself
+REJECT_COLUMNS = ('line', 'error')
+
+
+class RowError(ValueError):
+    """A row that can't be imported; the message goes to the reject file."""
+
+
+def _text(row, column, required=False, max_length=None):
+    value = (row.get(column) or '').strip()
+    if required and not value:
+        raise RowError(f'{column} is required')
+    if max_length and len(value) > max_length:
+        raise RowError(f'{column} is longer than {max_length} characters')
+    return value or None
+
+
+def _date(row, column, required=False):
+    value = _text(row, column, required)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise RowError(f'{column} must be a YYYY-MM-DD date')
+
+
+def _number(row, column, default):
+    value = _text(row, column)
+    if value is None:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise RowError(f'{column} must be a number')
+    if number < 0:
+        raise RowError(f'{column} must not be negative')
+    return number
+
+
+class ClientImporter:
+    """Clients, skipping any whose email already belongs to a client."""
+
+    table = Client.__table__
+
+    def __init__(self):
+        # Only the emails are needed to spot duplicates
+        self.emails = {
+            email.lower() for email in db.session.execute(
+                select(Client.email).where(Client.email.isnot(None))
+            ).scalars()
+        }
+
+    def parse(self, row):
+        record = {
+            'name': _text(row, 'name', required=True, max_length=200),
+            'email': _text(row, 'email', max_length=200),
+            'phone': _text(row, 'phone', max_length=50),
+            'address': _text(row, 'address'),
+            'company': _text(row, 'company', max_length=200),
+        }
+        if record['email']:
+            key = record['email'].lower()
+            if key in self.emails:
+                raise RowError(f"a client with email {record['email']} already exists")
+            self.emails.add(key)
+        return record
+
+    def prepare(self, rows):
+        # Duplicates are found from the emails loaded up front
+        pass
+
+
+class InvoiceImporter:
+    """Invoice headers. Totals start at zero and are filled in from the items."""
+
+    table = Invoice.__table__
+
+    def __init__(self):
+        # Client lookup by lowercased email or name, built with one query.
+        # A name shared by several clients maps to None and must be
+        # resolved by email instead.
+        self.by_email, self.by_name = {}, {}
+        for client_id, email, name in db.session.execute(select(Client.id, Client.email, Client.name)):
+            if email:
+                self.by_email.setdefault(email.strip().lower(), client_id)
+            key = name.strip().lower()
+            self.by_name[key] = None if key in self.by_name else client_id
+        self.exponents = {}
+        self.default_currency = current_app.config['DEFAULT_CURRENCY']
+
+    def _client_id(self, row):
+        email, name = _text(row, 'client_email'), _text(row, 'client_name')
+        if email:
+            client_id = self.by_email.get(email.lower())
+            if client_id is not None:
+                return client_id
+        if name:
+            key = name.lower()
+            if key in self.by_name:
+                if self.by_name[key] is None:
+                    raise RowError(f'several clients are named {name}; give client_email instead')
+                return self.by_name[key]
+        if not email and not name:
+            raise RowError('client_email or client_name is required')
+        raise RowError(f'no client matches {email or name}')
+
+    def _exponent(self, currency):
+        if currency not in self.exponents:
+            self.exponents[currency] = Currency.exponent_for(currency)
+        return self.exponents[currency]
+
+    def prepare(self, rows):
+        # Invoice numbers of this chunk that are already taken, by an earlier
+        # chunk or by an existing or archived invoice
+        numbers = [(row.get('invoice_number') or '').strip() for row in rows]
+        self.taken = set(db.session.execute(
+            select(Invoice.invoice_number).where(Invoice.invoice_number.in_(numbers))
+        ).scalars())
+        self.taken.update(db.session.execute(
+            select(ArchivedInvoice.invoice_number).where(ArchivedInvoice.invoice_number.in_(numbers))
+        ).scalars())
+
+    def parse(self, row):
+        number = _text(row, 'invoice_number', required=True, max_length=50)
+        if number in self.taken:
+            raise RowError(f'invoice {number} already exists')
+        client_id = self._client_id(row)
+        issue_date = _date(row, 'issue_date', required=True)
+        due_date = _date(row, 'due_date') or issue_date + timedelta(days=30)
+        status = (_text(row, 'status') or 'draft').lower()
+        if status not in INVOICE_STATUSES:
+            raise RowError(f'unknown status {status}')
+        currency = (_text(row, 'currency') or self.default_currency).upper()
+        if len(currency) != 3:
+            raise RowError(f'unknown currency {currency}')
+        tax_rate = _number(row, 'tax_rate', 0) / 100
+        self.taken.add(number)
+        return {
+            'invoice_number': number,
+            'client_id': client_id,
+            'issue_date': issue_date,
+            'due_date': due_date,
+            'status': status,
+            'currency': currency,
+            'currency_exponent': self._exponent(currency),
+            'subtotal_minor': 0,
+            'tax_rate': tax_rate,
+            'tax_amount_minor': 0,
+            'total_minor': 0,
+            'notes': _text(row, 'notes'),
+        }
+
+
+class ItemImporter:
+    """Line items, appended after any items their invoice already has."""
+
+    table = InvoiceItem.__table__
+
+    def prepare(self, rows):
+        # Id, currency exponent and next free position of every invoice the
+        # chunk refers to, in one grouped query. Only the invoices of the
+        # current chunk are held, so memory stays flat however long the file.
+        numbers = {(row.get('invoice_number') or '').strip() for row in rows}
+        self.invoices = {
+            number: [invoice_id, exponent, next_position]
+            for number, invoice_id, exponent, next_position in db.session.execute(
+                select(
+                    Invoice.invoice_number, Invoice.id, Invoice.currency_exponent,
+                    func.coalesce(func.max(InvoiceItem.position) + 1, 0)
+                ).outerjoin(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+                .where(Invoice.invoice_number.in_(numbers))
+                .group_by(Invoice.id, Invoice.invoice_number, Invoice.currency_exponent)
+            )
+        }
+
+    def parse(self, row):
+        number = _text(row, 'invoice_number', required=True)
+        invoice = self.invoices.get(number)
+        if invoice is None:
+            raise RowError(f'no invoice numbered {number}')
+        invoice_id, exponent, position = invoice
+        description = _text(row, 'description', required=True, max_length=500)
+        quantity = _number(row, 'quantity', 1)
+        try:
+            rate_minor = to_minor(_text(row, 'rate', required=True), exponent)
+        except (InvalidOperation, ValueError):
+            raise RowError('rate must be a number')
+        invoice[2] += 1
+        return {
+            'invoice_id': invoice_id,
+            'position': position,
+            'description': description,
+            'quantity': quantity,
+            'rate_minor': rate_minor,
+            'amount_minor': line_amount_minor(quantity, rate_minor),
+        }
+
+
+IMPORTERS = {
+    'clients': ClientImporter,
+    'invoices': InvoiceImporter,
+    'items': ItemImporter,
+}
+
+
+def _validate_chunk(importer, chunk):
+    """Split a chunk of ``(line, row)`` pairs into records and rejects."""
+    importer.prepare([row for line, row in chunk])
+    records, rejects = [], []
+    for line, row in chunk:
+        try:
+            records.append(importer.parse(row))
+        except RowError as e:
+            rejects.append(dict(row, line=line, error=str(e)))
+    return records, rejects
+
+
+def import_csv(kind, stream, reject_stream=None, batch_size=None):
+    """Import clients, invoices or line items from a CSV text stream.
+
+    The file is read ``batch_size`` rows at a time. Each chunk is validated,
+    inserted with a single executemany INSERT and committed, so memory use
+    doesn't grow with the file and an interrupted import keeps the chunks
+    already committed. Rows that fail validation are written, with their
+    line number and the reason, to ``reject_stream`` when given.
+
+    Invoices are matched to clients by email, then by name, and items to
+    invoices by invoice number, so import clients first, then invoices,
+    then items. Invoice totals and client stats are brought up to date at
+    the end.
+
+    Returns ``(report, error)``; the report counts the rows imported and
+    rejected.
+    """
+    if kind not in IMPORTERS:
+        return None, f'Unknown import type: {kind}'
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+
+    reader = csv.DictReader(stream)
+    header = [name.strip().lower() for name in reader.fieldnames or ()]
+    missing = [column for column in REQUIRED_COLUMNS[kind] if column not in header]
+    if missing:
+        return None, f"Missing column(s): {', '.join(missing)}"
+    reader.fieldnames = header
+
+    reject_writer = None
+    if reject_stream is not None:
+        reject_writer = csv.DictWriter(reject_stream, fieldnames=[*REJECT_COLUMNS, *header], extrasaction='ignore')
+        reject_writer.writeheader()
+
+    importer = IMPORTERS[kind]()
+    report = {'imported': 0, 'rejected': 0}
+    # Pair each row with the line it ends on for the reject file
+    rows = ((reader.line_num, row) for row in reader)
+    try:
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            records, rejects = _validate_chunk(importer, chunk)
+            if records:
+                db.session.execute(insert(importer.table), records)
+                db.session.commit()
+            report['imported'] += len(records)
+            report['rejected'] += len(rejects)
+            if reject_writer is not None:
+                reject_writer.writerows(rejects)
+
+        # Bulk inserts bypass the session, so totals and stats are not
+        # maintained as they go
+        if kind != 'clients':
+            recompute_invoice_totals()
+            refresh_client_stats()
+            db.session.commit()
+    except csv.Error as e:
+        db.session.rollback()
+        return report, f'Line {reader.line_num}: {e}'
+    except Exception as e:
+        db.session.rollback()
+        return report, str(e)
+
+    return report, None
@@ -1,11 +1,14 @@
 from flask import current_app
 from flask_mail import Message
+from app.services.metrics import EMAIL_SEND_DURATION
 from app.services.pdf_service import generate_invoice_pdf
 from app import mail
 import os
+import time
 
 def send_invoice_email(invoice, recipient_email, subject=None, message=None):
     """Send invoice via email with PDF attachment"""
+    start = time.perf_counter()
     try:
         # Generate PDF
         pdf_buffer = generate_invoice_pdf(invoice, current_app.config)
@@ -56,9 +59,11 @@ def send_invoice_email(invoice, recipient_email, subject=None, message=None):
         # Send email
         mail.send(msg)
 
+        EMAIL_SEND_DURATION.observe(time.perf_counter() - start, outcome='sent')
         return True, "Invoice sent successfully via email"
 
     except Exception as e:
+        EMAIL_SEND_DURATION.observe(time.perf_counter() - start, outcome='failed')
         return False, f"Failed to send invoice email: {str(e)}"
 
 def send_invoice_to_client(invoice):
@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+
+from flask import current_app
+from sqlalchemy import select
+from app.extensions import db
+from app.models import ArchivedInvoice, ArchivedInvoiceItem, Client, Invoice, InvoiceItem
+from app.money import from_minor
+
+EXPORT_KINDS = ('invoices', 'items')
+EXPORT_FILE_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+# Field names follow Invoice.to_dict() and InvoiceItem.to_dict()
+FIELDS = {
+    'invoices': ('id', 'invoice_number', 'client_id', 'client_name', 'client_email', 'issue_date', 'due_date',
+                 'status', 'currency', 'subtotal', 'tax_rate', 'tax_amount', 'total', 'notes', 'archived'),
+    'items': ('invoice_id', 'invoice_number', 'client_name', 'issue_date', 'status', 'currency', 'position',
+              'description', 'quantity', 'rate', 'amount', 'archived'),
+}
+
+# Flush the output once this many characters are buffered
+CHUNK_SIZE = 64 * 1024
+
+
+def _criteria(model, start=None, end=None, status=None, client_id=None, currency=None):
+    criteria = []
+    if start is not None:
+        criteria.append(model.issue_date >= start)
+    if end is not None:
+        criteria.append(model.issue_date <= end)
+    if status:
+        criteria.append(model.status == status)
+    if client_id is not None:
+        criteria.append(model.client_id == client_id)
+    if currency:
+        criteria.append(model.currency == currency.upper())
+    return criteria
+
+
+def _invoice_rows(model, criteria, archived):
+    statement = select(
+        model.id, model.invoice_number, model.client_id, Client.name, Client.email, model.issue_date,
+        model.due_date, model.status, model.currency, model.currency_exponent, model.subtotal_minor,
+        model.tax_rate, model.tax_amount_minor, model.total_minor, model.notes
+    ).join(Client, Client.id == model.client_id).where(*criteria).order_by(model.id)
+
+    for row in db.session.execute(statement.execution_options(yield_per=current_app.config['EXPORT_YIELD_PER'])):
+        exponent = row.currency_exponent
+        yield {
+            'id': row.id,
+            'invoice_number': row.invoice_number,
+            'client_id': row.client_id,
+            'client_name': row.name,
+            'client_email': row.email,
+            'issue_date': row.issue_date.isoformat(),
+            'due_date': row.due_date.isoformat(),
+            'status': row.status,
+            'currency': row.currency,
+            'subtotal': str(from_minor(row.subtotal_minor, exponent)),
+            'tax_rate': row.tax_rate,
+            'tax_amount': str(from_minor(row.tax_amount_minor, exponent)),
+            'total': str(from_minor(row.total_minor, exponent)),
+            'notes': row.notes,
+            'archived': archived,
+        }
+
+
+def _item_rows(model, item_model, criteria, archived):
+    # Invoices are walked in id order and each one's items are read from
+    # the (invoice_id, position) index, so rows stream out without sorting
+    # the whole set first
+    statement = select(
+        item_model.invoice_id, model.invoice_number, Client.name, model.issue_date, model.status, model.currency,
+        model.currency_exponent, item_model.position, item_model.description, item_model.quantity,
+        item_model.rate_minor, item_model.amount_minor
+    ).join(item_model, item_model.invoice_id == model.id).join(
+        Client, Client.id == model.client_id
+    ).where(*criteria).order_by(model.id, item_model.position)
+
+    for row in db.session.execute(statement.execution_options(yield_per=current_app.config['EXPORT_YIELD_PER'])):
+        exponent = row.currency_exponent
+        yield {
+            'invoice_id': row.invoice_id,
+            'invoice_number': row.invoice_number,
+            'client_name': row.name,
+            'issue_date': row.issue_date.isoformat(),
+            'status': row.status,
+            'currency': row.currency,
+            'position': row.position,
+            'description': row.description,
+            'quantity': row.quantity,
+            'rate': str(from_minor(row.rate_minor, exponent)),
+            'amount': str(from_minor(row.amount_minor, exponent)),
+            'archived': archived,
+        }
+
+
+def export_rows(kind, include_archived=True, **filters):
+    """Yield the invoices or line items matching the filters as dicts.
+
+    Filters are ``start`` and ``end`` issue dates (inclusive), ``status``,
+    ``client_id`` and ``currency``. Rows are fetched EXPORT_YIELD_PER at a
+    time from a server-side cursor and never loaded as ORM objects, so
+    memory use doesn't depend on how many rows match. Archived invoices
+    follow the current ones.
+    """
+    sources = [(Invoice, InvoiceItem, False)]
+    if include_archived:
+        sources.append((ArchivedInvoice, ArchivedInvoiceItem, True))
+
+    for model, item_model, archived in sources:
+        criteria = _criteria(model, **filters)
+        if kind == 'invoices':
+            yield from _invoice_rows(model, criteria, archived)
+        else:
+            yield from _item_rows(model, item_model, criteria, archived)
+
+
+def _csv_lines(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    # The header goes out before the query runs
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _jsonl_lines(rows):
+    # The first row goes out on its own so the response starts right away
+    lines, size, limit = [], 0, 0
+    for row in rows:
+        line = json.dumps(row, ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= limit:
+            yield ''.join(lines)
+            lines, size, limit = [], 0, CHUNK_SIZE
+    yield ''.join(lines)
+
+
+def stream_export(kind, file_format, include_archived=True, **filters):
+    """Return an iterator over an export of invoices or line items as CSV or JSONL text.
+
+    See export_rows() for the filters. Output is produced in chunks of
+    about CHUNK_SIZE characters as rows arrive, for a streaming response
+    or a file.
+    """
+    rows = export_rows(kind, include_archived, **filters)
+    if file_format == 'csv':
+        return _csv_lines(rows, FIELDS[kind])
+    return _jsonl_lines(rows)
@@ -0,0 +1,79 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from flask import current_app, g, request, session
+from flask_babel import get_locale
+from werkzeug.http import is_resource_modified
+from app.services.assets import MANIFEST_NAME
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _build_time(app):
+    """Newest modification time of the app's code, templates and asset manifest.
+
+    Part of every validator, so pages cached before a deploy or an asset
+    build are not answered with 304 afterwards.
+    """
+    newest = 0
+    for directory, _, filenames in os.walk(app.root_path):
+        for filename in filenames:
+            if filename.endswith(('.py', '.html')) or filename == MANIFEST_NAME:
+                newest = max(newest, os.path.getmtime(os.path.join(directory, filename)))
+    return datetime.fromtimestamp(int(newest), timezone.utc)
+
+
+def conditional_response(*versions, modified=()):
+    """Answer a conditional GET from record versions, before any rendering.
+
+    ``versions`` are values that change whenever the response would, such
+    as ids and ``updated_at`` of the records shown; ``modified`` are the
+    timestamps among them. The endpoint, settings version, locale and
+    build time are added, so a settings change or a deploy invalidates
+    every cached copy. Returns a 304 response when the client's copy is
+    current. Otherwise returns None and the ETag and Last-Modified are
+    set on the response the route goes on to build.
+    """
+    app = current_app._get_current_object()
+    # The page has to be rendered to show (and use up) pending messages
+    if session.get('_flashes'):
+        return None
+    build_time = app.extensions['http_cache_build_time']
+    parts = (request.endpoint, build_time.isoformat(), app.extensions.get('settings_version'),
+             str(get_locale()), *versions)
+    etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+    # The time this worker loaded its settings stands in for when they last
+    # changed: never earlier, so a later If-Modified-Since can't skip them
+    last_modified = max([build_time, app.extensions['settings_loaded_at'],
+                         *(_as_utc(value) for value in modified if value is not None)])
+
+    g.http_cache_validators = (etag, last_modified)
+    if is_resource_modified(request.environ, etag=f'"{etag}"', last_modified=last_modified):
+        return None
+    return app.response_class(status=304)
+
+
+def apply_cache_headers(response):
+    """Add the validators and the endpoint's Cache-Control policy"""
+    if response.status_code not in (200, 304):
+        return response
+    validators = g.pop('http_cache_validators', None)
+    if validators is not None:
+        etag, last_modified = validators
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.vary.update(('Cookie', 'Accept-Language'))
+    policy = current_app.config['CACHE_CONTROL'].get(request.endpoint)
+    if policy:
+        response.headers['Cache-Control'] = policy
+    return response
+
+
+def init_http_cache(app):
+    app.config.setdefault('CACHE_CONTROL', {})
+    app.extensions['http_cache_build_time'] = _build_time(app)
+    app.extensions.setdefault('settings_loaded_at', datetime.now(timezone.utc))
+    app.after_request(apply_cache_headers)
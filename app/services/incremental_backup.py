@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+# Temporary files of _write_atomic, not yet renamed into place
+TMP_PREFIX = '.tmp_'
+
+
+class IncrementalBackupStore:
+    """Content-addressed store of compressed database chunks.
+
+    A backup is a manifest listing the chunk hashes that make up the
+    database file in order. Chunks are groups of whole SQLite pages, so
+    pages that did not change since the previous backup hash the same and
+    are not written again.
+
+    Layout under ``root``::
+
+        chunks/ab/abcdef...   zlib-compressed chunk, named by its sha256
+        manifests/<name>.json one per backup
+        .store.lock           held by add, restore and prune
+
+    The lock file serialises those across threads and processes, so prune
+    can't delete a chunk that a concurrent add has just reused for a
+    manifest it hasn't written yet.
+    """
+
+    def __init__(self, root, chunk_pages=16, compression_level=6, lock_timeout=3600):
+        self.root = root
+        self.lock_timeout = lock_timeout
+        self.chunk_pages = chunk_pages
+        self.compression_level = compression_level
+        self.chunk_dir = os.path.join(root, 'chunks')
+        self.manifest_dir = os.path.join(root, 'manifests')
+
+    def _ensure_dirs(self):
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    @contextmanager
+    def _lock(self):
+        """Hold the store's lock file, waiting while another writer has it"""
+        os.makedirs(self.root, exist_ok=True)
+        lock_path = os.path.join(self.root, '.store.lock')
+        while True:
+            try:
+                lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                pass
+            try:
+                # A lock left by a process that died mid-backup must not
+                # block the store forever
+                if time.time() - os.path.getmtime(lock_path) > self.lock_timeout:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.05)
+        try:
+            os.close(lock_fd)
+            yield
+        finally:
+            os.remove(lock_path)
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    @staticmethod
+    def read_page_size(path):
+        """Read the page size from a SQLite database header."""
+        with open(path, 'rb') as f:
+            header = f.read(100)
+        if len(header) < 100 or not header.startswith(b'SQLite format 3\x00'):
+            raise ValueError("Not a SQLite database file.")
+        page_size = int.from_bytes(header[16:18], 'big')
+        # A stored value of 1 means 65536, which does not fit in two bytes
+        return 65536 if page_size == 1 else page_size
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def add(self, snapshot_path, created_at=None):
+        """Store a database snapshot and return its manifest report.
+
+        Only chunks that are not already in the store are compressed and
+        written. The returned dict includes ``bytes_written``, the number of
+        bytes this backup added to disk (new chunks plus the manifest).
+        """
+        self._ensure_dirs()
+        with self._lock():
+            created_at = created_at or datetime.now()
+            page_size = self.read_page_size(snapshot_path)
+            chunk_size = page_size * self.chunk_pages
+
+            chunks = []
+            new_chunks = 0
+            bytes_written = 0
+            size = 0
+            with open(snapshot_path, 'rb') as f:
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        break
+                    size += len(data)
+                    digest = hashlib.sha256(data).hexdigest()
+                    chunks.append(digest)
+                    chunk_path = self._chunk_path(digest)
+                    if not os.path.exists(chunk_path):
+                        compressed = zlib.compress(data, self.compression_level)
+                        self._write_atomic(chunk_path, compressed)
+                        new_chunks += 1
+                        bytes_written += len(compressed)
+
+            name = created_at.strftime('%Y%m%d_%H%M%S')
+            suffix = 1
+            while os.path.exists(os.path.join(self.manifest_dir, f"{name}.json")):
+                suffix += 1
+                name = f"{created_at.strftime('%Y%m%d_%H%M%S')}_{suffix}"
+
+            manifest = {
+                'name': name,
+                'created_at': created_at.isoformat(),
+                'page_size': page_size,
+                'chunk_size': chunk_size,
+                'size': size,
+                'chunks': chunks,
+            }
+            manifest_bytes = json.dumps(manifest).encode('utf-8')
+            self._write_atomic(os.path.join(self.manifest_dir, f"{name}.json"), manifest_bytes)
+            bytes_written += len(manifest_bytes)
+
+            return {
+                'name': name,
+                'size': size,
+                'total_chunks': len(chunks),
+                'new_chunks': new_chunks,
+                'reused_chunks': len(chunks) - new_chunks,
+                'bytes_written': bytes_written,
+            }
+
+    def list_manifests(self):
+        """Return all manifests, newest first."""
+        if not os.path.isdir(self.manifest_dir):
+            return []
+        manifests = []
+        for filename in os.listdir(self.manifest_dir):
+            if filename.endswith('.json'):
+                manifests.append(self.load_manifest(filename[:-len('.json')]))
+        manifests.sort(key=lambda m: m['created_at'], reverse=True)
+        return manifests
+
+    def load_manifest(self, name):
+        path = os.path.join(self.manifest_dir, f"{os.path.basename(name)}.json")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Backup manifest {name} not found.")
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def restore(self, name, dest_path):
+        """Rebuild the database file described by a manifest at dest_path."""
+        with self._lock():
+            manifest = self.load_manifest(name)
+            with open(dest_path, 'wb') as out:
+                for digest in manifest['chunks']:
+                    with open(self._chunk_path(digest), 'rb') as f:
+                        data = zlib.decompress(f.read())
+                    if hashlib.sha256(data).hexdigest() != digest:
+                        raise ValueError(f"Chunk {digest} is corrupt.")
+                    out.write(data)
+            if os.path.getsize(dest_path) != manifest['size']:
+                raise ValueError(f"Restored size does not match manifest {name}.")
+            return manifest
+
+    @staticmethod
+    def select_retained(manifests, hourly=24, daily=7, weekly=4):
+        """Pick the manifests a grandfather-father-son policy keeps.
+
+        The newest backup is always kept, plus the newest backup in each of
+        the last ``hourly`` hours, ``daily`` days and ``weekly`` ISO weeks
+        that have one.
+        """
+        manifests = sorted(manifests, key=lambda m: m['created_at'], reverse=True)
+        keep = set()
+        if manifests:
+            keep.add(manifests[0]['name'])
+
+        buckets = [
+            (hourly, lambda d: d.strftime('%Y%m%d%H')),
+            (daily, lambda d: d.strftime('%Y%m%d')),
+            (weekly, lambda d: '%d-%02d' % d.isocalendar()[:2]),
+        ]
+        for limit, bucket_of in buckets:
+            seen = set()
+            for manifest in manifests:
+                if len(seen) >= limit:
+                    break
+                bucket = bucket_of(datetime.fromisoformat(manifest['created_at']))
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(manifest['name'])
+        return keep
+
+    def prune(self, hourly=24, daily=7, weekly=4):
+        """Delete manifests outside the retention policy and orphaned chunks.
+
+        Returns a dict with the number of manifests and chunks removed and
+        the bytes freed.
+        """
+        with self._lock():
+            manifests = self.list_manifests()
+            keep = self.select_retained(manifests, hourly=hourly, daily=daily, weekly=weekly)
+
+            removed_manifests = 0
+            referenced = set()
+            for manifest in manifests:
+                if manifest['name'] in keep:
+                    referenced.update(manifest['chunks'])
+                else:
+                    os.remove(os.path.join(self.manifest_dir, f"{manifest['name']}.json"))
+                    removed_manifests += 1
+
+            removed_chunks = 0
+            bytes_freed = 0
+            if os.path.isdir(self.chunk_dir):
+                for prefix in os.listdir(self.chunk_dir):
+                    prefix_dir = os.path.join(self.chunk_dir, prefix)
+                    for digest in os.listdir(prefix_dir):
+                        # Another writer's chunk, not yet renamed into place
+                        if digest.startswith(TMP_PREFIX) or digest in referenced:
+                            continue
+                        chunk_path = os.path.join(prefix_dir, digest)
+                        bytes_freed += os.path.getsize(chunk_path)
+                        os.remove(chunk_path)
+                        removed_chunks += 1
+
+            return {
+                'removed_manifests': removed_manifests,
+                'removed_chunks': removed_chunks,
+                'bytes_freed': bytes_freed,
+            }
@@ -0,0 +1,69 @@
+def item_rows_from_form(form):
+    """Read the submitted item rows, in display order, from an item form.
+
+    Returns ``(item_id, description, quantity, rate)`` tuples with the raw
+    form strings, except item_id which is an int for rows showing an
+    existing item and None for new rows. Incomplete rows are skipped.
+    """
+    descriptions = form.getlist('description[]')
+    quantities = form.getlist('quantity[]')
+    rates = form.getlist('rate[]')
+    item_ids = form.getlist('item_id[]')
+    # Without one id per row the ids can't be matched up, so every row is new
+    if len(item_ids) != len(descriptions):
+        item_ids = [''] * len(descriptions)
+
+    rows = []
+    for item_id, desc, qty, rate in zip(item_ids, descriptions, quantities, rates):
+        if desc and qty and rate:
+            rows.append((int(item_id) if item_id.isdigit() else None, desc, qty, rate))
+    return rows
+
+
+def sync_items(items, rows, item_class):
+    """Make an item collection match submitted rows with as few writes as possible.
+
+    ``rows`` are ``(item_id, values)`` pairs in display order, where values
+    is a dict of column values. A row whose id belongs to an item in the
+    collection updates that item, and only the attributes that differ are
+    assigned, so unchanged items issue no UPDATE. Other rows become new
+    items, and items no row refers to are removed from the collection
+    (the delete-orphan cascade deletes them).
+
+    Positions only need to increase down the list, so an item keeps its
+    position when it still fits. Removing or appending lines then leaves
+    the other lines alone instead of renumbering them.
+
+    Returns a dict counting the items inserted, updated and deleted.
+    """
+    existing = {item.id: item for item in items}
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+    last_position = -1
+    for item_id, values in rows:
+        item = existing.pop(item_id, None) if item_id is not None else None
+        if item is not None and item.position > last_position:
+            position = item.position
+        else:
+            position = last_position + 1
+        last_position = position
+
+        values = dict(values, position=position)
+        if item is None:
+            items.append(item_class(**values))
+            counts['inserted'] += 1
+            continue
+
+        changed = False
+        for key, value in values.items():
+            if getattr(item, key) != value:
+                setattr(item, key, value)
+                changed = True
+        if changed:
+            counts['updated'] += 1
+
+    for item in existing.values():
+        items.remove(item)
+        counts['deleted'] += 1
+
+    return counts
@@ -0,0 +1,147 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import Date, DateTime, Integer, LargeBinary, Numeric, text
+
+# First line of every dump, so restores can tell it apart from a SQLite file
+DUMP_FORMAT = 'chrisnov-invoice-logical'
+DUMP_VERSION = 1
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    return value
+
+
+def _decoder_for(column):
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column.type, Date):
+        return date.fromisoformat
+    if isinstance(column.type, LargeBinary):
+        return base64.b64decode
+    if isinstance(column.type, Numeric) and column.type.asdecimal:
+        return Decimal
+    return None
+
+
+def iter_logical_dump(engine, metadata, revisions=(), batch_size=1000):
+    """Yield a backend-neutral dump of every table as JSON lines (bytes).
+
+    The first line is a header naming the format, the migration revisions
+    and the tables. Each following line holds one row as
+    ``{"table": ..., "row": {...}}``. All tables are read inside one
+    transaction, at REPEATABLE READ where the backend supports it, so the
+    dump is a consistent snapshot. Rows are fetched ``batch_size`` at a
+    time through a server-side cursor.
+    """
+    tables = metadata.sorted_tables
+    header = {
+        'format': DUMP_FORMAT,
+        'version': DUMP_VERSION,
+        'dialect': engine.dialect.name,
+        'revisions': sorted(revisions),
+        'tables': [table.name for table in tables],
+    }
+    yield (json.dumps(header) + '\n').encode('utf-8')
+
+    connection = engine.connect()
+    try:
+        if engine.dialect.name != 'sqlite':
+            connection = connection.execution_options(isolation_level='REPEATABLE READ')
+        with connection.begin():
+            for table in tables:
+                result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+                    table.select().order_by(*table.primary_key.columns)
+                )
+                for row in result.mappings():
+                    line = {'table': table.name, 'row': {key: _encode_value(value) for key, value in row.items()}}
+                    yield (json.dumps(line) + '\n').encode('utf-8')
+    finally:
+        connection.close()
+
+
+def read_dump_header(first_line):
+    """Parse and check a dump's header line, raising ValueError if it is not one."""
+    try:
+        header = json.loads(first_line)
+    except ValueError:
+        raise ValueError("Not a logical backup file.")
+    if not isinstance(header, dict) or header.get('format') != DUMP_FORMAT:
+        raise ValueError("Not a logical backup file.")
+    if header.get('version') != DUMP_VERSION:
+        raise ValueError(f"Unsupported logical backup version {header.get('version')}.")
+    return header
+
+
+def load_logical_dump(engine, metadata, lines, batch_size=1000):
+    """Replace the contents of every table with the rows of a logical dump.
+
+    Runs in a single transaction: existing rows are deleted in reverse
+    dependency order, the dump's rows are inserted in batches, and on
+    PostgreSQL the id sequences are moved past the restored ids. Any
+    error rolls the whole load back.
+    """
+    lines = iter(lines)
+    header = read_dump_header(next(lines, b''))
+
+    tables = {table.name: table for table in metadata.sorted_tables}
+    missing = [name for name in tables if name not in header['tables']]
+    if missing:
+        raise ValueError(f"Backup is missing tables: {', '.join(missing)}.")
+
+    decoders = {
+        name: {column.name: _decoder_for(column) for column in table.columns}
+        for name, table in tables.items()
+    }
+
+    with engine.begin() as connection:
+        for table in reversed(metadata.sorted_tables):
+            connection.execute(table.delete())
+
+        current_table = None
+        batch = []
+
+        def flush():
+            if batch:
+                connection.execute(tables[current_table].insert(), batch)
+                batch.clear()
+
+        for line in lines:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry['table'] not in tables:
+                continue
+            if entry['table'] != current_table:
+                flush()
+                current_table = entry['table']
+
+            row = {}
+            for key, value in entry['row'].items():
+                if key not in decoders[current_table]:
+                    continue
+                decode = decoders[current_table][key]
+                row[key] = decode(value) if decode and value is not None else value
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+        if engine.dialect.name == 'postgresql':
+            for table in metadata.sorted_tables:
+                for column in table.primary_key.columns:
+                    if isinstance(column.type, Integer):
+                        connection.execute(text(
+                            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column.name}'), "
+                            f"COALESCE((SELECT MAX({column.name}) FROM {table.name}), 0) + 1, false)"
+                        ))
+
+    return header
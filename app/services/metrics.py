@@ -0,0 +1,302 @@
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from app.extensions import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    def __init__(self, registry, name, help, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.update(self, self._key(labels), lambda value: (value or 0) + amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.registry.update(self, self._key(labels), lambda old: value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        # Count per bucket (not cumulative), the last one being +Inf, then sum
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+
+        def add(old):
+            counts = old or [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+            return counts
+        self.registry.update(self, self._key(labels), add)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+class MetricsRegistry:
+    """In-process metrics, rendered in the Prometheus text exposition format.
+
+    Without a directory the values live in this process only. With one,
+    every process (gunicorn worker or CLI command) writes its values to
+    <directory>/<pid>.json at most every flush_interval seconds and on
+    exit, and a scrape adds up the files of all processes, so any worker
+    can answer for the whole server. Files of exited processes are kept so
+    counters never go backwards; their gauges are dropped. Empty the
+    directory when the server starts.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = {}
+        self.directory = None
+        self.flush_interval = 1.0
+        self._pid = None
+        self._values = {}
+        self._last_flush = 0.0
+        self._atexit = False
+
+    def counter(self, name, help, labelnames=()):
+        return self._define(Counter(self, name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._define(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._define(Histogram(self, name, help, labelnames, buckets))
+
+    def _define(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def configure(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            if not self._atexit:
+                atexit.register(self.flush)
+                self._atexit = True
+
+    def _process_values(self):
+        """This process's values, started afresh after a fork"""
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._values = {}
+            self._last_flush = 0.0
+            # A previous process with the same pid left counts behind
+            previous = self._read(self._path(pid)) if self.directory else None
+            for name, samples in (previous or {}).items():
+                metric = self.metrics.get(name)
+                if metric is not None and metric.kind != 'gauge':
+                    self._values[name] = {tuple(key): value for key, value in samples}
+        return self._values
+
+    def update(self, metric, key, change):
+        with self.lock:
+            samples = self._process_values().setdefault(metric.name, {})
+            samples[key] = change(samples.get(key))
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _collect(self):
+        for collect in list(self.collectors.values()):
+            collect()
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._collect()
+        with self.lock:
+            data = {name: [[list(key), value] for key, value in samples.items()]
+                    for name, samples in self._process_values().items()}
+            self._last_flush = time.monotonic()
+            path = self._path(self._pid)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def _gather(self):
+        """{name: {key: value}} over all processes; gauges get a pid label"""
+        if not self.directory:
+            self._collect()
+            with self.lock:
+                return {name: dict(samples) for name, samples in self._process_values().items()}
+
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            pid = int(os.path.basename(path)[:-len('.json')])
+            data = self._read(path) or {}
+            for name, samples in data.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not _is_alive(pid)):
+                    continue
+                target = merged.setdefault(name, {})
+                for key, value in samples:
+                    if metric.kind == 'gauge':
+                        target[tuple(key) + (str(pid),)] = value
+                    elif metric.kind == 'histogram':
+                        old = target.get(tuple(key))
+                        target[tuple(key)] = [a + b for a, b in zip(old, value)] if old else value
+                    else:
+                        target[tuple(key)] = target.get(tuple(key), 0) + value
+        return merged
+
+    def render(self):
+        values = self._gather()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            labelnames = metric.labelnames
+            if metric.kind == 'gauge' and self.directory:
+                labelnames += ('pid',)
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            samples = values.get(name, {})
+            if metric.kind == 'counter' and not metric.labelnames and not samples:
+                samples = {(): 0}
+            for key, value in sorted(samples.items()):
+                if metric.kind != 'histogram':
+                    lines.append(f'{name}{_labels(labelnames, key)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), value[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labelnames, key, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labelnames, key)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(labelnames, key)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _number(value):
+    if isinstance(value, float):
+        return '+Inf' if value == math.inf else repr(value)
+    return str(value)
+
+
+def _labels(names, values, le=None):
+    pairs = list(zip(names, values))
+    if le is not None:
+        pairs.append(('le', _number(float(le))))
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    'http_requests_total', 'HTTP requests handled.', ('endpoint', 'method', 'status'))
+HTTP_REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Time to handle a request and send the response.', ('endpoint', 'method'))
+PDF_RENDER_DURATION = registry.histogram(
+    'pdf_render_duration_seconds', 'Time to render an invoice PDF.', ('template',),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+EMAIL_SEND_DURATION = registry.histogram(
+    'email_send_duration_seconds', 'Time to build and send an invoice email.', ('outcome',),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+RECURRING_INVOICES_GENERATED = registry.counter(
+    'recurring_invoices_generated_total', 'Invoices generated from recurring invoice schedules.')
+DB_POOL_SIZE = registry.gauge('db_pool_size', 'Connections the database pool keeps open.')
+DB_POOL_CHECKED_OUT = registry.gauge('db_pool_checked_out', 'Database connections currently in use.')
+DB_POOL_OVERFLOW = registry.gauge('db_pool_overflow', 'Database connections open beyond the pool size.')
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+    status = response.status_code
+
+    # Runs once the body has been sent, streamed responses included
+    def observe():
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, endpoint=endpoint, method=method)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=method, status=status)
+        registry.maybe_flush()
+    response.call_on_close(observe)
+    return response
+
+
+def init_metrics(app):
+    """Record request, PDF, email, recurring invoice and pool metrics for /metrics"""
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    registry.configure(app.config.get('METRICS_MULTIPROC_DIR'), app.config['METRICS_FLUSH_INTERVAL'])
+    with app.app_context():
+        pool = db.engine.pool
+
+    def collect_pool():
+        # Pools without a fixed size (SingletonThreadPool, NullPool) have no counts
+        if hasattr(pool, 'checkedout'):
+            DB_POOL_SIZE.set(pool.size())
+            DB_POOL_CHECKED_OUT.set(pool.checkedout())
+            DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+    registry.collectors['db_pool'] = collect_pool
+
+    app.extensions['metrics'] = registry
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
@@ -4,6 +4,7 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
+from app.services.metrics import PDF_RENDER_DURATION
 from io import BytesIO
 import os
 
@@ -31,6 +32,23 @@ def format_currency(amount, currency_code, config):
     else:
         return f"{formatted_amount} {symbol}"
 
+# Logo file contents, read once per worker instead of on every PDF. Cleared
+# whenever settings are reloaded, since another worker may have uploaded a
+# new logo.
+_logo_cache = {}
+
+
+def clear_pdf_caches():
+    _logo_cache.clear()
+
+
+def _logo_data(logo_path):
+    if logo_path not in _logo_cache:
+        with open(logo_path, 'rb') as f:
+            _logo_cache[logo_path] = f.read()
+    return _logo_cache[logo_path]
+
+
 def add_logo_if_exists(elements, config, max_width=1.5*inch, max_height=0.8*inch, alignment=TA_LEFT):
     """Add logo to PDF if it exists"""
     # Use the configured filename if available, otherwise default to logo.png
@@ -42,7 +60,7 @@ def add_logo_if_exists(elements, config, max_width=1.5*inch, max_height=0.8*inch
     
     if os.path.exists(logo_path) and config.get('LOGO_FILENAME'):
         try:
-            logo = Image(logo_path)
+            logo = Image(BytesIO(_logo_data(logo_path)))
             
             # Get original image size
             original_width = logo.imageWidth
@@ -79,13 +97,16 @@ def generate_invoice_pdf(invoice, config):
 
     # Route to different template generators
     if pdf_template == 'modern':
-        return generate_modern_pdf(invoice, config, buffer)
+        generate = generate_modern_pdf
     elif pdf_template == 'minimal':
-        return generate_minimal_pdf(invoice, config, buffer)
+        generate = generate_minimal_pdf
     elif pdf_template == 'elegant':
-        return generate_elegant_pdf(invoice, config, buffer)
+        generate = generate_elegant_pdf
     else:  # professional or default
-        return generate_professional_pdf(invoice, config, buffer)
+        pdf_template, generate = 'professional', generate_professional_pdf
+
+    with PDF_RENDER_DURATION.time(template=pdf_template):
+        return generate(invoice, config, buffer)
 
 
 def generate_professional_pdf(invoice, config, buffer):
@@ -0,0 +1,167 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from datetime import datetime
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.exceptions import HTTPException
+
+TOKEN_SALT = 'request-profile'
+
+
+def profiles_dir(app):
+    return app.config.get('PROFILING_DIR') or os.path.join(app.instance_path, 'profiles')
+
+
+def make_profile_token(app):
+    """A token for the profiling header, valid for PROFILING_TOKEN_MAX_AGE seconds"""
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=TOKEN_SALT).dumps('profile')
+
+
+def _valid_token(app, token):
+    try:
+        URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=TOKEN_SALT).loads(
+            token, max_age=app.config['PROFILING_TOKEN_MAX_AGE'])
+    except BadSignature:
+        return False
+    return True
+
+
+class ProfilerMiddleware:
+    """Profile whole requests with cProfile and keep the results on disk.
+
+    A request is profiled when PROFILING_ENABLED is set, when it is picked
+    by PROFILING_SAMPLE_RATE, or when it carries a valid token (see
+    make_profile_token) in the PROFILING_HEADER header. Unprofiled requests
+    only pay for that check. A profiled response is rendered in full before
+    it is sent, so streaming is lost for that request, and only one request
+    is profiled at a time.
+
+    Each profile is written as <name>.prof with a <name>.json next to it
+    holding the endpoint and timing; the oldest are removed beyond
+    PROFILING_MAX_FILES.
+    """
+
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.app = app
+        self.lock = threading.Lock()
+
+    def _trigger(self, environ):
+        config = self.app.config
+        token = environ.get('HTTP_' + config['PROFILING_HEADER'].upper().replace('-', '_'))
+        if token:
+            return 'header' if _valid_token(self.app, token) else None
+        if config['PROFILING_ENABLED']:
+            return 'config'
+        if config['PROFILING_SAMPLE_RATE'] and random.random() < config['PROFILING_SAMPLE_RATE']:
+            return 'sample'
+        return None
+
+    def __call__(self, environ, start_response):
+        trigger = self._trigger(environ)
+        # cProfile can't profile two requests of one process at once
+        if trigger is None or not self.lock.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            status = []
+
+            def capture_start_response(status_line, headers, exc_info=None):
+                status.append(status_line)
+                return start_response(status_line, headers, exc_info)
+
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                app_iter = self.wsgi_app(environ, capture_start_response)
+                try:
+                    body = list(app_iter)
+                finally:
+                    if hasattr(app_iter, 'close'):
+                        app_iter.close()
+            finally:
+                profile.disable()
+                elapsed = time.perf_counter() - start
+                self._save(profile, environ, status[0] if status else '500', elapsed, trigger)
+        finally:
+            self.lock.release()
+        return body
+
+    def _endpoint(self, environ):
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return 'unmatched'
+        return endpoint
+
+    def _save(self, profile, environ, status, elapsed, trigger):
+        directory = profiles_dir(self.app)
+        os.makedirs(directory, exist_ok=True)
+        now = datetime.now()
+        endpoint = self._endpoint(environ)
+        name = f"{now.strftime('%Y%m%d_%H%M%S_%f')}_{endpoint.replace('.', '-')}"
+        profile.dump_stats(os.path.join(directory, f'{name}.prof'))
+        with open(os.path.join(directory, f'{name}.json'), 'w') as f:
+            json.dump({
+                'name': name,
+                'at': now.isoformat(timespec='seconds'),
+                'endpoint': endpoint,
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ.get('PATH_INFO'),
+                'query': environ.get('QUERY_STRING', ''),
+                'status': int(status.split()[0]),
+                'time_ms': round(elapsed * 1000, 3),
+                'trigger': trigger,
+            }, f)
+        for old in list_profiles(self.app)[self.app.config['PROFILING_MAX_FILES']:]:
+            for extension in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(directory, old['name'] + extension))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profiles(app):
+    """Metadata of the stored profiles, newest first"""
+    directory = profiles_dir(app)
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in sorted(os.listdir(directory), reverse=True):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def top_functions(app, name, limit=25):
+    """The functions of a stored profile with the most cumulative time"""
+    path = os.path.join(profiles_dir(app), f'{name}.prof')
+    if not os.path.isfile(path):
+        return None
+    stats = pstats.Stats(path).stats
+    rows = []
+    for (filename, line, function), (primitive_calls, calls, own_time, cumulative_time, callers) in stats.items():
+        rows.append({
+            'function': function if filename == '~' else f'{function} ({os.path.basename(filename)}:{line})',
+            'file': filename,
+            'calls': calls,
+            'tottime_ms': round(own_time * 1000, 3),
+            'cumtime_ms': round(cumulative_time * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+
+def init_profiler(app):
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, app)
@@ -0,0 +1,164 @@
+import random
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+from flask import current_app
+from sqlalchemy import insert, select
+from app.extensions import db
+from app.models import Client, Currency, Invoice, InvoiceItem, RecurringInvoice, RecurringInvoiceItem
+from app.money import default_exponent, line_amount_minor, tax_minor
+from app.services.client_stats_service import refresh_client_stats
+
+# Relative frequencies of generated invoice statuses and currencies
+STATUS_WEIGHTS = {'paid': 55, 'sent': 14, 'unpaid': 10, 'overdue': 8, 'draft': 8, 'cancelled': 5}
+CURRENCY_WEIGHTS = {'USD': 50, 'IDR': 30, 'EUR': 20}
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'monthly', 'monthly', 'yearly')
+TAX_RATES = (0.0, 0.0, 0.1, 0.11, 0.2)
+QUANTITIES = (1, 1, 1, 1, 2, 3, 5, 10, 0.5, 1.5, 40)
+
+# Items per invoice follow a Pareto distribution: most invoices have one to
+# three lines, a few have hundreds
+ITEMS_PARETO_ALPHA = 1.3
+MAX_ITEMS_PER_INVOICE = 300
+
+COMPANY_WORDS = ('Acme', 'Northwind', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli',
+                 'Vandelay', 'Soylent', 'Tyrell', 'Cyberdyne', 'Wonka', 'Gringotts', 'Oceanic')
+COMPANY_KINDS = ('Trading', 'Studio', 'Logistics', 'Consulting', 'Foods', 'Labs', 'Holdings', 'Retail')
+SERVICES = ('Design work', 'Development hours', 'Consulting', 'Hosting', 'Support plan', 'Maintenance',
+            'Translation', 'Photography', 'Training session', 'Licence fee', 'Travel expenses')
+
+
+def _rate_minor(rng, exponent):
+    """A unit price in minor units, between about 10 and 5,000 (or 50k-50M IDR)"""
+    if exponent == 0:
+        return rng.randint(50, 50000) * 1000
+    return rng.randint(1000, 500000) * 10 ** (exponent - 2)
+
+
+def _client_rows(rng, count, seed):
+    return [
+        {
+            'name': f'{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_KINDS)} {n}',
+            'company': f'{rng.choice(COMPANY_WORDS)} Group',
+            'email': f'client{n:06d}@seed{seed}.bench.example',
+            'phone': f'+1-555-{rng.randint(0, 9999):04d}',
+            'address': f'{rng.randint(1, 999)} Bench Street',
+        }
+        for n in range(count)
+    ]
+
+
+def seed_bench_data(clients, invoices, recurring=0, seed=0, today=None, batch_size=None):
+    """Generate a large, realistic dataset for benchmarks.
+
+    The same arguments give the same data: every value comes from a random
+    generator seeded with ``seed``. Invoices are spread over the last two
+    years across a skewed share of clients (a few clients get most of the
+    work), with mixed currencies and statuses and a long-tailed number of
+    items each. Recurring schedules are partly due, so generate-recurring
+    has work to do.
+
+    Rows are inserted ``batch_size`` at a time with executemany INSERTs and
+    totals are computed as they are generated; client stats are refreshed
+    at the end. Returns ``(report, error)`` with the number of rows added.
+    """
+    if clients < 1 and (invoices or recurring):
+        return None, 'Invoices and recurring invoices need at least one client'
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    today = today or date.today()
+    rng = random.Random(seed)
+    prefix = f'BENCH{seed}-'
+    if db.session.execute(select(Invoice.id).where(Invoice.invoice_number.startswith(prefix)).limit(1)).first():
+        return None, f'Seed {seed} was already used on this database; choose another seed'
+
+    exponents = {code: exponent for code, exponent in db.session.execute(select(Currency.code, Currency.exponent))}
+    currencies = [code for code in CURRENCY_WEIGHTS if code in exponents] or list(CURRENCY_WEIGHTS)
+    currency_weights = list(accumulate(CURRENCY_WEIGHTS[code] for code in currencies))
+    status_weights = list(accumulate(STATUS_WEIGHTS.values()))
+    report = {'clients': 0, 'invoices': 0, 'items': 0, 'recurring_invoices': 0, 'recurring_items': 0}
+
+    try:
+        rows = _client_rows(rng, clients, seed)
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(insert(Client.__table__), rows[start:start + batch_size])
+        report['clients'] = len(rows)
+        client_ids = list(db.session.execute(
+            select(Client.id).where(Client.email.endswith(f'@seed{seed}.bench.example')).order_by(Client.id)
+        ).scalars())
+        # Zipf-like: the n-th client gets about 1/n**0.8 of the first one's work
+        client_weights = list(accumulate(1 / (n + 1) ** 0.8 for n in range(len(client_ids))))
+
+        for start in range(0, invoices, batch_size):
+            invoice_rows, item_rows = [], {}
+            for n in range(start, min(start + batch_size, invoices)):
+                number = f'{prefix}{n:07d}'
+                currency = rng.choices(currencies, cum_weights=currency_weights)[0]
+                exponent = exponents.get(currency, default_exponent(currency))
+                issue_date = today - timedelta(days=int(rng.triangular(0, 730, 0)))
+                tax_rate = rng.choice(TAX_RATES)
+                count = min(int(rng.paretovariate(ITEMS_PARETO_ALPHA)), MAX_ITEMS_PER_INVOICE)
+                items = []
+                for position in range(count):
+                    quantity = rng.choice(QUANTITIES)
+                    rate_minor = _rate_minor(rng, exponent)
+                    items.append({
+                        'position': position, 'description': rng.choice(SERVICES), 'quantity': quantity,
+                        'rate_minor': rate_minor, 'amount_minor': line_amount_minor(quantity, rate_minor),
+                    })
+                subtotal = sum(item['amount_minor'] for item in items)
+                tax = tax_minor(subtotal, tax_rate)
+                invoice_rows.append({
+                    'invoice_number': number,
+                    'client_id': client_ids[rng.choices(range(len(client_ids)), cum_weights=client_weights)[0]],
+                    'issue_date': issue_date,
+                    'due_date': issue_date + timedelta(days=rng.choice((14, 30, 30, 45))),
+                    'status': rng.choices(list(STATUS_WEIGHTS), cum_weights=status_weights)[0],
+                    'currency': currency, 'currency_exponent': exponent,
+                    'subtotal_minor': subtotal, 'tax_rate': tax_rate, 'tax_amount_minor': tax,
+                    'total_minor': subtotal + tax, 'notes': None,
+                    'created_at': datetime.combine(issue_date, datetime.min.time()),
+                })
+                item_rows[number] = items
+
+            db.session.execute(insert(Invoice.__table__), invoice_rows)
+            ids = dict(db.session.execute(select(Invoice.invoice_number, Invoice.id).where(
+                Invoice.invoice_number.between(invoice_rows[0]['invoice_number'], invoice_rows[-1]['invoice_number'])
+            )).all())
+            items = [dict(item, invoice_id=ids[number]) for number, lines in item_rows.items() for item in lines]
+            if items:
+                db.session.execute(insert(InvoiceItem.__table__), items)
+            db.session.commit()
+            report['invoices'] += len(invoice_rows)
+            report['items'] += len(items)
+
+        for n in range(recurring):
+            currency = rng.choices(currencies, cum_weights=currency_weights)[0]
+            schedule = RecurringInvoice(
+                client_id=rng.choice(client_ids),
+                frequency=rng.choice(FREQUENCIES),
+                interval=rng.choice((1, 1, 1, 2, 3)),
+                start_date=today - timedelta(days=rng.randint(30, 700)),
+                next_due_date=today + timedelta(days=rng.randint(-10, 60)),
+                is_active=rng.random() < 0.85,
+                currency=currency,
+                tax_rate=rng.choice(TAX_RATES),
+                notes=f'Recurring schedule {n}',
+            )
+            exponent = exponents.get(currency, default_exponent(currency))
+            for position in range(rng.randint(1, 5)):
+                schedule.items.append(RecurringInvoiceItem(
+                    position=position, description=rng.choice(SERVICES), quantity=rng.choice(QUANTITIES),
+                    rate=_rate_minor(rng, exponent) / 10 ** exponent,
+                ))
+            db.session.add(schedule)
+            report['recurring_invoices'] += 1
+            report['recurring_items'] += len(schedule.items)
+        db.session.commit()
+
+        refresh_client_stats()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return report, str(e)
+
+    return report, None
@@ -0,0 +1,143 @@
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, g
+from flask.sessions import SecureCookieSessionInterface
+from flask_session import Session
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from flask_session.defaults import Defaults
+from itsdangerous import want_bytes
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+from app.models import UserSession
+
+SESSION_TYPES = ('filesystem', 'database', 'cookie')
+
+
+class DatabaseSession(ServerSideSession):
+    pass
+
+
+class DatabaseSessionInterface(ServerSideSessionInterface):
+    """Flask-Session interface storing sessions in the user_sessions table.
+
+    Reads and writes go through their own connection, so saving the session
+    never commits (or waits on) the request's own database session. A
+    session that was only read is written back once its expiry is
+    SESSION_EXPIRY_REFRESH_SECONDS old rather than on every request.
+    Expired rows are ignored when read and deleted by
+    ``purge_expired_sessions``.
+    """
+
+    session_class = DatabaseSession
+    ttl = False
+
+    def _register_cleanup_app_command(self):
+        # Purged on a timer by each worker and by `flask purge-sessions`
+        # instead of Flask-Session's session_cleanup command
+        pass
+
+    def _retrieve_session_data(self, store_id):
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(UserSession.data, UserSession.expiry)
+                .where(UserSession.id == store_id, UserSession.expiry > datetime.utcnow())
+            ).first()
+        if row is None:
+            return None
+        g._session_expiry = row.expiry
+        return self.serializer.decode(want_bytes(row.data))
+
+    def _delete_session(self, store_id):
+        with db.engine.begin() as connection:
+            connection.execute(delete(UserSession).where(UserSession.id == store_id))
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        values = {
+            'id': store_id,
+            'data': self.serializer.encode(session),
+            'expiry': datetime.utcnow() + session_lifetime,
+        }
+        table = UserSession.__table__
+        with db.engine.begin() as connection:
+            dialect = {'sqlite': sqlite, 'postgresql': postgresql}.get(connection.dialect.name)
+            if dialect is not None:
+                statement = dialect.insert(table).values(values)
+                connection.execute(statement.on_conflict_do_update(index_elements=[table.c.id], set_={
+                    'data': statement.excluded.data, 'expiry': statement.excluded.expiry,
+                }))
+            elif connection.execute(update(table).where(table.c.id == store_id).values(values)).rowcount == 0:
+                connection.execute(table.insert().values(values))
+
+    def _delete_expired_sessions(self):
+        purge_expired_sessions()
+
+    def should_set_storage(self, app, session):
+        if session.modified:
+            return True
+        if not app.config['SESSION_REFRESH_EACH_REQUEST']:
+            return False
+        expiry = g.get('_session_expiry')
+        if expiry is None:
+            return True
+        refresh_after = timedelta(seconds=app.config['SESSION_EXPIRY_REFRESH_SECONDS'])
+        return expiry - datetime.utcnow() <= app.permanent_session_lifetime - refresh_after
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    """Flask's signed cookie session, permanent when SESSION_PERMANENT is set"""
+
+    def save_session(self, app, session, response):
+        if session and app.config['SESSION_PERMANENT'] and not session.permanent:
+            session.permanent = True
+        super().save_session(app, session, response)
+
+
+def purge_expired_sessions():
+    """Delete expired database sessions; returns the number deleted"""
+    with db.engine.begin() as connection:
+        return connection.execute(delete(UserSession).where(UserSession.expiry <= datetime.utcnow())).rowcount
+
+
+def purge_sessions_periodically():
+    """Purge expired sessions at most once every SESSION_PURGE_INTERVAL seconds"""
+    app = current_app._get_current_object()
+    interval = app.config['SESSION_PURGE_INTERVAL']
+    now = time.monotonic()
+    if not interval or now - app.extensions['sessions_purged_at'] < interval:
+        return
+    app.extensions['sessions_purged_at'] = now
+    try:
+        purge_expired_sessions()
+    except Exception:
+        app.logger.exception('Purging expired sessions failed')
+
+
+def init_sessions(app):
+    """Install the session interface chosen by SESSION_TYPE"""
+    session_type = app.config['SESSION_TYPE'].lower()
+    if session_type not in SESSION_TYPES:
+        raise ValueError(f"SESSION_TYPE must be one of {', '.join(SESSION_TYPES)}, not {session_type!r}")
+    app.config.setdefault('SESSION_EXPIRY_REFRESH_SECONDS', 3600)
+    app.config.setdefault('SESSION_PURGE_INTERVAL', 3600)
+
+    if session_type == 'filesystem':
+        Session().init_app(app)
+    elif session_type == 'cookie':
+        app.config.setdefault('SESSION_PERMANENT', Defaults.SESSION_PERMANENT)
+        app.session_interface = CookieSessionInterface()
+    else:
+        config = app.config
+        app.session_interface = DatabaseSessionInterface(
+            app,
+            key_prefix=config.get('SESSION_KEY_PREFIX', Defaults.SESSION_KEY_PREFIX),
+            use_signer=config.get('SESSION_USE_SIGNER', Defaults.SESSION_USE_SIGNER),
+            permanent=config.get('SESSION_PERMANENT', Defaults.SESSION_PERMANENT),
+            sid_length=config.get('SESSION_ID_LENGTH', Defaults.SESSION_ID_LENGTH),
+            serialization_format=config.get('SESSION_SERIALIZATION_FORMAT', Defaults.SESSION_SERIALIZATION_FORMAT),
+        )
+        # The first purge comes one interval after start, so workers
+        # starting together don't all purge at once
+        app.extensions['sessions_purged_at'] = time.monotonic()
+        app.before_request(purge_sessions_periodically)
@@ -0,0 +1,199 @@
+import time
+from datetime import datetime, timezone
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import Integer, String, case, cast, event, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db, mail
+from app.models import Currency, Setting
+from config import Config
+
+# Row of the settings table counting settings writes. Every commit that
+# changes a setting bumps it, and each worker reloads its settings when the
+# number differs from the one it loaded.
+SETTINGS_VERSION_KEY = '_settings_version'
+
+
+def _flag(value):
+    return value.lower() in ('true', '1', 'on', 'yes')
+
+
+def _optional(value):
+    return value or None
+
+
+# Settings that can be changed from the settings pages: the parser turning
+# the stored string into its config value, and the default used when
+# neither the config nor the database sets it
+SETTINGS = {
+    'BUSINESS_NAME': (str, Config.BUSINESS_NAME),
+    'BUSINESS_EMAIL': (str, Config.BUSINESS_EMAIL),
+    'BUSINESS_PHONE': (str, Config.BUSINESS_PHONE),
+    'BUSINESS_WEBSITE': (str, Config.BUSINESS_WEBSITE),
+    'BUSINESS_ADDRESS': (str, Config.BUSINESS_ADDRESS),
+    'LOGO_FILENAME': (_optional, None),
+    'TAX_RATE': (float, Config.TAX_RATE),
+    'DEFAULT_CURRENCY': (str, Config.DEFAULT_CURRENCY),
+    'MAIL_SERVER': (str, Config.MAIL_SERVER),
+    'MAIL_PORT': (int, Config.MAIL_PORT),
+    'MAIL_USE_TLS': (_flag, False),
+    'MAIL_USE_SSL': (_flag, False),
+    'MAIL_USERNAME': (str, None),
+    'MAIL_PASSWORD': (str, None),
+    'MAIL_DEFAULT_SENDER': (str, Config.MAIL_DEFAULT_SENDER),
+    'PDF_TEMPLATE': (str, 'professional'),
+    'PDF_HEADER_COLOR': (str, 'blue'),
+    'PDF_ACCENT_COLOR': (str, 'blue'),
+    'PDF_LOGO_POSITION': (str, 'left'),
+    'PDF_FOOTER_TEXT': (str, 'Thank you for your business!'),
+    'PDF_SHOW_LOGO': (_flag, True),
+    'BACKUP_SCHEDULE_INTERVAL': (int, 0),
+    'BACKUP_SCHEDULE_RETENTION': (int, 14),
+    'BACKUP_SCHEDULE_DIR': (_optional, None),
+}
+
+
+def parse_setting(key, value):
+    """The config value of a stored setting, or its default if it doesn't parse"""
+    parser, default = SETTINGS[key]
+    try:
+        return parser(value)
+    except ValueError:
+        return default
+
+
+def dump_setting(value):
+    """The string stored for a config value"""
+    return '' if value is None else str(value)
+
+
+def load_settings(app):
+    """Copy every stored setting into app.config as its declared type"""
+    for key, value in db.session.execute(select(Setting.key, Setting.value).where(Setting.key.in_(SETTINGS))):
+        app.config[key] = parse_setting(key, value)
+
+
+def _upsert(dialect_name, rows):
+    """INSERT ... ON CONFLICT DO UPDATE of rows, bumping the version row"""
+    dialect = {'sqlite': sqlite, 'postgresql': postgresql}.get(dialect_name)
+    if dialect is None:
+        return None
+    table = Setting.__table__
+    statement = dialect.insert(table).values(rows)
+    return statement.on_conflict_do_update(index_elements=[table.c.key], set_={
+        'value': case(
+            (table.c.key == SETTINGS_VERSION_KEY, cast(cast(table.c.value, Integer) + 1, String)),
+            else_=statement.excluded.value
+        )
+    })
+
+
+def save_settings(values):
+    """Store settings and apply them to the current app's config.
+
+    ``values`` maps registered keys to config values. They are written,
+    together with the version bump, in a single upsert statement; the
+    caller commits.
+    """
+    unknown = [key for key in values if key not in SETTINGS]
+    if unknown:
+        raise KeyError(f"Unknown setting(s): {', '.join(unknown)}")
+    rows = [{'key': key, 'value': dump_setting(value)} for key, value in values.items()]
+    statement = _upsert(db.engine.dialect.name, rows + [{'key': SETTINGS_VERSION_KEY, 'value': '1'}])
+    if statement is not None:
+        db.session.execute(statement)
+    else:
+        for row in rows:
+            db.session.merge(Setting(**row))
+    for key, value in values.items():
+        current_app.config[key] = parse_setting(key, dump_setting(value))
+
+
+def settings_version():
+    """The current settings version; one primary key lookup"""
+    value = db.session.execute(
+        select(Setting.value).where(Setting.key == SETTINGS_VERSION_KEY)
+    ).scalar_one_or_none()
+    return int(value) if value else 0
+
+
+def bump_settings_version(connection):
+    table = Setting.__table__
+    result = connection.execute(update(table).where(table.c.key == SETTINGS_VERSION_KEY).values(
+        value=cast(cast(table.c.value, Integer) + 1, String)
+    ))
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(key=SETTINGS_VERSION_KEY, value='1'))
+
+
+def _after_flush(session, flush_context):
+    # Once per transaction is enough for other workers to notice
+    if session.info.get('settings_version_bumped'):
+        return
+    # Currencies count as settings: pages cached by settings version show
+    # their symbols
+    if any(isinstance(obj, (Setting, Currency)) for obj in chain(session.new, session.dirty, session.deleted)):
+        bump_settings_version(session.connection())
+        session.info['settings_version_bumped'] = True
+
+
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('settings_version_bumped', None)
+
+
+def reload_settings(app):
+    """Reload the settings and everything built from them"""
+    from app.services.pdf_service import clear_pdf_caches
+
+    version = settings_version()
+    load_settings(app)
+    mail.init_app(app)
+    clear_pdf_caches()
+    app.extensions['settings_version'] = version
+    app.extensions['settings_loaded_at'] = datetime.now(timezone.utc)
+
+
+def sync_settings():
+    """Reload settings written by another worker since they were last loaded.
+
+    Runs before each request but looks at the version at most once every
+    SETTINGS_CHECK_INTERVAL seconds (0 checks on every request).
+    """
+    app = current_app._get_current_object()
+    now = time.monotonic()
+    if now - app.extensions.get('settings_checked_at', float('-inf')) < app.config['SETTINGS_CHECK_INTERVAL']:
+        return
+    app.extensions['settings_checked_at'] = now
+    # A restored backup may carry an older version, so any change reloads
+    if settings_version() != app.extensions.get('settings_version'):
+        reload_settings(app)
+
+
+def init_settings_sync(app):
+    """Load the stored settings and keep every worker's copy current."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_transaction_end', _after_transaction_end)
+    app.before_request(sync_settings)
+
+    for key, (parser, default) in SETTINGS.items():
+        app.config.setdefault(key, default)
+
+    with app.app_context():
+        try:
+            # Make sure the counter exists, so bumping it is a plain UPDATE
+            if not db.session.get(Setting, SETTINGS_VERSION_KEY):
+                db.session.execute(insert(Setting.__table__).values(key=SETTINGS_VERSION_KEY, value='0'))
+                db.session.commit()
+        except IntegrityError:
+            # Another worker created it first
+            db.session.rollback()
+        except Exception as e:
+            # This can happen if the database is not yet initialized
+            db.session.rollback()
+            print(f"Could not load settings from DB: {e}")
+            return
+        reload_settings(app)
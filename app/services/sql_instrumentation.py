@@ -0,0 +1,174 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import has_request_context, request
+from markupsafe import escape
+from sqlalchemy import event
+from app.extensions import db
+
+# Runs of placeholders, as produced by expanding IN (...) lists, so the
+# same query with a different number of ids has the same shape
+_PLACEHOLDER_RUN = re.compile(r'(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))+')
+_WHITESPACE = re.compile(r'\s+')
+
+# The request's statements are kept in its WSGI environ rather than on g,
+# which belongs to the app context: code that pushes its own app context
+# mid-request (such as the format_currency filter) gets a fresh g, and its
+# queries would go uncounted
+ENVIRON_KEY = 'app.sql_queries'
+
+
+def statement_shape(statement):
+    """Normalize a statement so repeats that differ only in parameters match."""
+    return _PLACEHOLDER_RUN.sub('?...', _WHITESPACE.sub(' ', statement).strip())
+
+
+class SqlStats:
+    """Recent per-request query summaries and per-endpoint totals of one worker."""
+
+    def __init__(self, history):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=history)
+        self.endpoints = {}
+
+    def record(self, summary):
+        with self.lock:
+            self.recent.append(summary)
+            totals = self.endpoints.setdefault(summary['endpoint'], {
+                'requests': 0, 'queries': 0, 'time_ms': 0.0, 'max_queries': 0, 'n_plus_one_requests': 0
+            })
+            totals['requests'] += 1
+            totals['queries'] += summary['queries']
+            totals['time_ms'] += summary['time_ms']
+            totals['max_queries'] = max(totals['max_queries'], summary['queries'])
+            totals['n_plus_one_requests'] += bool(summary['n_plus_one'])
+
+    def snapshot(self):
+        with self.lock:
+            endpoints = {
+                name: dict(totals,
+                           time_ms=round(totals['time_ms'], 3),
+                           avg_queries=round(totals['queries'] / totals['requests'], 2))
+                for name, totals in self.endpoints.items()
+            }
+            return {'endpoints': endpoints, 'recent': list(self.recent)}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    if not has_request_context():
+        return
+    queries = request.environ.get(ENVIRON_KEY)
+    if queries is not None:
+        queries.append((statement, elapsed))
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute doesn't run for a failed statement
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start_time'):
+        connection.info['query_start_time'].pop()
+
+
+def _start_request():
+    request.environ[ENVIRON_KEY] = []
+
+
+def _summarize(app, response):
+    queries = request.environ.pop(ENVIRON_KEY, None)
+    if queries is None:
+        return None
+    config = app.config
+    slow_after = config['SQL_SLOW_QUERY_MS'] / 1000
+    shapes = Counter(statement_shape(statement) for statement, elapsed in queries)
+    n_plus_one = [
+        {'statement': shape, 'count': count}
+        for shape, count in shapes.most_common()
+        if count >= config['SQL_N_PLUS_ONE_THRESHOLD']
+    ]
+    slow = [
+        {'statement': statement_shape(statement), 'time_ms': round(elapsed * 1000, 3)}
+        for statement, elapsed in queries if elapsed >= slow_after
+    ]
+    for query in slow:
+        app.logger.warning('Slow query (%.1f ms) in %s %s: %s',
+                           query['time_ms'], request.method, request.path, query['statement'])
+    for repeat in n_plus_one:
+        app.logger.warning('Possible N+1 in %s %s: %d identical queries: %s',
+                           request.method, request.path, repeat['count'], repeat['statement'])
+    return {
+        'at': datetime.utcnow().isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint or 'unknown',
+        'status': response.status_code,
+        'queries': len(queries),
+        'time_ms': round(sum(elapsed for statement, elapsed in queries) * 1000, 3),
+        'slow': slow,
+        'n_plus_one': n_plus_one,
+    }
+
+
+def _footer(summary):
+    warnings = ''.join(
+        f'<div>N+1? {repeat["count"]}&times; {escape(repeat["statement"][:200])}</div>'
+        for repeat in summary['n_plus_one']
+    )
+    return (
+        '<div id="sql-debug-footer" style="position:fixed;bottom:0;right:0;z-index:9999;max-width:40rem;'
+        'padding:.25rem .75rem;font:12px monospace;background:#111827;color:#f9fafb;opacity:.9">'
+        f'SQL: {summary["queries"]} queries, {summary["time_ms"]:.1f} ms, {len(summary["slow"])} slow'
+        f'{warnings}</div>'
+    )
+
+
+def init_sql_instrumentation(app):
+    """Count and time the SQL statements of every request.
+
+    Statements slower than SQL_SLOW_QUERY_MS and statement shapes repeated
+    SQL_N_PLUS_ONE_THRESHOLD times or more in one request (a likely N+1)
+    are logged. Each request's summary is kept for the JSON endpoint, and
+    can be sent as response headers (SQL_STATS_HEADER) or as a footer on
+    HTML pages (SQL_DEBUG_FOOTER). Statements run while a streamed
+    response is being sent are not counted.
+    """
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+    stats = SqlStats(app.config['SQL_STATS_HISTORY'])
+    app.extensions['sql_stats'] = stats
+    app.before_request(_start_request)
+
+    @app.after_request
+    def record_sql_stats(response):
+        summary = _summarize(app, response)
+        if summary is None or request.endpoint == 'debug.sql_stats':
+            return response
+        stats.record(summary)
+
+        if app.config['SQL_STATS_HEADER']:
+            response.headers['X-SQL-Queries'] = str(summary['queries'])
+            response.headers['X-SQL-Time-Ms'] = f"{summary['time_ms']:.3f}"
+            if summary['n_plus_one']:
+                response.headers['X-SQL-N-Plus-One'] = str(len(summary['n_plus_one']))
+            response.headers.add('Server-Timing', f"db;desc=\"{summary['queries']} queries\";dur={summary['time_ms']:.3f}")
+
+        if (app.config['SQL_DEBUG_FOOTER'] and response.mimetype == 'text/html'
+                and not response.is_streamed and not response.direct_passthrough):
+            body = response.get_data(as_text=True)
+            if '</body>' in body:
+                response.set_data(body.replace('</body>', _footer(summary) + '</body>', 1))
+        return response
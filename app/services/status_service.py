@@ -0,0 +1,174 @@
+import csv
+from datetime import datetime
+
+from sqlalchemy import or_, select, update
+from app.extensions import db
+from app.models import ArchivedInvoice, Invoice
+from app.services.client_stats_service import refresh_client_stats
+
+# Statuses an invoice can be given by hand; overdue is only ever set by
+# mark_overdue_invoices()
+MANUAL_STATUSES = ('draft', 'sent', 'unpaid', 'paid', 'cancelled')
+
+# Unpaid invoices past their due date become overdue
+OVERDUE_FROM_STATUSES = ('draft', 'sent', 'unpaid')
+
+# Invoices looked up and updated per statement, well under the bound
+# parameter limits of SQLite and PostgreSQL
+BULK_CHUNK_SIZE = 500
+
+
+def _chunks(values, size=BULK_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def mark_overdue_invoices(invoice_ids=None, today=None):
+    """Mark unpaid invoices past their due date as overdue in one UPDATE.
+
+    Limited to ``invoice_ids`` when given. Client stats of the clients
+    concerned are refreshed. Returns the number of invoices marked; the
+    caller commits.
+    """
+    if invoice_ids is not None and not invoice_ids:
+        return 0
+    today = today or datetime.now().date()
+    criteria = [Invoice.due_date < today, Invoice.status.in_(OVERDUE_FROM_STATUSES)]
+    if invoice_ids is not None:
+        criteria.append(Invoice.id.in_(invoice_ids))
+
+    client_ids = db.session.execute(select(Invoice.client_id).where(*criteria).distinct()).scalars().all()
+    if not client_ids:
+        return 0
+    result = db.session.execute(
+        update(Invoice).where(*criteria).values(status='overdue', updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    # Draft invoices becoming overdue start counting as outstanding
+    refresh_client_stats(client_ids)
+    return result.rowcount
+
+
+def _lookup(model, refs):
+    """Map each ref to the (id, status, client_id) row of the invoice it names.
+
+    An int ref is an invoice id. A string is an invoice number, or an id
+    when it is all digits and no invoice has that number.
+    """
+    numbers = [ref for ref in refs if isinstance(ref, str)]
+    ids = [int(ref) for ref in refs if isinstance(ref, int) or ref.isdigit()]
+    by_id, by_number = {}, {}
+    for row in db.session.execute(
+        select(model.id, model.invoice_number, model.status, model.client_id)
+        .where(or_(model.invoice_number.in_(numbers), model.id.in_(ids)))
+    ):
+        by_id[row.id] = row
+        by_number[row.invoice_number] = row
+
+    found = {}
+    for ref in refs:
+        if isinstance(ref, int):
+            row = by_id.get(ref)
+        else:
+            row = by_number.get(ref) or (by_id.get(int(ref)) if ref.isdigit() else None)
+        if row is not None:
+            found[ref] = row
+    return found
+
+
+def bulk_update_status(refs, status, today=None):
+    """Give many invoices a status with set-based UPDATEs.
+
+    ``refs`` are invoice numbers (str) or ids (int or digit str, see
+    _lookup()). Invoices are looked up and updated BULK_CHUNK_SIZE at a
+    time with one ``UPDATE ... WHERE id IN (...)`` per chunk, clearing the
+    notes when marking invoices paid as the single status change does.
+    Those past their due date then go overdue, and the stats of the
+    clients concerned are refreshed, all in one transaction.
+
+    Returns ``(outcomes, error)``. Outcomes are dicts in the order of the
+    refs, with the ``ref``, the invoice ``id``, the resulting ``status``
+    and an ``outcome`` of updated, unchanged, archived (read-only) or
+    not_found.
+    """
+    if status not in MANUAL_STATUSES:
+        return None, f'Invalid status: {status}'
+    refs = list(refs)
+    invalid = [ref for ref in refs if isinstance(ref, bool) or not isinstance(ref, (str, int))]
+    if invalid:
+        return None, f'Invalid invoice reference: {invalid[0]!r}'
+    refs = list(dict.fromkeys(ref if isinstance(ref, int) else ref.strip() for ref in refs))
+    refs = [ref for ref in refs if ref != '']
+
+    now = datetime.utcnow()
+    values = {'status': status, 'updated_at': now}
+    if status == 'paid':
+        values['notes'] = ''
+
+    outcomes, updated_ids, client_ids = [], [], set()
+    try:
+        for chunk in _chunks(refs):
+            current = _lookup(Invoice, chunk)
+            missing = [ref for ref in chunk if ref not in current]
+            archived = _lookup(ArchivedInvoice, missing) if missing else {}
+
+            ids = []
+            for ref in chunk:
+                row = current.get(ref)
+                if row is None:
+                    row = archived.get(ref)
+                    outcome = 'archived' if row is not None else 'not_found'
+                elif row.status == status:
+                    outcome = 'unchanged'
+                else:
+                    outcome = 'updated'
+                    ids.append(row.id)
+                    client_ids.add(row.client_id)
+                outcomes.append({
+                    'ref': ref,
+                    'id': row.id if row is not None else None,
+                    'status': row.status if row is not None else None,
+                    'outcome': outcome,
+                })
+
+            if ids:
+                db.session.execute(
+                    update(Invoice).where(Invoice.id.in_(ids)).values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                updated_ids.extend(ids)
+
+        overdue = set()
+        for chunk in _chunks(updated_ids if status in OVERDUE_FROM_STATUSES else []):
+            if mark_overdue_invoices(chunk, today):
+                overdue.update(db.session.execute(
+                    select(Invoice.id).where(Invoice.id.in_(chunk), Invoice.status == 'overdue')
+                ).scalars())
+        refresh_client_stats(client_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return None, str(e)
+
+    for outcome in outcomes:
+        if outcome['outcome'] == 'updated':
+            outcome['status'] = 'overdue' if outcome['id'] in overdue else status
+    return outcomes, None
+
+
+def refs_from_csv(stream):
+    """Read invoice refs from a CSV of payments.
+
+    Uses the invoice_number column, or the invoice_id or id column when
+    there is none.
+    """
+    reader = csv.DictReader(stream)
+    header = [name.strip().lower() for name in reader.fieldnames or ()]
+    reader.fieldnames = header
+    column = next((name for name in ('invoice_number', 'invoice_id', 'id') if name in header), None)
+    if column is None:
+        raise ValueError('The CSV needs an invoice_number or invoice_id column')
+    refs = (row[column].strip() for row in reader if row.get(column))
+    if column == 'invoice_number':
+        return list(refs)
+    return [int(ref) if ref.isdigit() else ref for ref in refs]
@@ -0,0 +1,64 @@
+from sqlalchemy import BigInteger, case, cast, func, or_, select, update
+from app.extensions import db
+from app.models import Invoice, InvoiceItem
+from app.money import TAX_RATE_SCALE
+
+
+def _tax_expr(subtotal):
+    """SQL version of app.money.tax_minor, using integer arithmetic only.
+
+    Integer division truncates toward zero in SQLite and PostgreSQL, so
+    half a unit is added to positive products and subtracted from negative
+    ones, rounding half away from zero like tax_minor.
+    """
+    rate_ppm = cast(func.round(func.coalesce(Invoice.tax_rate, 0) * TAX_RATE_SCALE), BigInteger)
+    product = subtotal * rate_ppm
+    half = TAX_RATE_SCALE // 2
+    return case((product < 0, product - half), else_=product + half) // TAX_RATE_SCALE
+
+
+def _drifted(subtotal, tax):
+    return or_(
+        Invoice.subtotal_minor != subtotal,
+        Invoice.tax_amount_minor != tax,
+        Invoice.total_minor != subtotal + tax
+    )
+
+
+def find_drifted_invoices():
+    """Return the ids of invoices whose stored totals don't match their items.
+
+    Runs as a single grouped query over invoices left-joined to their items.
+    """
+    subtotal = func.coalesce(func.sum(InvoiceItem.amount_minor), 0)
+    tax = _tax_expr(subtotal)
+    query = select(Invoice.id).outerjoin(
+        InvoiceItem, InvoiceItem.invoice_id == Invoice.id
+    ).group_by(
+        Invoice.id, Invoice.subtotal_minor, Invoice.tax_amount_minor, Invoice.total_minor, Invoice.tax_rate
+    ).having(_drifted(subtotal, tax))
+    return db.session.execute(query).scalars().all()
+
+
+def recompute_invoice_totals(invoice_ids=None):
+    """Recompute stored totals from line items in one UPDATE statement.
+
+    Only invoices whose totals have drifted are written, so updated_at is
+    left alone on correct rows. Limit the update to ``invoice_ids`` when
+    given. Returns the number of invoices fixed; the caller commits.
+    """
+    subtotal = select(
+        func.coalesce(func.sum(InvoiceItem.amount_minor), 0)
+    ).where(InvoiceItem.invoice_id == Invoice.id).scalar_subquery()
+    tax = _tax_expr(subtotal)
+
+    statement = update(Invoice).values(
+        subtotal_minor=subtotal,
+        tax_amount_minor=tax,
+        total_minor=subtotal + tax
+    ).where(_drifted(subtotal, tax))
+    if invoice_ids is not None:
+        statement = statement.where(Invoice.id.in_(invoice_ids))
+
+    result = db.session.execute(statement.execution_options(synchronize_session=False))
+    return result.rowcount
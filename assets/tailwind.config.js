@@ -0,0 +1,19 @@
+// Compiled by build_assets.py into app/static/dist. Paths are relative to
+// the repository root, where the build runs.
+module.exports = {
+  content: ['./app/templates/**/*.html'],
+  darkMode: 'class',
+  theme: {
+    extend: {
+      colors: {
+        primary: '#059669',
+        secondary: '#10b981',
+      },
+      animation: {
+        'fade-in': 'fadeIn 0.3s ease-in-out',
+        'slide-in': 'slideIn 0.2s ease-out',
+        'bounce-subtle': 'bounceSubtle 0.6s ease-in-out',
+      },
+    },
+  },
+};
@@ -0,0 +1,53 @@
+"""Setup shared by the benchmark scripts.
+
+Importing this module puts the repository root on sys.path, so the scripts
+can be run directly (``python benchmarks/bench_export.py``) and still import
+the app.
+"""
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_workdir(name):
+    """A fresh temporary directory for one benchmark run"""
+    return tempfile.mkdtemp(prefix=f'bench_{name}_')
+
+
+def bench_config(workdir, **overrides):
+    """A Config subclass keeping the database and sessions in ``workdir``.
+
+    The backup scheduler is off; ``overrides`` set or replace any other
+    setting.
+    """
+    from config import Config
+
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'SESSION_FILE_DIR': os.path.join(workdir, 'sessions'),
+        'BACKUP_SCHEDULER_ENABLED': False,
+        **overrides,
+    }
+    return type('BenchConfig', (Config,), settings)
+
+
+def make_bench_app(workdir, create_tables=True, **overrides):
+    """Create the app on bench_config(workdir, **overrides), with its tables"""
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app(bench_config(workdir, **overrides))
+    if create_tables:
+        with app.app_context():
+            db.create_all()
+    return app
+
+
+def print_report(report):
+    """Print a benchmark's results as JSON, the output every script shares"""
+    print(json.dumps(report, indent=2))
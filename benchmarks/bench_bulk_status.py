@@ -0,0 +1,79 @@
+"""Benchmark marking many invoices paid one by one versus in bulk.
+
+Creates invoices, marks half of them paid with one status POST each, as
+the invoice page does, and the other half with a single bulk status
+request. Reports the time and number of SQL statements for each and
+checks the client stats afterwards.
+
+Usage:
+    python benchmarks/bench_bulk_status.py [--invoices 300]
+"""
+import argparse
+import time
+from datetime import date
+
+from _common import make_bench_app, make_workdir, print_report
+
+from sqlalchemy import event, insert
+
+from app.extensions import db
+from app.models import Client, Invoice
+from app.services.client_stats_service import refresh_client_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invoices', type=int, default=300)
+    args = parser.parse_args()
+
+    workdir = make_workdir('status')
+    app = make_bench_app(workdir)
+    with app.app_context():
+        db.session.execute(insert(Client.__table__), [{'name': f'Client {n}'} for n in range(10)])
+        db.session.execute(insert(Invoice.__table__), [
+            {
+                'invoice_number': f'INV-{n:05d}', 'client_id': n % 10 + 1, 'issue_date': date(2026, 1, 1),
+                'due_date': date(2099, 1, 1), 'status': 'sent', 'currency': 'USD', 'currency_exponent': 2,
+                'subtotal_minor': 10000, 'tax_rate': 0, 'tax_amount_minor': 0, 'total_minor': 10000,
+                'notes': 'Awaiting payment',
+            }
+            for n in range(args.invoices)
+        ])
+        refresh_client_stats()
+        db.session.commit()
+        engine = db.engine
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *a: statements.append(1))
+
+    client = app.test_client()
+    half = args.invoices // 2
+    results = []
+
+    statements.clear()
+    start = time.perf_counter()
+    for invoice_id in range(1, half + 1):
+        assert client.post(f'/invoices/{invoice_id}/status/paid').status_code == 302
+    results.append({'method': 'one request per invoice', 'invoices': half,
+                    'seconds': round(time.perf_counter() - start, 3), 'statements': len(statements)})
+
+    statements.clear()
+    start = time.perf_counter()
+    numbers = [f'INV-{n:05d}' for n in range(half, args.invoices)]
+    response = client.post('/invoices/bulk-status', json={'status': 'paid', 'invoices': numbers})
+    outcomes = response.get_json()['invoices']
+    assert all(outcome['outcome'] == 'updated' for outcome in outcomes)
+    results.append({'method': 'bulk request', 'invoices': len(numbers),
+                    'seconds': round(time.perf_counter() - start, 3), 'statements': len(statements)})
+
+    with app.app_context():
+        assert Invoice.query.filter_by(status='paid').count() == args.invoices
+        assert Invoice.query.filter(Invoice.notes != '').count() == 0
+        assert refresh_client_stats() == 0, 'client stats drifted'
+        db.engine.dispose()
+
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark deleting a client with many invoices.
+
+Builds a scratch database holding one large client and deletes it two
+ways:
+
+- ``orm``: the client's invoices and items are loaded into the session
+  first, so SQLAlchemy deletes them row by row. This is what deleting a
+  client did before the foreign keys had ON DELETE CASCADE.
+- ``cascade``: the client is deleted on its own and the database removes
+  its invoices and items through ON DELETE CASCADE.
+
+Usage:
+    python benchmarks/bench_cascade_delete.py [--invoices 10000] [--items 5]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from _common import make_bench_app, make_workdir, print_report
+
+from sqlalchemy.orm import selectinload
+
+from app.extensions import db
+from app.models import Client, Invoice, InvoiceItem
+
+
+def build_client(invoice_count, items_per_invoice):
+    client = Client(name='Benchmark Client')
+    db.session.add(client)
+    db.session.commit()
+
+    issue_date = date.today()
+    db.session.execute(Invoice.__table__.insert(), [
+        {
+            'invoice_number': f'BENCH-{i:06d}',
+            'client_id': client.id,
+            'issue_date': issue_date,
+            'due_date': issue_date + timedelta(days=30),
+            'status': 'unpaid',
+            'currency': 'USD',
+            'currency_exponent': 2,
+            'subtotal_minor': 1000 * items_per_invoice,
+            'tax_rate': 0.0,
+            'tax_amount_minor': 0,
+            'total_minor': 1000 * items_per_invoice,
+        }
+        for i in range(invoice_count)
+    ])
+    invoice_ids = db.session.execute(
+        db.select(Invoice.id).where(Invoice.client_id == client.id)
+    ).scalars().all()
+    db.session.execute(InvoiceItem.__table__.insert(), [
+        {'invoice_id': invoice_id, 'description': f'Item {n}', 'quantity': 1.0, 'rate_minor': 1000, 'amount_minor': 1000}
+        for invoice_id in invoice_ids
+        for n in range(items_per_invoice)
+    ])
+    db.session.commit()
+    return client.id
+
+
+def run_mode(mode, invoice_count, items_per_invoice):
+    workdir = make_workdir('cascade')
+    app = make_bench_app(workdir)
+    with app.app_context():
+        client_id = build_client(invoice_count, items_per_invoice)
+        db.session.expunge_all()
+
+        start = time.perf_counter()
+        query = Client.query
+        if mode == 'orm':
+            query = query.options(selectinload(Client.invoices).selectinload(Invoice.items))
+        client = query.get(client_id)
+        db.session.delete(client)
+        db.session.commit()
+        elapsed = time.perf_counter() - start
+
+        remaining = db.session.query(InvoiceItem).count()
+        db.engine.dispose()
+
+    return {
+        'mode': mode,
+        'invoices': invoice_count,
+        'items': invoice_count * items_per_invoice,
+        'seconds': round(elapsed, 3),
+        'remaining_items': remaining,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invoices', type=int, default=10000)
+    parser.add_argument('--items', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [
+        run_mode('orm', args.invoices, args.items),
+        run_mode('cascade', args.invoices, args.items),
+    ]
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
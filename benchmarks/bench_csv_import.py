@@ -0,0 +1,117 @@
+"""Benchmark the streaming CSV import with generated clients, invoices and items.
+
+Writes clients, invoices and line item CSV files, with a few bad rows
+mixed in, and imports them one after the other as `flask import-csv`
+does. For each file it reports the rows imported and rejected, the time
+taken and the peak resident memory so far, then checks that the invoice
+totals match their items and the client stats match their invoices.
+The peak memory includes SQLite's page cache and memory-mapped reads
+(see SQLITE_PRAGMAS), which level off well below their configured size.
+
+Usage:
+    python benchmarks/bench_csv_import.py [--items 1000000] [--items-per-invoice 10]
+"""
+import argparse
+import csv
+import os
+import resource
+import time
+
+from _common import make_bench_app, make_workdir, print_report
+
+from app.extensions import db
+from app.models import Client, Invoice, InvoiceItem
+from app.services.client_stats_service import refresh_client_stats
+from app.services.csv_import import COLUMNS, import_csv
+from app.services.totals_service import find_drifted_invoices
+
+STATUSES = ('draft', 'sent', 'paid', 'overdue')
+BAD_ROW_EVERY = 10000
+
+
+def write_csv(path, kind, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS[kind])
+        writer.writerows(rows)
+
+
+def client_rows(count):
+    for n in range(count):
+        yield (f'Client {n}', f'client{n}@example.com', '', f'{n} Main Street', '')
+    yield ('', 'nameless@example.com', '', '', '')
+
+
+def invoice_rows(count, clients):
+    for n in range(count):
+        client = n % clients
+        # Every other invoice finds its client by name instead of email
+        email, name = (f'client{client}@example.com', '') if n % 2 else ('', f'Client {client}')
+        yield (f'INV-{n:07d}', email, name, f'2025-{n % 12 + 1:02d}-15', '', STATUSES[n % len(STATUSES)],
+               'USD' if n % 3 else 'IDR', '11', '')
+        if n % BAD_ROW_EVERY == 0:
+            yield (f'INV-{n:07d}', email, name, '2025-01-15', '', 'paid', 'USD', '11', 'duplicate number')
+    yield ('INV-NOCLIENT', 'nobody@example.com', '', '2025-01-15', '', 'draft', 'USD', '', '')
+
+
+def item_rows(count, per_invoice):
+    for n in range(count):
+        yield (f'INV-{n // per_invoice:07d}', f'Line {n}', str(n % 5 + 1), f'{n % 97 + 1}.25')
+        if n % BAD_ROW_EVERY == 0:
+            yield (f'INV-{n // per_invoice:07d}', 'Bad rate', '1', 'ten')
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--items-per-invoice', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    workdir = make_workdir('import')
+    invoices = -(-args.items // args.items_per_invoice)
+
+    app = make_bench_app(workdir)
+
+    files = {
+        'clients': client_rows(args.clients),
+        'invoices': invoice_rows(invoices, args.clients),
+        'items': item_rows(args.items, args.items_per_invoice),
+    }
+    results = []
+    for kind, rows in files.items():
+        path = os.path.join(workdir, f'{kind}.csv')
+        write_csv(path, kind, rows)
+        with app.app_context():
+            start = time.perf_counter()
+            with open(path, newline='') as stream, open(f'{path}.rejects.csv', 'w', newline='') as rejects:
+                report, error = import_csv(kind, stream, rejects, args.batch_size)
+            elapsed = time.perf_counter() - start
+        assert error is None, f'{kind}: {error}'
+        results.append({
+            'file': kind,
+            'imported': report['imported'],
+            'rejected': report['rejected'],
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(report['imported'] / elapsed),
+            'peak_rss_mb': peak_rss_mb(),
+        })
+
+    with app.app_context():
+        assert Client.query.count() == args.clients
+        assert Invoice.query.count() == invoices
+        assert InvoiceItem.query.count() == args.items
+        assert not find_drifted_invoices(), 'invoice totals do not match their items'
+        assert refresh_client_stats() == 0, 'client stats do not match their invoices'
+        db.engine.dispose()
+
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
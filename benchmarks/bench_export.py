@@ -0,0 +1,99 @@
+"""Benchmark streaming invoice and line item exports.
+
+Fills a database with generated invoices and items, then downloads every
+export type through the export route. For each one it reports the time
+until the first chunk arrives, the total time, the bytes sent and the
+peak Python memory allocated while streaming, which should stay the same
+whatever the number of rows.
+
+Usage:
+    python benchmarks/bench_export.py [--items 1000000] [--items-per-invoice 10]
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from _common import make_bench_app, make_workdir, print_report
+
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models import Client, Invoice, InvoiceItem
+
+BATCH = 10000
+
+
+def seed(items, per_invoice):
+    db.session.execute(insert(Client.__table__), [{'name': 'Benchmark Client', 'email': 'bench@example.com'}])
+    invoices = -(-items // per_invoice)
+    for first in range(0, invoices, BATCH):
+        db.session.execute(insert(Invoice.__table__), [
+            {
+                'invoice_number': f'INV-{n:07d}', 'client_id': 1, 'issue_date': date(2025, 1, 1) + timedelta(days=n % 365),
+                'due_date': date(2025, 12, 31), 'status': 'paid' if n % 2 else 'sent', 'currency': 'USD',
+                'currency_exponent': 2, 'subtotal_minor': 0, 'tax_rate': 0.11, 'tax_amount_minor': 0, 'total_minor': 0,
+            }
+            for n in range(first, min(first + BATCH, invoices))
+        ])
+    for first in range(0, items, BATCH):
+        db.session.execute(insert(InvoiceItem.__table__), [
+            {
+                'invoice_id': n // per_invoice + 1, 'position': n % per_invoice, 'description': f'Line {n}',
+                'quantity': 1.0, 'rate_minor': 1025, 'amount_minor': 1025,
+            }
+            for n in range(first, min(first + BATCH, items))
+        ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--items-per-invoice', type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = make_workdir('export')
+    app = make_bench_app(workdir)
+    with app.app_context():
+        seed(args.items, args.items_per_invoice)
+
+    client = app.test_client()
+
+    def download(kind, file_format):
+        start = time.perf_counter()
+        response = client.get(f'/invoices/export?kind={kind}&format={file_format}', buffered=False)
+        chunks = iter(response.response)
+        size = len(next(chunks))
+        first_chunk = time.perf_counter() - start
+        for chunk in chunks:
+            size += len(chunk)
+        response.close()
+        return first_chunk, time.perf_counter() - start, size
+
+    results = []
+    for kind in ('invoices', 'items'):
+        for file_format in ('csv', 'jsonl'):
+            first_chunk, elapsed, size = download(kind, file_format)
+            # Memory is measured on a second download since tracing slows
+            # everything down
+            tracemalloc.start()
+            download(kind, file_format)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({
+                'export': f'{kind}.{file_format}',
+                'first_chunk_seconds': round(first_chunk, 3),
+                'seconds': round(elapsed, 2),
+                'megabytes': round(size / 1e6, 1),
+                'peak_python_mb': round(peak / 1e6, 1),
+            })
+
+    with app.app_context():
+        db.engine.dispose()
+
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
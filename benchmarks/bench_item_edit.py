@@ -0,0 +1,150 @@
+"""Benchmark and check diff-based line item edits on a large invoice.
+
+Creates an invoice with many lines through the invoice form, then submits
+edits that change the notes only, change a few rates, reverse the order of
+the lines and replace a few lines. For each edit it counts the item rows
+inserted, updated and deleted and checks that item ids survive, the lines
+come back in the submitted order and the totals match the items, both
+as computed in Python and by the SQL that `flask recompute-totals --check`
+runs. One edit turns the invoice into a credit note with a negative
+subtotal. The last edit leaves out the item ids, which makes every line
+new and shows the cost of the old delete-and-reinsert behaviour.
+
+Usage:
+    python benchmarks/bench_item_edit.py [--lines 1000]
+"""
+import argparse
+import time
+
+from _common import make_bench_app, make_workdir, print_report
+
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import Client, Invoice, InvoiceItem
+from app.money import line_amount_minor, tax_minor
+from app.services.totals_service import find_drifted_invoices
+
+
+def form_data(notes, rows, with_ids=True):
+    data = {
+        'invoice_number': 'BENCH-0001',
+        'client_id': '1',
+        'issue_date': '2026-01-01',
+        'due_date': '2026-01-31',
+        'currency': 'USD',
+        'tax_rate': '11',
+        'notes': notes,
+        'description[]': [row['description'] for row in rows],
+        'quantity[]': [row['quantity'] for row in rows],
+        'rate[]': [row['rate'] for row in rows],
+    }
+    if with_ids:
+        data['item_id[]'] = [str(row['id'] or '') for row in rows]
+    return data
+
+
+def current_rows(app):
+    with app.app_context():
+        invoice = db.session.get(Invoice, 1)
+        return [
+            {'id': item.id, 'description': item.description, 'quantity': str(item.quantity), 'rate': str(item.rate)}
+            for item in invoice.items
+        ]
+
+
+def check_invoice(app, rows):
+    with app.app_context():
+        invoice = db.session.get(Invoice, 1)
+        items = list(invoice.items)
+        assert [item.description for item in items] == [row['description'] for row in rows], 'lines out of order'
+        positions = [item.position for item in items]
+        assert positions == sorted(set(positions)), 'positions do not increase'
+        for item, row in zip(items, rows):
+            if row['id']:
+                assert item.id == row['id'], 'existing line was recreated'
+            assert item.amount_minor == line_amount_minor(item.quantity, item.rate_minor)
+        subtotal = sum(item.amount_minor for item in items)
+        assert invoice.subtotal_minor == subtotal, 'subtotal does not match items'
+        assert invoice.total_minor == subtotal + tax_minor(subtotal, invoice.tax_rate), 'total does not match items'
+        assert not find_drifted_invoices(), 'SQL totals disagree with the stored ones'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = make_workdir('items')
+    app = make_bench_app(workdir)
+    with app.app_context():
+        db.session.add(Client(name='Benchmark Client'))
+        db.session.commit()
+
+    counts = {}
+
+    def counter(key):
+        def count(mapper, connection, target):
+            if key != 'updated' or db.session.is_modified(target, include_collections=False):
+                counts[key] = counts.get(key, 0) + 1
+        return count
+
+    event.listen(InvoiceItem, 'after_insert', counter('inserted'))
+    event.listen(InvoiceItem, 'after_update', counter('updated'))
+    event.listen(InvoiceItem, 'after_delete', counter('deleted'))
+
+    client = app.test_client()
+
+    def submit(name, path, notes, rows, with_ids=True):
+        counts.clear()
+        start = time.perf_counter()
+        response = client.post(path, data=form_data(notes, rows, with_ids))
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 302, f'{name}: form was not accepted'
+        check_invoice(app, rows if with_ids else [dict(row, id=None) for row in rows])
+        return {
+            'edit': name,
+            'seconds': round(elapsed, 3),
+            'inserted': counts.get('inserted', 0),
+            'updated': counts.get('updated', 0),
+            'deleted': counts.get('deleted', 0),
+        }
+
+    rows = [
+        {'id': None, 'description': f'Line {n}', 'quantity': '1.5', 'rate': f'{n % 97 + 1}.25'}
+        for n in range(args.lines)
+    ]
+    results = [submit('create', '/invoices/new', '', rows)]
+
+    rows = current_rows(app)
+    results.append(submit('notes only', '/invoices/1/edit', 'Updated notes', rows))
+
+    for row in rows[::100]:
+        row['rate'] = '999.99'
+    results.append(submit('change every 100th rate', '/invoices/1/edit', 'Updated notes', rows))
+
+    rows.reverse()
+    results.append(submit('reverse order', '/invoices/1/edit', 'Updated notes', rows))
+
+    rows = rows[5:] + [{'id': None, 'description': f'Extra {n}', 'quantity': '2', 'rate': '10'} for n in range(5)]
+    results.append(submit('replace 5 lines', '/invoices/1/edit', 'Updated notes', rows))
+
+    # -10.01 at 11% is -1.1011 of tax: -1.10 rounding away from zero, but
+    # -1.09 if the negative value is truncated toward zero
+    rows = current_rows(app)[:2]
+    rows[0].update(quantity='1', rate='-20.01')
+    rows[1].update(quantity='1', rate='10.00')
+    results.append(submit('credit note', '/invoices/1/edit', 'Credit note', rows))
+
+    rows = current_rows(app)
+    results.append(submit('without item ids', '/invoices/1/edit', 'Updated notes', rows, with_ids=False))
+
+    with app.app_context():
+        assert InvoiceItem.query.count() == len(rows)
+        db.engine.dispose()
+
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
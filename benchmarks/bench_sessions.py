@@ -0,0 +1,114 @@
+"""Compare the per-request cost of the session backends.
+
+For each SESSION_TYPE (filesystem, database, cookie) an app is created on
+its own temporary database. Each of ``--clients`` test clients sets a
+language to start its session. The script then times requests that only
+read the session and requests that change it, and reports the mean, p50
+and p95 in microseconds. For the database backend the store is first
+filled with ``--stored`` other sessions, half of them expired, and the
+time to purge the expired ones is reported too.
+
+Usage:
+    python benchmarks/bench_sessions.py [--requests 2000] [--clients 20] [--stored 50000]
+"""
+import argparse
+import secrets
+import time
+from datetime import datetime, timedelta
+
+from _common import make_bench_app, make_workdir, print_report
+
+BACKENDS = ('filesystem', 'database', 'cookie')
+
+
+def make_app(workdir, backend):
+    from flask import session
+
+    app = make_bench_app(workdir, SESSION_TYPE=backend, SQL_INSTRUMENTATION=False, METRICS_ENABLED=False)
+
+    @app.route('/bench/session/read')
+    def bench_read():
+        return session.get('language', '')
+
+    @app.route('/bench/session/write')
+    def bench_write():
+        session['counter'] = session.get('counter', 0) + 1
+        return ''
+
+    return app
+
+
+def fill_store(count):
+    """Insert ``count`` sessions, every other one already expired"""
+    from app.extensions import db
+    from app.models import UserSession
+
+    now = datetime.utcnow()
+    rows = [{
+        'id': f'session:{secrets.token_urlsafe(32)}', 'data': b'\x81\xa8language\xa2en',
+        'expiry': now + timedelta(days=n % 31 + 1) if n % 2 else now - timedelta(minutes=n % 1440 + 1),
+    } for n in range(count)]
+    with db.engine.begin() as connection:
+        connection.execute(UserSession.__table__.insert(), rows)
+
+
+def timed(clients, path, requests):
+    latencies = []
+    for n in range(requests):
+        client = clients[n % len(clients)]
+        start = time.perf_counter()
+        response = client.get(path)
+        response.close()
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return {
+        'mean_us': round(sum(latencies) / len(latencies), 1),
+        'p50_us': round(latencies[len(latencies) // 2], 1),
+        'p95_us': round(latencies[int(len(latencies) * 0.95)], 1),
+    }
+
+
+def bench_backend(backend, args):
+    from app.extensions import db
+    from app.services.session_store import purge_expired_sessions
+
+    app = make_app(make_workdir(f'sessions_{backend}'), backend)
+    if backend == 'database':
+        with app.app_context():
+            fill_store(args.stored)
+
+    clients = [app.test_client() for _ in range(args.clients)]
+    for client in clients:
+        client.get('/set_language/en').close()
+    # Warm up connections, templates and the page cache
+    timed(clients, '/bench/session/read', len(clients))
+
+    result = {
+        'read': timed(clients, '/bench/session/read', args.requests),
+        'write': timed(clients, '/bench/session/write', args.requests),
+        'cookie_bytes': max(len(client.get_cookie('session').value) for client in clients),
+    }
+    if backend == 'database':
+        with app.app_context():
+            start = time.perf_counter()
+            purged = purge_expired_sessions()
+            result['purge'] = {'stored': args.stored, 'purged': purged,
+                               'ms': round((time.perf_counter() - start) * 1000, 2)}
+            db.engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='Timed requests per backend and kind')
+    parser.add_argument('--clients', type=int, default=20, help='Distinct sessions the requests rotate over')
+    parser.add_argument('--stored', type=int, default=50000, help='Other sessions in the database store')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='Comma separated session types')
+    args = parser.parse_args()
+
+    report = {backend: bench_backend(backend, args) for backend in args.backends.split(',')}
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
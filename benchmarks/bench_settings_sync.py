@@ -0,0 +1,101 @@
+"""Check that settings saved in one worker reach the other workers.
+
+Starts several worker processes, each with its own app on a shared
+database, as gunicorn would. Each worker keeps serving requests. The
+parent then saves new business and email settings through the settings
+pages. The script reports how long each worker took to pick up both the
+new business name and the reinitialised mail server, and how long the
+per-request version check takes, and exits with an error if any worker
+never picked up the new settings.
+
+Usage:
+    python benchmarks/bench_settings_sync.py [--workers 4] [--check-interval 0.5]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from _common import make_bench_app, make_workdir, print_report
+
+NEW_NAME = 'Renamed Business Ltd'
+NEW_MAIL_SERVER = 'smtp.renamed.example'
+
+
+def worker(workdir, check_interval, ready, written_at, results):
+    app = make_bench_app(workdir, create_tables=False, SETTINGS_CHECK_INTERVAL=check_interval)
+    client = app.test_client()
+    client.get('/api/v1/clients?limit=1').close()
+    ready.wait()
+    requests = 0
+    while True:
+        client.get('/api/v1/clients?limit=1').close()
+        requests += 1
+        if app.config['BUSINESS_NAME'] == NEW_NAME and app.extensions['mail'].server == NEW_MAIL_SERVER:
+            break
+        if time.time() - written_at.value > 30 and written_at.value:
+            results.put({'pid': os.getpid(), 'converged': False, 'requests': requests})
+            return
+    results.put({
+        'pid': os.getpid(), 'converged': True, 'requests': requests,
+        'ms_after_write': round((time.time() - written_at.value) * 1000, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--check-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    workdir = make_workdir('settings')
+    app = make_bench_app(workdir, SETTINGS_CHECK_INTERVAL=args.check_interval)
+    from app.extensions import db
+    from app.services.settings_service import reload_settings, settings_version
+    with app.app_context():
+        reload_settings(app)
+
+    context = multiprocessing.get_context('spawn')
+    ready = context.Barrier(args.workers + 1)
+    written_at = context.Value('d', 0.0)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(workdir, args.check_interval, ready, written_at, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    # Every worker has loaded the old settings and is serving requests
+    ready.wait()
+    time.sleep(0.5)
+
+    client = app.test_client()
+    written_at.value = time.time()
+    client.post('/settings/business', data={
+        'business_name': NEW_NAME, 'business_email': 'billing@renamed.example',
+        'business_address': '1 New Street', 'tax_rate': '10', 'default_currency': 'USD',
+    })
+    client.post('/settings/email', data={'mail_server': NEW_MAIL_SERVER, 'mail_port': '587'})
+
+    outcomes = sorted((results.get(timeout=60) for _ in processes), key=lambda outcome: outcome['pid'])
+    for process in processes:
+        process.join()
+
+    with app.test_request_context():
+        start = time.perf_counter()
+        for _ in range(1000):
+            settings_version()
+        check_us = (time.perf_counter() - start) / 1000 * 1e6
+        db.engine.dispose()
+
+    stale = [outcome['pid'] for outcome in outcomes if not outcome['converged']]
+    print_report({
+        'workers': outcomes,
+        'all_converged': not stale,
+        'check_interval_s': args.check_interval,
+        'version_check_us': round(check_us, 1),
+    })
+    if stale:
+        raise SystemExit(f"Workers {', '.join(map(str, stale))} never picked up the new settings")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Concurrent read/write benchmark for the SQLite pragma profile.
+
+Runs the same mixed workload twice against a scratch database: once with
+SQLite's defaults (rollback journal, no busy timeout) and once with the
+SQLITE_PRAGMAS profile from config.Config. Writer threads insert invoices
+while reader threads run the dashboard's aggregate queries.
+
+Usage:
+    python benchmarks/bench_sqlite_pragmas.py [--seconds 10] [--readers 4] [--writers 2]
+"""
+import argparse
+import threading
+import time
+from datetime import date, timedelta
+
+from _common import make_bench_app, make_workdir, print_report
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from app.extensions import db
+from app.models import Client, Invoice
+
+
+def run_profile(name, pragmas, seconds, readers, writers):
+    workdir = make_workdir('pragmas')
+    app = make_bench_app(workdir, SQLITE_PRAGMAS=pragmas)
+    with app.app_context():
+        client = Client(name='Benchmark Client')
+        db.session.add(client)
+        db.session.commit()
+        client_id = client.id
+
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(worker):
+        sequence = 0
+        with app.app_context():
+            while not stop.is_set():
+                sequence += 1
+                try:
+                    db.session.add(Invoice(
+                        invoice_number=f"BENCH-{worker}-{sequence}",
+                        client_id=client_id,
+                        issue_date=date.today(),
+                        due_date=date.today() + timedelta(days=30),
+                        status='unpaid'
+                    ))
+                    db.session.commit()
+                    count('writes')
+                except OperationalError:
+                    db.session.rollback()
+                    count('locked')
+
+    def reader():
+        with app.app_context():
+            while not stop.is_set():
+                try:
+                    db.session.query(func.count(Invoice.id)).scalar()
+                    db.session.query(func.sum(Invoice.total_minor)).filter(Invoice.status == 'unpaid').scalar()
+                    db.session.commit()
+                    count('reads')
+                except OperationalError:
+                    db.session.rollback()
+                    count('locked')
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        db.engine.dispose()
+
+    return {
+        'profile': name,
+        'reads_per_sec': round(counts['reads'] / seconds, 1),
+        'writes_per_sec': round(counts['writes'] / seconds, 1),
+        'locked_errors': counts['locked'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    args = parser.parse_args()
+
+    results = [
+        run_profile('default', {}, args.seconds, args.readers, args.writers),
+        run_profile('tuned', Config.SQLITE_PRAGMAS, args.seconds, args.readers, args.writers),
+    ]
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Load test the main pages and report throughput and latency per route.
+
+By default a temporary database is filled with ``seed_bench_data`` (the
+same data as ``flask seed-bench``) and the app is driven in-process
+through the Flask test client, one client per thread. With ``--url`` the
+requests go over HTTP to a running server instead (for example gunicorn
+on a database prepared with ``flask seed-bench``); ids to request are then
+read from its /api/v1 endpoints.
+
+Every route gets ``--requests`` requests at each concurrency level. The
+report gives, per level and route, the throughput and the p50/p95/p99
+latency in milliseconds, plus the time ``generate-recurring`` takes on
+the generated data when running in-process.
+
+Usage:
+    python benchmarks/load_test.py [--clients 500] [--invoices 10000] [--recurring 200]
+        [--seed 0] [--concurrency 1,4,16] [--requests 50] [--url http://127.0.0.1:8000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import ROOT, make_bench_app, make_workdir, print_report
+
+# Route name -> URL, with {client} and {invoice} filled in per request
+ROUTES = {
+    'dashboard.index': '/',
+    'invoices.index': '/invoices/',
+    'invoices.view': '/invoices/{invoice}',
+    'clients.index': '/clients/',
+    'clients.view': '/clients/{client}',
+    'api.invoices': '/api/v1/invoices?include=items&limit=100',
+}
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def get(self, path):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.get(path)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    def json(self, path):
+        return self.app.test_client().get(path).get_json()
+
+
+class HttpDriver:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.base_url + path, timeout=120) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def json(self, path):
+        with urllib.request.urlopen(self.base_url + path, timeout=120) as response:
+            return json.load(response)
+
+
+def sample_ids(driver, resource, count=1000):
+    page = driver.json(f'/api/v1/{resource}?fields=id&limit={count}')
+    return [row['id'] for row in page['data']]
+
+
+def run_level(driver, concurrency, requests, ids, rng):
+    results = {}
+    for route, template in ROUTES.items():
+        paths = [template.format(client=rng.choice(ids['clients']), invoice=rng.choice(ids['invoices']))
+                 for _ in range(requests)]
+
+        def timed(path):
+            start = time.perf_counter()
+            status = driver.get(path)
+            return time.perf_counter() - start, status
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed, paths))
+        wall = time.perf_counter() - start
+
+        latencies = sorted(elapsed * 1000 for elapsed, status in outcomes)
+        results[route] = {
+            'requests': requests,
+            'errors': sum(1 for elapsed, status in outcomes if status >= 400),
+            'throughput_rps': round(requests / wall, 2),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+        }
+    return results
+
+
+def time_generate_recurring(database_uri):
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=database_uri)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'generate-recurring'],
+                               cwd=ROOT, env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    generated = sum(1 for line in completed.stdout.splitlines() if line.startswith('Generated invoice'))
+    return {'seconds': round(seconds, 3), 'generated': generated, 'returncode': completed.returncode}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--invoices', type=int, default=10000)
+    parser.add_argument('--recurring', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma separated thread counts')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per route and level')
+    parser.add_argument('--url', help='Base URL of a running server to load instead of the test client')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    report = {}
+    database_uri = None
+    if args.url:
+        driver = HttpDriver(args.url)
+        report['target'] = args.url
+    else:
+        from app.services.seed_service import seed_bench_data
+
+        report['target'] = 'test client'
+        app = make_bench_app(make_workdir('load'))
+        database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+        with app.app_context():
+            start = time.perf_counter()
+            seeded, error = seed_bench_data(args.clients, args.invoices, args.recurring, args.seed)
+            if error:
+                parser.error(error)
+            report['seed'] = dict(seeded, seconds=round(time.perf_counter() - start, 3))
+        driver = TestClientDriver(app)
+
+    ids = {'clients': sample_ids(driver, 'clients'), 'invoices': sample_ids(driver, 'invoices')}
+    rng = random.Random(args.seed)
+    report['concurrency'] = {}
+    for level in levels:
+        report['concurrency'][str(level)] = run_level(driver, level, args.requests, ids, rng)
+
+    if database_uri:
+        report['generate_recurring'] = time_generate_recurring(database_uri)
+
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
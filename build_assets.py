@@ -0,0 +1,171 @@
+"""Build the bundled stylesheet served from app/static/dist.
+
+Compiles the Tailwind classes used in app/templates, adds the Font Awesome
+icons the templates use (as inline SVG masks, so no font files are needed)
+and app/static/css/base.css, and writes the result as
+app/static/dist/app.<content hash>.css. The manifest next to it maps
+css/app.css to that file for the asset_url() template helper. Pages load
+the CDN versions until this has been run.
+
+Needs Node.js: the tools pinned in assets/package.json are installed into
+assets/node_modules on the first run, which also writes
+assets/package-lock.json.
+
+Usage:
+    python build_assets.py
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from urllib.parse import quote
+
+from app.services.assets import DIST_DIR, MANIFEST_NAME
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(ROOT, 'assets')
+NODE_MODULES = os.path.join(ASSETS_DIR, 'node_modules')
+FONTAWESOME_DIR = os.path.join(NODE_MODULES, '@fortawesome', 'fontawesome-free')
+STATIC_DIR = os.path.join(ROOT, 'app', 'static')
+TEMPLATES_DIR = os.path.join(ROOT, 'app', 'templates')
+BASE_CSS = os.path.join(STATIC_DIR, 'css', 'base.css')
+
+# Icon style classes and the Font Awesome SVG folder each one draws from
+ICON_STYLES = {'fas': 'solid', 'fa-solid': 'solid', 'far': 'regular', 'fa-regular': 'regular',
+               'fab': 'brands', 'fa-brands': 'brands'}
+
+# Font Awesome helper classes that are not icons
+ICON_MODIFIERS = {
+    'fa-xs': 'font-size:.75em;line-height:.0833em;vertical-align:.125em',
+    'fa-sm': 'font-size:.875em;line-height:.0714em;vertical-align:.0536em',
+    'fa-lg': 'font-size:1.25em;line-height:.05em;vertical-align:-.075em',
+    'fa-xl': 'font-size:1.5em;line-height:.0417em;vertical-align:-.125em',
+    **{f'fa-{size}x': f'font-size:{size}em' for size in range(1, 11)},
+    'fa-fw': 'text-align:center;width:1.25em !important',
+    'fa-spin': 'animation:fa-spin 2s linear infinite',
+}
+
+ICON_BASE_CSS = """%(selectors)s{display:inline-block;height:1em;vertical-align:-.125em;\
+background-color:currentColor;-webkit-mask:center/contain no-repeat;mask:center/contain no-repeat}
+@keyframes fa-spin{0%%{transform:rotate(0deg)}100%%{transform:rotate(360deg)}}
+"""
+
+
+def run(command, **kwargs):
+    print('$ ' + ' '.join(command))
+    subprocess.run(command, check=True, cwd=kwargs.pop('cwd', ROOT), **kwargs)
+
+
+def install_tools():
+    if not os.path.isdir(NODE_MODULES):
+        npm = 'npm.cmd' if sys.platform == 'win32' else 'npm'
+        run([npm, 'install', '--no-audit', '--no-fund'], cwd=ASSETS_DIR)
+
+
+def compile_tailwind():
+    """Tailwind utilities for the classes found in the templates"""
+    cli = os.path.join(NODE_MODULES, '.bin', 'tailwindcss.cmd' if sys.platform == 'win32' else 'tailwindcss')
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, 'tailwind.css')
+        run([cli, '--config', os.path.join(ASSETS_DIR, 'tailwind.config.js'),
+             '--input', os.path.join(ASSETS_DIR, 'tailwind.css'), '--output', output, '--minify'])
+        with open(output, encoding='utf-8') as f:
+            return f.read()
+
+
+def template_icon_classes():
+    """Every fa-* class named in the templates, scripts included"""
+    names = set()
+    for path in glob.glob(os.path.join(TEMPLATES_DIR, '**', '*.html'), recursive=True):
+        with open(path, encoding='utf-8') as f:
+            names.update(re.findall(r'(?<![\w-])(fa[srb]|fa-[a-z0-9-]+)(?![\w-])', f.read()))
+    return names
+
+
+def icon_aliases():
+    """Each icon name -> all names of that icon, so Font Awesome 5 names find their SVG"""
+    with open(os.path.join(FONTAWESOME_DIR, 'css', 'fontawesome.css'), encoding='utf-8') as f:
+        rules = re.findall(r'\.fa-([a-z0-9-]+)(?:::before)?\s*\{\s*(?:content|--fa)\s*:\s*"\\([0-9a-f]+)"', f.read())
+    by_codepoint = {}
+    for name, codepoint in rules:
+        by_codepoint.setdefault(codepoint, []).append(name)
+    return {name: names for names in by_codepoint.values() for name in names}
+
+
+def icon_svg(style, name, aliases):
+    for candidate in [name] + aliases.get(name, []):
+        path = os.path.join(FONTAWESOME_DIR, 'svgs', style, f'{candidate}.svg')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return re.sub(r'<!--.*?-->', '', f.read()).strip()
+    return None
+
+
+def build_icons():
+    """CSS drawing the icons the templates use, each as an SVG mask"""
+    classes = template_icon_classes()
+    styles = sorted({ICON_STYLES[name] for name in classes if name in ICON_STYLES}) or ['solid']
+    style_classes = {style: [name for name, folder in ICON_STYLES.items() if folder == style] for style in styles}
+    aliases = icon_aliases()
+    with open(os.path.join(FONTAWESOME_DIR, 'package.json'), encoding='utf-8') as f:
+        version = json.load(f)['version']
+
+    rules = [f'/* Font Awesome Free {version} by @fontawesome - https://fontawesome.com '
+             f'License - https://fontawesome.com/license/free (Icons: CC BY 4.0) */\n',
+             ICON_BASE_CSS % {'selectors': ','.join('.' + name for names in style_classes.values() for name in names)}]
+    missing = []
+    for name in sorted(classes - set(ICON_STYLES)):
+        if name in ICON_MODIFIERS:
+            rules.append(f'.{name}{{{ICON_MODIFIERS[name]}}}\n')
+            continue
+        found = False
+        for style in styles:
+            svg = icon_svg(style, name[len('fa-'):], aliases)
+            if svg is None:
+                continue
+            found = True
+            width, height = (float(n) for n in re.search(r'viewBox="0 0 ([\d.]+) ([\d.]+)"', svg).groups())
+            image = f'url("data:image/svg+xml,{quote(svg, safe=" /:=,")}")'
+            selectors = ','.join(f'.{style_class}.{name}' for style_class in style_classes[style])
+            rules.append(f'{selectors}{{width:{width / height:.4g}em;-webkit-mask-image:{image};mask-image:{image}}}\n')
+        if not found:
+            missing.append(name)
+    if missing:
+        raise SystemExit(f"No Font Awesome icon found for: {', '.join(missing)}")
+    return ''.join(rules)
+
+
+def write_fingerprinted(name, content):
+    """Write content as dist/<stem>.<hash><ext>, removing older builds"""
+    dist_dir = os.path.join(STATIC_DIR, DIST_DIR)
+    os.makedirs(dist_dir, exist_ok=True)
+    stem, extension = os.path.splitext(os.path.basename(name))
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+    filename = f'{stem}.{digest}{extension}'
+    for old in glob.glob(os.path.join(dist_dir, f'{stem}.*{extension}')):
+        if os.path.basename(old) != filename:
+            os.remove(old)
+    with open(os.path.join(dist_dir, filename), 'w', encoding='utf-8') as f:
+        f.write(content)
+    return f'{DIST_DIR}/{filename}'
+
+
+def build_assets():
+    install_tools()
+    with open(BASE_CSS, encoding='utf-8') as f:
+        base = f.read()
+    stylesheet = compile_tailwind() + '\n' + build_icons() + base
+
+    manifest = {'css/app.css': write_fingerprinted('css/app.css', stylesheet)}
+    with open(os.path.join(STATIC_DIR, DIST_DIR, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    for name, filename in manifest.items():
+        print(f'{name} -> {filename} ({os.path.getsize(os.path.join(STATIC_DIR, filename))} bytes)')
+
+
+if __name__ == '__main__':
+    build_assets()
@@ -1,6 +1,7 @@
 import PyInstaller.__main__
 import os
 import sys
+from build_assets import build_assets
 
 def build():
     # Application name
@@ -52,6 +53,10 @@ def build():
     for item in add_data:
         args.append(f"--add-data={item}")
 
+    # The desktop app must work offline, so it ships the bundled CSS
+    # instead of loading Tailwind and the icons from a CDN
+    build_assets()
+
     print(f"Building {app_name} desktop application...")
     PyInstaller.__main__.run(args)
     
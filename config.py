@@ -1,10 +1,46 @@
 import os
 
+
+def database_uri_from_env():
+    """Read the database URI from the environment, defaulting to SQLite."""
+    uri = os.environ.get('SQLALCHEMY_DATABASE_URI') or os.environ.get('DATABASE_URL') or 'sqlite:///chrisnov_invoice.db'
+    # Some hosts still hand out the postgres:// scheme SQLAlchemy dropped
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///chrisnov_invoice.db'
+    SQLALCHEMY_DATABASE_URI = database_uri_from_env()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', -1)),
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', False),
+    }
+
+    # Pragmas applied to every new SQLite connection, in this order.
+    # busy_timeout comes first so switching journal_mode waits for locks.
+    SQLITE_PRAGMAS = {
+        'busy_timeout': 5000,           # ms to wait on a locked database
+        'journal_mode': 'WAL',          # readers and the writer don't block each other
+        'synchronous': 'NORMAL',        # safe with WAL, fsync only at checkpoints
+        'cache_size': -20000,           # negative = KiB, so ~20 MB page cache
+        'mmap_size': 268435456,         # 256 MB memory-mapped reads
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    }
 
     # File Uploads
     UPLOAD_FOLDER = 'app/static/images'
@@ -20,6 +56,53 @@ class Config:
     # Invoice Settings
     TAX_RATE = 0.11  # 11% tax
     DEFAULT_CURRENCY = "IDR"
+    CLIENT_INVOICES_PER_PAGE = 20
+
+    # Archive: paid and cancelled invoices issued more than this many days
+    # ago are moved to the archive tables by `flask archive-invoices`
+    ARCHIVE_AFTER_DAYS = 365
+    ARCHIVE_BATCH_SIZE = 500
+    ARCHIVED_INVOICES_PER_PAGE = 50
+
+    # Rows validated and inserted per transaction by CSV imports
+    IMPORT_BATCH_SIZE = 5000
+    # Rows fetched per round trip by streaming exports
+    EXPORT_YIELD_PER = 1000
+
+    # JSON API (/api/v1) page sizes
+    API_PAGE_SIZE = 100
+    API_MAX_PAGE_SIZE = 1000
+
+    # Per-request SQL statistics (see app.services.sql_instrumentation).
+    # Summaries are served as JSON at /debug/sql.
+    SQL_INSTRUMENTATION = env_flag('SQL_INSTRUMENTATION', True)
+    SQL_SLOW_QUERY_MS = int(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+    SQL_N_PLUS_ONE_THRESHOLD = 5        # identical statements in one request
+    SQL_STATS_HISTORY = 200             # recent requests kept per worker
+    SQL_STATS_HEADER = env_flag('SQL_STATS_HEADER', False)
+    SQL_DEBUG_FOOTER = env_flag('SQL_DEBUG_FOOTER', False)
+
+    # Prometheus metrics at /metrics (see app.services.metrics). Under
+    # gunicorn, point METRICS_MULTIPROC_DIR at a directory shared by the
+    # workers and emptied on every server start, so a scrape of any worker
+    # covers them all.
+    METRICS_ENABLED = env_flag('METRICS_ENABLED', True)
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR') or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    METRICS_FLUSH_INTERVAL = 1.0        # seconds between writes of a worker's values
+
+    # Request profiling (see app.services.profiler): every request, a random
+    # share of them, or those sending a token from `flask profile-token` in
+    # the header. Profiles go to PROFILING_DIR (defaults to instance/profiles).
+    PROFILING_ENABLED = env_flag('PROFILING_ENABLED', False)
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+    PROFILING_HEADER = 'X-Profile'
+    PROFILING_TOKEN_MAX_AGE = 3600
+    PROFILING_DIR = os.environ.get('PROFILING_DIR')
+    PROFILING_MAX_FILES = 50
+
+    # Seconds between checks of the settings version, after which a worker
+    # reloads settings saved by another one (0 checks on every request)
+    SETTINGS_CHECK_INTERVAL = 2.0
 
     # Supported Currencies
     SUPPORTED_CURRENCIES = {
@@ -28,11 +111,46 @@ class Config:
         'EUR': {'name': 'Euro', 'symbol': '€', 'position': 'before'}
     }
 
-    # Session Configuration
-    SESSION_TYPE = 'filesystem'
+    # Cache-Control header per endpoint. Invoice and client pages answer
+    # If-None-Match/If-Modified-Since with 304 before rendering, so
+    # 'no-cache' (revalidate every time) costs one lookup per visit.
+    CACHE_CONTROL = {
+        'invoices.view': 'private, no-cache',
+        'invoices.download': 'private, no-cache',
+        'clients.view': 'private, no-cache',
+    }
+
+    # Browser cache lifetime, in seconds, of the fingerprinted files that
+    # build_assets.py writes to app/static/dist
+    ASSET_MAX_AGE = 365 * 24 * 3600
+
+    # Response compression (see app.services.compression): brotli when the
+    # brotli package is installed, gzip otherwise
+    COMPRESSION_ENABLED = env_flag('COMPRESSION_ENABLED', True)
+    COMPRESSION_MIN_SIZE = 1024         # bytes; smaller responses go out as they are
+    COMPRESSION_LEVEL = 6               # gzip, 1-9
+    COMPRESSION_BROTLI_QUALITY = 4      # brotli, 0-11
+    COMPRESSION_FLUSH_SIZE = 64 * 1024  # input bytes between flushes of a streamed response
+    COMPRESSION_MIMETYPES = (
+        'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'application/javascript',
+        'application/json', 'application/x-ndjson', 'application/xml', 'image/svg+xml',
+    )
+
+    # Session Configuration (see app.services.session_store):
+    # 'filesystem' keeps sessions in files under SESSION_FILE_DIR,
+    # 'database' in the user_sessions table shared by every worker and
+    # node, 'cookie' in the signed session cookie itself (no storage at all;
+    # used by the desktop build)
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'filesystem')
     SESSION_FILE_DIR = 'sessions'
     SESSION_PERMANENT = True
     SESSION_USE_SIGNER = True
+    # Database sessions: an unchanged session's expiry is only rewritten
+    # once it is this many seconds old, and each worker deletes expired
+    # rows at most every SESSION_PURGE_INTERVAL seconds (0 leaves purging
+    # to `flask purge-sessions`)
+    SESSION_EXPIRY_REFRESH_SECONDS = 3600
+    SESSION_PURGE_INTERVAL = int(os.environ.get('SESSION_PURGE_INTERVAL', 3600))
 
     # Email Settings (for local email sending)
     MAIL_SERVER = 'localhost'
@@ -42,3 +160,30 @@ class Config:
     MAIL_USERNAME = None
     MAIL_PASSWORD = None
     MAIL_DEFAULT_SENDER = "noreply@chrisnov-invoice.local"
+
+    # Backups (sqlite3 online backup API)
+    BACKUP_PAGES_PER_STEP = 256
+    BACKUP_STEP_SLEEP = 0.005
+    BACKUP_BUSY_TIMEOUT = 30
+    BACKUP_MAX_RESTARTS = 5
+    BACKUP_STREAM_CHUNK_SIZE = 64 * 1024
+
+    # Incremental backups: pages per stored chunk and how many to keep
+    BACKUP_CHUNK_PAGES = 16
+    BACKUP_COMPRESSION_LEVEL = 6
+    BACKUP_RETENTION = {'hourly': 24, 'daily': 7, 'weekly': 4}
+
+    # Scheduled backups: interval in minutes (0 disables), number of backups
+    # to keep and target directory (defaults to instance/backups/scheduled)
+    BACKUP_SCHEDULER_ENABLED = True
+    BACKUP_SCHEDULE_INTERVAL = 0
+    BACKUP_SCHEDULE_RETENTION = 14
+    BACKUP_SCHEDULE_DIR = None
+    BACKUP_SCHEDULE_POLL_SECONDS = 60
+
+
+class DesktopConfig(Config):
+    """Single-user desktop build: sessions live in the signed cookie, and
+    responses to the local browser are not compressed"""
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'cookie')
+    COMPRESSION_ENABLED = env_flag('COMPRESSION_ENABLED', False)
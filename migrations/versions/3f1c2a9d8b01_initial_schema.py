@@ -0,0 +1,127 @@
+"""initial schema
+
+Revision ID: 3f1c2a9d8b01
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+Databases created with `flask init-db` before migrations existed already
+have these tables, so each one is only created when it is missing. Such a
+database can be brought up to date with `flask db upgrade` directly.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8b01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'clients' not in existing:
+        op.create_table('clients',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=200), nullable=False),
+            sa.Column('email', sa.String(length=200), nullable=True),
+            sa.Column('phone', sa.String(length=50), nullable=True),
+            sa.Column('address', sa.Text(), nullable=True),
+            sa.Column('company', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'currencies' not in existing:
+        op.create_table('currencies',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('code', sa.String(length=3), nullable=False),
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('symbol', sa.String(length=5), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('code')
+        )
+
+    if 'settings' not in existing:
+        op.create_table('settings',
+            sa.Column('key', sa.String(length=50), nullable=False),
+            sa.Column('value', sa.String(length=500), nullable=True),
+            sa.PrimaryKeyConstraint('key')
+        )
+
+    if 'invoices' not in existing:
+        op.create_table('invoices',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('invoice_number', sa.String(length=50), nullable=False),
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('issue_date', sa.Date(), nullable=False),
+            sa.Column('due_date', sa.Date(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('currency', sa.String(length=3), nullable=True),
+            sa.Column('subtotal', sa.Float(), nullable=True),
+            sa.Column('tax_rate', sa.Float(), nullable=True),
+            sa.Column('tax_amount', sa.Float(), nullable=True),
+            sa.Column('total', sa.Float(), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('invoice_number')
+        )
+
+    if 'recurring_invoices' not in existing:
+        op.create_table('recurring_invoices',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('frequency', sa.String(length=20), nullable=False),
+            sa.Column('interval', sa.Integer(), nullable=False),
+            sa.Column('start_date', sa.Date(), nullable=False),
+            sa.Column('end_date', sa.Date(), nullable=True),
+            sa.Column('next_due_date', sa.Date(), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('currency', sa.String(length=3), nullable=True),
+            sa.Column('tax_rate', sa.Float(), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'invoice_items' not in existing:
+        op.create_table('invoice_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('invoice_id', sa.Integer(), nullable=False),
+            sa.Column('description', sa.String(length=500), nullable=False),
+            sa.Column('quantity', sa.Float(), nullable=True),
+            sa.Column('rate', sa.Float(), nullable=False),
+            sa.Column('amount', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['invoice_id'], ['invoices.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'recurring_invoice_items' not in existing:
+        op.create_table('recurring_invoice_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('recurring_invoice_id', sa.Integer(), nullable=False),
+            sa.Column('description', sa.String(length=500), nullable=False),
+            sa.Column('quantity', sa.Float(), nullable=True),
+            sa.Column('rate', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['recurring_invoice_id'], ['recurring_invoices.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('recurring_invoice_items')
+    op.drop_table('invoice_items')
+    op.drop_table('recurring_invoices')
+    op.drop_table('invoices')
+    op.drop_table('settings')
+    op.drop_table('currencies')
+    op.drop_table('clients')
@@ -0,0 +1,123 @@
+"""store money as integer minor units
+
+Revision ID: 7d4e5b6a2c10
+Revises: 3f1c2a9d8b01
+Create Date: 2026-10-19 10:00:00.000000
+
+Adds a per-currency exponent and converts the float money columns of
+invoices and invoice items to integer minor units, rounding half away from
+zero. Totals are converted as stored; run `flask recompute-totals` after
+upgrading to re-derive any that no longer match their rounded items.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4e5b6a2c10'
+down_revision = '3f1c2a9d8b01'
+branch_labels = None
+depends_on = None
+
+# Currencies without two decimal places, as in app.money at the time of
+# this migration
+EXPONENTS = {'IDR': 0, 'JPY': 0, 'KRW': 0, 'VND': 0, 'BHD': 3, 'JOD': 3, 'KWD': 3, 'OMR': 3, 'TND': 3}
+
+SCALE = "(CASE {0} WHEN 0 THEN 1 WHEN 1 THEN 10 WHEN 3 THEN 1000 ELSE 100 END)"
+
+
+def upgrade():
+    with op.batch_alter_table('currencies') as batch_op:
+        batch_op.add_column(sa.Column('exponent', sa.Integer(), nullable=False, server_default='2'))
+    for code, exponent in EXPONENTS.items():
+        op.execute(f"UPDATE currencies SET exponent = {exponent} WHERE code = '{code}'")
+
+    with op.batch_alter_table('invoices') as batch_op:
+        batch_op.add_column(sa.Column('currency_exponent', sa.Integer(), nullable=False, server_default='2'))
+        batch_op.add_column(sa.Column('subtotal_minor', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('tax_amount_minor', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('total_minor', sa.BigInteger(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('invoice_items') as batch_op:
+        batch_op.add_column(sa.Column('rate_minor', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('amount_minor', sa.BigInteger(), nullable=False, server_default='0'))
+
+    # Currencies missing from the currencies table keep the default of 2
+    # unless they are one of the known exceptions
+    op.execute("""
+        UPDATE invoices SET currency_exponent = COALESCE(
+            (SELECT exponent FROM currencies WHERE currencies.code = invoices.currency), 2)
+    """)
+    for code, exponent in EXPONENTS.items():
+        op.execute(f"""
+            UPDATE invoices SET currency_exponent = {exponent}
+            WHERE currency = '{code}' AND NOT EXISTS (SELECT 1 FROM currencies WHERE currencies.code = invoices.currency)
+        """)
+
+    scale = SCALE.format('currency_exponent')
+    op.execute(f"""
+        UPDATE invoices SET
+            subtotal_minor = CAST(ROUND(COALESCE(subtotal, 0) * {scale}) AS BIGINT),
+            tax_amount_minor = CAST(ROUND(COALESCE(tax_amount, 0) * {scale}) AS BIGINT),
+            total_minor = CAST(ROUND(COALESCE(total, 0) * {scale}) AS BIGINT)
+    """)
+
+    item_scale = SCALE.format(
+        "(SELECT currency_exponent FROM invoices WHERE invoices.id = invoice_items.invoice_id)"
+    )
+    op.execute(f"""
+        UPDATE invoice_items SET
+            rate_minor = CAST(ROUND(COALESCE(rate, 0) * {item_scale}) AS BIGINT),
+            amount_minor = CAST(ROUND(COALESCE(amount, 0) * {item_scale}) AS BIGINT)
+    """)
+
+    with op.batch_alter_table('invoice_items') as batch_op:
+        batch_op.drop_column('amount')
+        batch_op.drop_column('rate')
+
+    with op.batch_alter_table('invoices') as batch_op:
+        batch_op.drop_column('total')
+        batch_op.drop_column('tax_amount')
+        batch_op.drop_column('subtotal')
+
+
+def downgrade():
+    with op.batch_alter_table('invoices') as batch_op:
+        batch_op.add_column(sa.Column('subtotal', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('tax_amount', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('total', sa.Float(), nullable=True))
+
+    with op.batch_alter_table('invoice_items') as batch_op:
+        batch_op.add_column(sa.Column('rate', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=False, server_default='0'))
+
+    scale = SCALE.format('currency_exponent')
+    op.execute(f"""
+        UPDATE invoices SET
+            subtotal = subtotal_minor * 1.0 / {scale},
+            tax_amount = tax_amount_minor * 1.0 / {scale},
+            total = total_minor * 1.0 / {scale}
+    """)
+
+    item_scale = SCALE.format(
+        "(SELECT currency_exponent FROM invoices WHERE invoices.id = invoice_items.invoice_id)"
+    )
+    op.execute(f"""
+        UPDATE invoice_items SET
+            rate = rate_minor * 1.0 / {item_scale},
+            amount = amount_minor * 1.0 / {item_scale}
+    """)
+
+    with op.batch_alter_table('invoice_items') as batch_op:
+        batch_op.drop_column('amount_minor')
+        batch_op.drop_column('rate_minor')
+
+    with op.batch_alter_table('invoices') as batch_op:
+        batch_op.drop_column('total_minor')
+        batch_op.drop_column('tax_amount_minor')
+        batch_op.drop_column('subtotal_minor')
+        batch_op.drop_column('currency_exponent')
+
+    with op.batch_alter_table('currencies') as batch_op:
+        batch_op.drop_column('exponent')
@@ -0,0 +1,55 @@
+"""denormalized client invoice stats
+
+Revision ID: a41c7e93d5f2
+Revises: 7d4e5b6a2c10
+Create Date: 2026-10-19 12:00:00.000000
+
+Adds invoice count, outstanding and paid totals (in thousandths of a unit)
+and last invoice date to clients, backfilled from their invoices, and an
+index on invoices (client_id, issue_date).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7e93d5f2'
+down_revision = '7d4e5b6a2c10'
+branch_labels = None
+depends_on = None
+
+# Scales an invoice total from its own exponent up to thousandths
+SCALE = "(CASE currency_exponent WHEN 0 THEN 1000 WHEN 1 THEN 100 WHEN 2 THEN 10 ELSE 1 END)"
+
+
+def upgrade():
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.add_column(sa.Column('invoice_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('outstanding_total_minor', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('paid_total_minor', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_invoice_date', sa.Date(), nullable=True))
+
+    op.create_index('ix_invoices_client_id_issue_date', 'invoices', ['client_id', 'issue_date'])
+
+    op.execute(f"""
+        UPDATE clients SET
+            invoice_count = (SELECT COUNT(*) FROM invoices WHERE invoices.client_id = clients.id),
+            outstanding_total_minor = (
+                SELECT COALESCE(SUM(CASE WHEN status IN ('sent', 'unpaid', 'overdue') THEN total_minor * {SCALE} ELSE 0 END), 0)
+                FROM invoices WHERE invoices.client_id = clients.id),
+            paid_total_minor = (
+                SELECT COALESCE(SUM(CASE WHEN status = 'paid' THEN total_minor * {SCALE} ELSE 0 END), 0)
+                FROM invoices WHERE invoices.client_id = clients.id),
+            last_invoice_date = (SELECT MAX(issue_date) FROM invoices WHERE invoices.client_id = clients.id)
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_invoices_client_id_issue_date', table_name='invoices')
+
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.drop_column('last_invoice_date')
+        batch_op.drop_column('paid_total_minor')
+        batch_op.drop_column('outstanding_total_minor')
+        batch_op.drop_column('invoice_count')
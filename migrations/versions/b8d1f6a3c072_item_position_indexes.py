@@ -0,0 +1,34 @@
+"""line item indexes by invoice and position
+
+Revision ID: b8d1f6a3c072
+Revises: f7c3e1a5d924
+Create Date: 2026-10-19 16:00:00.000000
+
+Replaces the invoice_id indexes of invoice_items and archived_invoice_items
+with (invoice_id, position) indexes, so items are read in line order
+without a sort. Line item exports stream from the first row instead of
+sorting every item first.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d1f6a3c072'
+down_revision = 'f7c3e1a5d924'
+branch_labels = None
+depends_on = None
+
+ITEM_TABLES = ('invoice_items', 'archived_invoice_items')
+
+
+def upgrade():
+    for table in ITEM_TABLES:
+        op.create_index(f'ix_{table}_invoice_id_position', table, ['invoice_id', 'position'])
+        op.drop_index(f'ix_{table}_invoice_id', table_name=table)
+
+
+def downgrade():
+    for table in ITEM_TABLES:
+        op.create_index(f'ix_{table}_invoice_id', table, ['invoice_id'])
+        op.drop_index(f'ix_{table}_invoice_id_position', table_name=table)
@@ -0,0 +1,65 @@
+"""cascade deletes in the database
+
+Revision ID: c5b2d8f61e47
+Revises: a41c7e93d5f2
+Create Date: 2026-10-19 13:00:00.000000
+
+Recreates the foreign keys from invoices and recurring invoices to
+clients, and from items to their invoice, with ON DELETE CASCADE so that
+deleting a client or invoice no longer loads its children. The child
+columns get indexes, without which every cascaded delete would scan the
+whole child table.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5b2d8f61e47'
+down_revision = 'a41c7e93d5f2'
+branch_labels = None
+depends_on = None
+
+# Gives SQLite's unnamed foreign keys a name batch mode can drop them by
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+FOREIGN_KEYS = [
+    ('invoices', 'client_id', 'clients'),
+    ('invoice_items', 'invoice_id', 'invoices'),
+    ('recurring_invoices', 'client_id', 'clients'),
+    ('recurring_invoice_items', 'recurring_invoice_id', 'recurring_invoices'),
+]
+
+# invoices.client_id is already covered by ix_invoices_client_id_issue_date
+INDEXED_COLUMNS = [
+    ('invoice_items', 'invoice_id'),
+    ('recurring_invoices', 'client_id'),
+    ('recurring_invoice_items', 'recurring_invoice_id'),
+]
+
+
+def _replace_foreign_key(table, column, referred_table, ondelete):
+    name = f'fk_{table}_{column}_{referred_table}'
+    existing = next(
+        (fk['name'] for fk in sa.inspect(op.get_bind()).get_foreign_keys(table)
+         if fk['constrained_columns'] == [column]),
+        None
+    )
+    with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(existing or name, type_='foreignkey')
+        batch_op.create_foreign_key(name, referred_table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    for table, column in INDEXED_COLUMNS:
+        op.create_index(f'ix_{table}_{column}', table, [column])
+    for table, column, referred_table in FOREIGN_KEYS:
+        _replace_foreign_key(table, column, referred_table, 'CASCADE')
+
+
+def downgrade():
+    for table, column, referred_table in FOREIGN_KEYS:
+        _replace_foreign_key(table, column, referred_table, None)
+    for table, column in INDEXED_COLUMNS:
+        op.drop_index(f'ix_{table}_{column}', table_name=table)
@@ -0,0 +1,35 @@
+"""user sessions table
+
+Revision ID: d3e8a1b5c9f4
+Revises: b8d1f6a3c072
+Create Date: 2026-10-19 18:00:00.000000
+
+Adds user_sessions, the session store used when SESSION_TYPE is
+'database', with an index on expiry for purging expired sessions.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3e8a1b5c9f4'
+down_revision = 'b8d1f6a3c072'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_sessions',
+        sa.Column('id', sa.String(length=255), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('expiry', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_user_sessions_expiry', 'user_sessions', ['expiry'])
+
+
+def downgrade():
+    op.drop_index('ix_user_sessions_expiry', table_name='user_sessions')
+    op.drop_table('user_sessions')
@@ -0,0 +1,43 @@
+"""line item positions
+
+Revision ID: e2a9f4c7b318
+Revises: c5b2d8f61e47
+Create Date: 2026-10-19 14:00:00.000000
+
+Adds a position column to invoice and recurring invoice items so edits can
+reorder lines without recreating them. Existing items are numbered in id
+order within their invoice, which is the order they were shown in before.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9f4c7b318'
+down_revision = 'c5b2d8f61e47'
+branch_labels = None
+depends_on = None
+
+ITEM_TABLES = [
+    ('invoice_items', 'invoice_id'),
+    ('recurring_invoice_items', 'recurring_invoice_id'),
+]
+
+
+def upgrade():
+    for table, parent_column in ITEM_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('position', sa.Integer(), nullable=False, server_default='0'))
+        op.execute(f"""
+            UPDATE {table} SET position = (
+                SELECT COUNT(*) FROM {table} AS earlier
+                WHERE earlier.{parent_column} = {table}.{parent_column} AND earlier.id < {table}.id
+            )
+        """)
+
+
+def downgrade():
+    for table, _ in ITEM_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('position')
@@ -0,0 +1,73 @@
+"""client totals per currency
+
+Revision ID: e6f1c4a8b237
+Revises: d3e8a1b5c9f4
+Create Date: 2026-10-19 20:00:00.000000
+
+Moves clients' outstanding and paid totals into client_currency_totals,
+one row per client and currency, so totals in different currencies are
+no longer added together. Backfilled from current and archived invoices.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f1c4a8b237'
+down_revision = 'd3e8a1b5c9f4'
+branch_labels = None
+depends_on = None
+
+# Scales an invoice total from its own exponent up to thousandths
+SCALE = "(CASE currency_exponent WHEN 0 THEN 1000 WHEN 1 THEN 100 WHEN 2 THEN 10 ELSE 1 END)"
+
+INVOICE_TOTALS = f"""
+    SELECT client_id, COALESCE(currency, 'IDR') AS currency,
+           CASE WHEN status IN ('sent', 'unpaid', 'overdue') THEN total_minor * {SCALE} ELSE 0 END AS outstanding,
+           CASE WHEN status = 'paid' THEN total_minor * {SCALE} ELSE 0 END AS paid
+    FROM %s
+"""
+
+
+def upgrade():
+    op.create_table(
+        'client_currency_totals',
+        sa.Column('client_id', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('outstanding_total_minor', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('paid_total_minor', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['client_id'], ['clients.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('client_id', 'currency'),
+    )
+
+    op.execute(f"""
+        INSERT INTO client_currency_totals (client_id, currency, outstanding_total_minor, paid_total_minor)
+        SELECT client_id, currency, SUM(outstanding), SUM(paid)
+        FROM ({INVOICE_TOTALS % 'invoices'} UNION ALL {INVOICE_TOTALS % 'archived_invoices'}) AS totals
+        GROUP BY client_id, currency
+        HAVING SUM(outstanding) != 0 OR SUM(paid) != 0
+    """)
+
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.drop_column('paid_total_minor')
+        batch_op.drop_column('outstanding_total_minor')
+
+
+def downgrade():
+    with op.batch_alter_table('clients') as batch_op:
+        batch_op.add_column(sa.Column('outstanding_total_minor', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('paid_total_minor', sa.BigInteger(), nullable=False, server_default='0'))
+
+    # The single-number totals of the previous schema
+    op.execute("""
+        UPDATE clients SET
+            outstanding_total_minor = (
+                SELECT COALESCE(SUM(outstanding_total_minor), 0) FROM client_currency_totals
+                WHERE client_currency_totals.client_id = clients.id),
+            paid_total_minor = (
+                SELECT COALESCE(SUM(paid_total_minor), 0) FROM client_currency_totals
+                WHERE client_currency_totals.client_id = clients.id)
+    """)
+
+    op.drop_table('client_currency_totals')
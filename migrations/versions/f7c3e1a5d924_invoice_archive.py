@@ -0,0 +1,89 @@
+"""invoice archive tables
+
+Revision ID: f7c3e1a5d924
+Revises: e2a9f4c7b318
+Create Date: 2026-10-19 15:00:00.000000
+
+Adds archived_invoices and archived_invoice_items for settled invoices
+moved out of the hot tables by `flask archive-invoices`. On SQLite the
+invoices table is rebuilt with AUTOINCREMENT so the id of an archived
+invoice is never handed out again. Downgrading moves archived invoices
+back.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c3e1a5d924'
+down_revision = 'e2a9f4c7b318'
+branch_labels = None
+depends_on = None
+
+INVOICE_COLUMNS = (
+    'id, invoice_number, client_id, issue_date, due_date, status, currency, currency_exponent, '
+    'subtotal_minor, tax_rate, tax_amount_minor, total_minor, notes, created_at, updated_at'
+)
+ITEM_COLUMNS = 'id, invoice_id, position, description, quantity, rate_minor, amount_minor'
+
+
+def _set_sqlite_autoincrement(enabled):
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('invoices', recreate='always', table_kwargs={'sqlite_autoincrement': enabled}):
+            pass
+
+
+def upgrade():
+    op.create_table(
+        'archived_invoices',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('invoice_number', sa.String(length=50), nullable=False),
+        sa.Column('client_id', sa.Integer(), nullable=False),
+        sa.Column('issue_date', sa.Date(), nullable=False),
+        sa.Column('due_date', sa.Date(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('currency', sa.String(length=3), nullable=True),
+        sa.Column('currency_exponent', sa.Integer(), nullable=False),
+        sa.Column('subtotal_minor', sa.BigInteger(), nullable=False),
+        sa.Column('tax_rate', sa.Float(), nullable=True),
+        sa.Column('tax_amount_minor', sa.BigInteger(), nullable=False),
+        sa.Column('total_minor', sa.BigInteger(), nullable=False),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['client_id'], ['clients.id'], name='fk_archived_invoices_client_id_clients', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_archived_invoices_invoice_number', 'archived_invoices', ['invoice_number'])
+    op.create_index('ix_archived_invoices_client_id_issue_date', 'archived_invoices', ['client_id', 'issue_date'])
+
+    op.create_table(
+        'archived_invoice_items',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('invoice_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('description', sa.String(length=500), nullable=False),
+        sa.Column('quantity', sa.Float(), nullable=True),
+        sa.Column('rate_minor', sa.BigInteger(), nullable=False),
+        sa.Column('amount_minor', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['invoice_id'], ['archived_invoices.id'], name='fk_archived_invoice_items_invoice_id_archived_invoices', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_archived_invoice_items_invoice_id', 'archived_invoice_items', ['invoice_id'])
+
+    _set_sqlite_autoincrement(True)
+
+
+def downgrade():
+    _set_sqlite_autoincrement(False)
+
+    op.execute(f"INSERT INTO invoices ({INVOICE_COLUMNS}) SELECT {INVOICE_COLUMNS} FROM archived_invoices")
+    op.execute(f"INSERT INTO invoice_items ({ITEM_COLUMNS}) SELECT {ITEM_COLUMNS} FROM archived_invoice_items")
+
+    op.drop_index('ix_archived_invoice_items_invoice_id', table_name='archived_invoice_items')
+    op.drop_table('archived_invoice_items')
+    op.drop_index('ix_archived_invoices_client_id_issue_date', table_name='archived_invoices')
+    op.drop_index('ix_archived_invoices_invoice_number', table_name='archived_invoices')
+    op.drop_table('archived_invoices')
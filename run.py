@@ -1,16 +1,23 @@
 from app import create_app
-from app.models import RecurringInvoice, Invoice, InvoiceItem, Currency
+from app.models import RecurringInvoice, Invoice, InvoiceItem, ArchivedInvoice, Currency
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import click
+import os
 from app.extensions import db
+from app.money import default_exponent, to_minor
+from app.services.metrics import RECURRING_INVOICES_GENERATED
 
 app = create_app()
 
 @app.cli.command("init-db")
 def init_db_command():
     """Create all database tables and seed initial data."""
+    from flask_migrate import stamp
+
     db.create_all()
+    # The tables already match the models, so mark every migration as applied
+    stamp()
     click.echo("Initialized the database and created all tables.")
 
     if Currency.query.count() == 0:
@@ -20,15 +27,14 @@ def init_db_command():
             {'code': 'EUR', 'name': 'Euro', 'symbol': '€'}
         ]
         for c in currencies:
-            db.session.add(Currency(code=c['code'], name=c['name'], symbol=c['symbol']))
+            db.session.add(Currency(code=c['code'], name=c['name'], symbol=c['symbol'],
+                                    exponent=default_exponent(c['code'])))
         db.session.commit()
         click.echo("Seeded currency data.")
     else:
         click.echo("Currency data already exists.")
 
 
-app = create_app()
-
 @app.cli.command("generate-recurring")
 def generate_recurring_invoices():
     """Generate invoices from recurring invoice schedules."""
@@ -39,6 +45,8 @@ def generate_recurring_invoices():
     ).all()
 
     for r_invoice in due_recurring_invoices:
+        exponent = Currency.exponent_for(r_invoice.currency)
+
         # Create a new standard invoice
         new_invoice = Invoice(
             invoice_number=generate_invoice_number(),
@@ -46,16 +54,18 @@ def generate_recurring_invoices():
             issue_date=today,
             due_date=today + timedelta(days=30), # Or calculate based on payment terms
             currency=r_invoice.currency,
+            currency_exponent=exponent,
             tax_rate=r_invoice.tax_rate,
             notes=r_invoice.notes,
             status='unpaid' # Or 'draft'
         )
 
-        for r_item in r_invoice.items:
+        for position, r_item in enumerate(r_invoice.items):
             new_item = InvoiceItem(
+                position=position,
                 description=r_item.description,
                 quantity=r_item.quantity,
-                rate=r_item.rate
+                rate_minor=to_minor(r_item.rate, exponent)
             )
             new_item.calculate_amount()
             new_invoice.items.append(new_item)
@@ -80,6 +90,7 @@ def generate_recurring_invoices():
         click.echo(f"Generated invoice {new_invoice.invoice_number} from recurring invoice {r_invoice.id}.")
 
     db.session.commit()
+    RECURRING_INVOICES_GENERATED.inc(len(due_recurring_invoices))
     click.echo("Recurring invoice generation complete.")
 
 def generate_invoice_number():
@@ -87,17 +98,213 @@ def generate_invoice_number():
     today = datetime.now()
     prefix = f"INV-{today.strftime('%Y%m')}"
     
-    last_invoice = Invoice.query.filter(
-        Invoice.invoice_number.like(f"{prefix}%")
-    ).order_by(Invoice.invoice_number.desc()).first()
+    last_numbers = []
+    for model in (Invoice, ArchivedInvoice):
+        last_invoice = model.query.filter(
+            model.invoice_number.like(f"{prefix}%")
+        ).order_by(model.invoice_number.desc()).first()
+        if last_invoice:
+            last_numbers.append(last_invoice.invoice_number)
     
-    if last_invoice:
-        last_num = int(last_invoice.invoice_number.split('-')[-1])
+    if last_numbers:
+        last_num = int(max(last_numbers).split('-')[-1])
         new_num = last_num + 1
     else:
         new_num = 1
     
     return f"{prefix}-{new_num:04d}"
 
+@app.cli.command("recompute-totals")
+@click.option("--check", is_flag=True, help="Only report invoices whose totals have drifted.")
+def recompute_totals_command(check):
+    """Check and fix every invoice's totals against its line items."""
+    from app.services.client_stats_service import refresh_client_stats
+    from app.services.totals_service import find_drifted_invoices, recompute_invoice_totals
+
+    if check:
+        drifted = find_drifted_invoices()
+        click.echo(f"{len(drifted)} invoices have totals that don't match their items.")
+        for invoice_id in drifted[:50]:
+            click.echo(f"  invoice {invoice_id}")
+        return
+
+    fixed = recompute_invoice_totals()
+    # The UPDATE bypasses the session, so client totals are refreshed here
+    refresh_client_stats()
+    db.session.commit()
+    click.echo(f"Recomputed totals for {fixed} invoices.")
+
+@app.cli.command("rebuild-client-stats")
+def rebuild_client_stats_command():
+    """Recompute every client's invoice count and totals from their invoices."""
+    from app.services.client_stats_service import refresh_client_stats
+
+    fixed = refresh_client_stats()
+    db.session.commit()
+    click.echo(f"Rebuilt stats for {fixed} clients.")
+
+@app.cli.command("archive-invoices")
+@click.option("--older-than", type=int, default=None, help="Age in days (default ARCHIVE_AFTER_DAYS).")
+@click.option("--batch-size", type=int, default=None, help="Invoices moved per transaction (default ARCHIVE_BATCH_SIZE).")
+@click.option("--dry-run", is_flag=True, help="Only report how many invoices would be archived.")
+def archive_invoices_command(older_than, batch_size, dry_run):
+    """Move old paid and cancelled invoices to the archive tables."""
+    from app.services.archive_service import archive_cutoff, archive_invoices, count_archivable_invoices
+
+    cutoff = archive_cutoff(older_than)
+    if dry_run:
+        count = count_archivable_invoices(older_than)
+        click.echo(f"{count} paid or cancelled invoices issued before {cutoff} would be archived.")
+        return
+
+    archived = archive_invoices(older_than, batch_size)
+    click.echo(f"Archived {archived} paid or cancelled invoices issued before {cutoff}.")
+
+@app.cli.command("import-csv")
+@click.argument("kind", type=click.Choice(["clients", "invoices", "items"]))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--rejects", type=click.Path(dir_okay=False), default=None,
+              help="Where to write rejected rows (default PATH.rejects.csv).")
+@click.option("--batch-size", type=int, default=None, help="Rows per transaction (default IMPORT_BATCH_SIZE).")
+def import_csv_command(kind, path, rejects, batch_size):
+    """Bulk import clients, invoices or line items from a CSV file."""
+    from app.services.csv_import import import_csv
+
+    rejects = rejects or f"{path}.rejects.csv"
+    with open(path, newline='', encoding='utf-8-sig') as stream, \
+            open(rejects, 'w', newline='', encoding='utf-8') as reject_stream:
+        report, error = import_csv(kind, stream, reject_stream, batch_size)
+
+    if report is None or not report['rejected']:
+        os.remove(rejects)
+    if report is not None:
+        click.echo(f"Imported {report['imported']} {kind}, rejected {report['rejected']}.")
+        if report['rejected']:
+            click.echo(f"Rejected rows were written to {rejects}.")
+    if error:
+        raise click.ClickException(error)
+
+@app.cli.command("export-invoices")
+@click.option("--kind", type=click.Choice(["invoices", "items"]), default="invoices", show_default=True)
+@click.option("--format", "file_format", type=click.Choice(["csv", "jsonl"]), default="csv", show_default=True)
+@click.option("--start", type=click.DateTime(["%Y-%m-%d"]), default=None, help="First issue date to include.")
+@click.option("--end", type=click.DateTime(["%Y-%m-%d"]), default=None, help="Last issue date to include.")
+@click.option("--status", default=None, help="Only invoices with this status.")
+@click.option("--client-id", type=int, default=None, help="Only this client's invoices.")
+@click.option("--currency", default=None, help="Only invoices in this currency.")
+@click.option("--no-archived", is_flag=True, help="Leave out archived invoices.")
+@click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-", help="File to write (default stdout).")
+def export_invoices_command(kind, file_format, start, end, status, client_id, currency, no_archived, output):
+    """Stream invoices or line items matching the filters as CSV or JSONL."""
+    from app.services.export_service import stream_export
+
+    filters = {
+        'start': start.date() if start else None,
+        'end': end.date() if end else None,
+        'status': status,
+        'client_id': client_id,
+        'currency': currency,
+    }
+    for chunk in stream_export(kind, file_format, not no_archived, **filters):
+        output.write(chunk)
+
+@app.cli.command("bulk-status")
+@click.argument("status", type=click.Choice(["draft", "sent", "unpaid", "paid", "cancelled"]))
+@click.argument("refs", nargs=-1)
+@click.option("--csv", "payments", type=click.File("r", encoding="utf-8-sig"), default=None,
+              help="CSV of payments with an invoice_number or invoice_id column.")
+@click.option("--json", "as_json", is_flag=True, help="Print the outcome for every invoice as JSON.")
+def bulk_status_command(status, refs, payments, as_json):
+    """Set the status of many invoices, given by number or id, at once."""
+    import json
+    from collections import Counter
+    from app.services.status_service import bulk_update_status, refs_from_csv
+
+    refs = list(refs)
+    if payments is not None:
+        try:
+            refs.extend(refs_from_csv(payments))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    outcomes, error = bulk_update_status(refs, status)
+    if error:
+        raise click.ClickException(error)
+
+    if as_json:
+        click.echo(json.dumps(outcomes, indent=2))
+        return
+    counts = Counter(outcome['outcome'] for outcome in outcomes)
+    click.echo(f"Updated {counts['updated']}, unchanged {counts['unchanged']}, "
+               f"archived {counts['archived']}, not found {counts['not_found']}.")
+    for outcome in outcomes:
+        if outcome['outcome'] in ('archived', 'not_found'):
+            click.echo(f"  {outcome['ref']}: {outcome['outcome'].replace('_', ' ')}")
+
+
+@app.cli.command("seed-bench")
+@click.option("--clients", type=int, default=1000, show_default=True)
+@click.option("--invoices", type=int, default=20000, show_default=True)
+@click.option("--recurring", type=int, default=200, show_default=True, help="Recurring invoice schedules.")
+@click.option("--seed", type=int, default=0, show_default=True, help="Same seed, same data.")
+@click.option("--batch-size", type=int, default=None, help="Rows per INSERT (default IMPORT_BATCH_SIZE).")
+def seed_bench_command(clients, invoices, recurring, seed, batch_size):
+    """Generate a large, deterministic dataset for performance testing."""
+    from app.services.seed_service import seed_bench_data
+
+    start = datetime.now()
+    report, error = seed_bench_data(clients, invoices, recurring, seed, batch_size=batch_size)
+    if report is not None:
+        click.echo(f"Added {report['clients']} clients, {report['invoices']} invoices with {report['items']} items "
+                   f"and {report['recurring_invoices']} recurring invoices in "
+                   f"{(datetime.now() - start).total_seconds():.1f}s.")
+    if error:
+        raise click.ClickException(error)
+
+
+@app.cli.command("profile-token")
+def profile_token_command():
+    """Print a token that has a request profiled when sent in the profiling header."""
+    from app.services.profiler import make_profile_token
+
+    click.echo(f"{app.config['PROFILING_HEADER']}: {make_profile_token(app)}")
+    click.echo(f"Valid for {app.config['PROFILING_TOKEN_MAX_AGE']} seconds.")
+
+
+@app.cli.command("purge-sessions")
+def purge_sessions_command():
+    """Delete expired sessions from the database session store."""
+    from app.services.session_store import purge_expired_sessions
+
+    click.echo(f"Purged {purge_expired_sessions()} expired sessions.")
+
+
+@app.cli.command("backup-incremental")
+def backup_incremental_command():
+    """Store an incremental backup and prune old ones."""
+    from app.services.backup_service import BackupService
+
+    report, error = BackupService.create_incremental_backup()
+    if error:
+        raise click.ClickException(error)
+
+    click.echo(f"Backup {report['name']}: {report['new_chunks']} new / {report['total_chunks']} chunks, "
+               f"{report['bytes_written']} bytes written for a {report['size']} byte database.")
+    pruned = report['pruned']
+    click.echo(f"Pruned {pruned['removed_manifests']} backups and {pruned['removed_chunks']} chunks "
+               f"({pruned['bytes_freed']} bytes freed).")
+
+@app.cli.command("restore-backup")
+@click.argument("name")
+def restore_backup_command(name):
+    """Restore the database from an incremental backup manifest."""
+    from app.services.backup_service import BackupService
+
+    success, error = BackupService.restore_manifest(name)
+    if not success:
+        raise click.ClickException(error)
+    click.echo(f"Restored database from backup {name}.")
+
 if __name__ == '__main__':
+    app.extensions['backup_scheduler'].start_if_enabled()
     app.run(host='127.0.0.1', port=5000)
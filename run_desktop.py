@@ -1,10 +1,11 @@
 from flaskwebgui import FlaskUI
 from app import create_app
+from config import DesktopConfig
 import os
 import sys
 
 # Initialize the Flask app
-app = create_app()
+app = create_app(DesktopConfig)
 
 if __name__ == "__main__":
     # Determine if we're running as a bundled executable
@@ -15,6 +16,8 @@ if __name__ == "__main__":
         # If running as .py, use the current directory
         base_dir = os.path.dirname(os.path.abspath(__file__))
 
+    app.extensions['backup_scheduler'].start_if_enabled()
+
     # Configure FlaskUI
     # width and height can be adjusted as needed
     ui = FlaskUI(
@@ -1,3 +1,4 @@
 from app import create_app
 
 app = create_app()
+app.extensions['backup_scheduler'].start_if_enabled()